@@ -0,0 +1,173 @@
+"""
+Fast synthetic data generator for users and contacts.
+
+Rows are generated deterministically from a seed and bulk-loaded in chunks. On Postgres
+(asyncpg) it uses COPY; on SQLite it uses executemany inserts. Every user shares one
+precomputed password hash, so generating many users costs no bcrypt time. The bulk load bypasses
+the repository, so the per-user contact counters are rebuilt once at the end.
+
+Usage::
+
+    python -m benchmarks.datagen --db-url sqlite+aiosqlite:///./bench.db --users 1000 --contacts 1000000
+    python -m benchmarks.datagen --db-url postgresql+asyncpg://... --users 10000 --contacts 1000000 --create-schema
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.repository.contacts import reconcile_contact_counters
+from src.servises.auth import auth_service
+
+PASSWORD = "benchpass"
+FIRST_NAMES = ["Olena", "Taras", "Iryna", "Dmytro", "Kateryna", "Andriy", "Maria", "Oleh", "Sofia", "Yurii"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Boyko", "Moroz"]
+
+
+@dataclass
+class GeneratedData:
+    user_ids: list[int]
+    emails: list[str]
+    contacts: int
+
+
+def user_rows(count: int, password_hash: str, now: datetime, prefix: str = "bench"):
+    for i in range(count):
+        yield {
+            "username": f"{prefix}{i}",
+            "email": f"{prefix}{i}@example.com",
+            "password": password_hash,
+            "refresh_token": None,
+            "created_at": now,
+            "updated_at": now,
+            "role": "admin" if i == 0 else "user",
+            "confirmed": True,
+            "avatar": "https://example.com/avatar.png",
+        }
+
+
+def contact_rows(count: int, user_ids: list[int], rng: random.Random, now: datetime):
+    today = date.today()
+    for n in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        yield {
+            "first_name": first,
+            "last_name": last,
+            "email": f"{first.lower()}.{last.lower()}{n}@example.com",
+            "phone_number": f"380{rng.randrange(10 ** 9):09d}",
+            "birthday": today - timedelta(days=rng.randrange(18 * 365, 70 * 365)),
+            "created_at": now,
+            "updated_at": now,
+            # contacts are spread evenly, so every user owns count // users rows
+            "user_id": user_ids[n % len(user_ids)],
+        }
+
+
+def chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _copy(conn, table: str, chunk: list[dict]) -> None:
+    raw = await conn.get_raw_connection()
+    columns = list(chunk[0])
+    await raw.driver_connection.copy_records_to_table(
+        table, records=[tuple(row[c] for c in columns) for row in chunk], columns=columns
+    )
+
+
+async def generate(
+    engine: AsyncEngine,
+    users: int,
+    contacts: int,
+    seed: int = 0,
+    chunk_size: int = 10_000,
+    password_hash: str | None = None,
+    prefix: str = "bench",
+) -> GeneratedData:
+    """
+    The generate function bulk-loads users and contacts into the database behind engine.
+
+    :param engine: AsyncEngine: The target database
+    :param users: int: How many users to create (the first one is an admin)
+    :param contacts: int: How many contacts to create in total, spread across the users
+    :param seed: int: The random seed, the same seed always yields the same data
+    :param chunk_size: int: How many rows go into one statement or COPY
+    :param password_hash: str | None: The hash stored for every user, computed once if not given
+    :param prefix: str: Usernames and emails are prefix0, prefix1, ... and must not exist yet
+    :return: The ids and emails of the generated users
+
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    password_hash = password_hash or auth_service.get_password_hash(PASSWORD)
+    use_copy = engine.dialect.driver == "asyncpg"
+    async with engine.begin() as conn:
+        for chunk in chunks(user_rows(users, password_hash, now, prefix), chunk_size):
+            if use_copy:
+                await _copy(conn, User.__tablename__, chunk)
+            else:
+                await conn.execute(insert(User), chunk)
+        rows = await conn.execute(
+            select(User.id, User.email)
+            .where(User.email.like(f"{prefix}%@example.com"))
+            .order_by(User.id)
+        )
+        rows = rows.all()
+        user_ids = [row.id for row in rows]
+        emails = [row.email for row in rows]
+        if user_ids:
+            for chunk in chunks(contact_rows(contacts, user_ids, rng, now), chunk_size):
+                if use_copy:
+                    await _copy(conn, Contact.__tablename__, chunk)
+                else:
+                    await conn.execute(insert(Contact), chunk)
+    async with AsyncSession(engine) as session:
+        await reconcile_contact_counters(session)
+    return GeneratedData(user_ids=user_ids, emails=emails, contacts=contacts if user_ids else 0)
+
+
+async def create_schema(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _main(args) -> None:
+    engine = create_async_engine(args.db_url)
+    if args.create_schema:
+        await create_schema(engine)
+    started = time.perf_counter()
+    data = await generate(
+        engine, args.users, args.contacts, seed=args.seed, chunk_size=args.chunk_size, prefix=args.prefix
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"loaded {len(data.user_ids)} users and {data.contacts} contacts in {elapsed:.1f}s "
+        f"({data.contacts / elapsed:,.0f} contacts/s)"
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic users and contacts.")
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--prefix", default="bench")
+    parser.add_argument("--create-schema", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
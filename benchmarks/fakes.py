@@ -0,0 +1,187 @@
+import asyncio
+import time
+
+import redis
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the sync ``redis.Redis`` client; ``FakeAsyncRedis`` wraps it.
+    Supports the handful of commands the application uses, with key expiry.
+    """
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.expires: dict[str, float] = {}
+
+    def _alive(self, name: str) -> bool:
+        deadline = self.expires.get(name)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return name in self.data
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def ping(self):
+        return True
+
+    def get(self, name):
+        return self.data[name] if self._alive(name) else None
+
+    def set(self, name, value, ex=None, px=None, nx=False):
+        if nx and self._alive(name):
+            return None
+        self.data[name] = self._encode(value)
+        self.expires.pop(name, None)
+        if ex is not None:
+            self.expire(name, ex)
+        if px is not None:
+            self.expires[name] = time.monotonic() + px / 1000
+        return True
+
+    def expire(self, name, seconds):
+        if not self._alive(name):
+            return False
+        self.expires[name] = time.monotonic() + seconds
+        return True
+
+    def pttl(self, name):
+        if not self._alive(name):
+            return -2
+        deadline = self.expires.get(name)
+        return -1 if deadline is None else int((deadline - time.monotonic()) * 1000)
+
+    def incr(self, name, amount=1):
+        value = int(self.get(name) or 0) + amount
+        self.data[name] = self._encode(value)
+        return value
+
+    def delete(self, *names):
+        removed = 0
+        for name in names:
+            if self._alive(name):
+                removed += 1
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return removed
+
+
+class FakeAsyncRedis:
+    """
+    In-memory stand-in for ``redis.asyncio.Redis``.
+    ``evalsha`` emulates the fastapi-limiter script. Pass ``enforce_rate_limits=False``
+    to let every request through, which load tests need.
+    """
+
+    def __init__(self, enforce_rate_limits: bool = True):
+        self.sync = FakeRedis()
+        self.enforce_rate_limits = enforce_rate_limits
+        self.subscribers: list[FakePubSub] = []
+
+    async def publish(self, channel, message):
+        receivers = [sub for sub in self.subscribers if channel in sub.channels]
+        for sub in receivers:
+            sub.queue.put_nowait(
+                {"type": "message", "channel": channel.encode(), "data": str(message).encode()}
+            )
+        return len(receivers)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def ping(self):
+        return True
+
+    async def get(self, name):
+        return self.sync.get(name)
+
+    async def set(self, name, value, ex=None, px=None, nx=False):
+        return self.sync.set(name, value, ex=ex, px=px, nx=nx)
+
+    async def expire(self, name, seconds):
+        return self.sync.expire(name, seconds)
+
+    async def incr(self, name, amount=1):
+        return self.sync.incr(name, amount)
+
+    async def delete(self, *names):
+        return self.sync.delete(*names)
+
+    async def script_load(self, script):
+        return "fake-limiter-sha"
+
+    async def evalsha(self, sha, numkeys, key, limit, expire_ms):
+        if not self.enforce_rate_limits:
+            return 0
+        current = int(self.sync.get(key) or 0)
+        if current > 0:
+            if current + 1 > int(limit):
+                return self.sync.pttl(key)
+            self.sync.incr(key)
+            return 0
+        self.sync.set(key, 1, px=int(expire_ms))
+        return 0
+
+    async def close(self):
+        pass
+
+
+class FakePubSub:
+    def __init__(self, redis: FakeAsyncRedis):
+        self.redis = redis
+        self.channels: set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+        if self not in self.redis.subscribers:
+            self.redis.subscribers.append(self)
+        for channel in channels:
+            self.queue.put_nowait({"type": "subscribe", "channel": channel.encode(), "data": 1})
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        if self in self.redis.subscribers:
+            self.redis.subscribers.remove(self)
+
+
+class FaultyRedis:
+    """
+    Fault-injecting wrapper around ``FakeRedis`` or ``FakeAsyncRedis``.
+    Every command waits ``delay`` seconds first, then fails with a connection error
+    while ``down`` is set. ``calls`` counts the commands that reached the wrapper.
+    """
+
+    def __init__(self, inner, down: bool = False, delay: float = 0.0):
+        self.inner = inner
+        self.down = down
+        self.delay = delay
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if not callable(attr):
+            return attr
+        if asyncio.iscoroutinefunction(attr):
+            async def command(*args, **kwargs):
+                self.calls += 1
+                await asyncio.sleep(self.delay)
+                if self.down:
+                    raise redis.ConnectionError("injected fault")
+                return await attr(*args, **kwargs)
+        else:
+            def command(*args, **kwargs):
+                self.calls += 1
+                time.sleep(self.delay)
+                if self.down:
+                    raise redis.ConnectionError("injected fault")
+                return attr(*args, **kwargs)
+        return command
@@ -0,0 +1,400 @@
+"""
+End-to-end HTTP load test for the FastAPI ``app`` in ``main.py``.
+
+The app runs in-process behind httpx's ASGI transport, with a temporary aiosqlite database
+and fake Redis clients (rate limits disabled). A configurable dataset is seeded first, then
+concurrent traffic is driven at signup, login, ``/users/me`` and every ``/api/contacts`` route.
+The report shows throughput and p50/p95/p99 latency per route.
+
+``GET /contacts/events`` is a server-sent event stream that never ends on its own. httpx's ASGI
+transport waits for the whole body, so that scenario calls the app directly: it measures the
+time to the first frame, then disconnects, which is how a reconnecting client loads the route.
+Export jobs run in the background after ``POST /contacts/export`` answers, so the export
+scenarios run last and only a sample of jobs is submitted.
+
+SQLite allows one writer at a time. Concurrent writes wait up to ``SQLITE_BUSY_TIMEOUT`` for the
+lock instead of failing with "database is locked", so write routes (signup, create, update,
+delete) measure that wait as well and are not comparable to Postgres. Keep ``--concurrency`` low
+when comparing write latency; a raised concurrency mostly measures lock contention.
+
+The app calibrates its bcrypt cost to the machine on startup, which would make signup and login
+incomparable between machines. The benchmark pins the cost to ``--bcrypt-rounds`` instead.
+
+Usage::
+
+    python -m benchmarks.http_load --users 20 --contacts 50 --requests 200 --concurrency 8
+    python -m benchmarks.http_load --save-baseline      # record benchmarks/results/http_baseline.json
+    python -m benchmarks.http_load --tolerance 0.2      # exit 1 if a route regressed by more than 20%
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import httpx
+from fastapi_limiter import FastAPILimiter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks import datagen
+from benchmarks.fakes import FakeAsyncRedis
+from benchmarks.stats import compare, print_report, summarize
+from main import app
+from src.database.db import get_db
+from src.conf.config import config
+from src.database.models import Base, Contact
+from src.servises.admission import admission_limit
+from src.servises.auth import auth_service
+from src.servises.coalesce import read_coalescer
+from src.servises.export import contact_exporter
+from src.servises.idempotency import idempotency_store
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_BASELINE = RESULTS_DIR / "http_baseline.json"
+PASSWORD = datagen.PASSWORD
+SQLITE_BUSY_TIMEOUT = 30
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    request: Callable[[int], tuple[str, dict]]
+    ok: tuple[int, ...] = (200,)
+    # read only the first frame of an event stream, then disconnect
+    stream: bool = False
+
+
+async def seed(engine, users: int, contacts: int) -> list[dict]:
+    data = await datagen.generate(engine, users, users * contacts)
+    accounts = [{"id": user_id, "email": email} for user_id, email in zip(data.user_ids, data.emails)]
+    async with engine.connect() as conn:
+        for account in accounts:
+            ids = await conn.execute(
+                select(Contact.id).filter_by(user_id=account["id"]).order_by(Contact.id)
+            )
+            account["contacts"] = ids.scalars().all()
+    for account in accounts:
+        token = await auth_service.create_access_token({"sub": account["email"]}, 3600)
+        account["headers"] = {"Authorization": f"Bearer {token}"}
+    return accounts
+
+
+async def open_event_stream(url: str, headers: dict) -> httpx.Response:
+    """
+    The open_event_stream function connects to an event stream route of the app, waits for
+    the first frame and disconnects.
+
+    :param url: str: The path of the route
+    :param headers: dict: The request headers
+    :return: The response with the first frame as its body
+
+    """
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in {"User-Agent": "http-load", **headers}.items()
+        ],
+        "client": ("bench", 1),
+        "server": ("bench", 80),
+    }
+    start: dict = {}
+    body = bytearray()
+    first_frame = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first_frame.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+            if body or not message.get("more_body", False):
+                first_frame.set()
+
+    # the app returns once it has seen the disconnect and released the stream
+    await app(scope, receive, send)
+    return httpx.Response(
+        start.get("status", 500),
+        headers=[(name.decode(), value.decode()) for name, value in start.get("headers", [])],
+        content=bytes(body),
+    )
+
+
+def build_scenarios(
+    accounts: list[dict], created: list[tuple[dict, int]], export_jobs: list[str]
+) -> list[Scenario]:
+    def account(i):
+        return accounts[i % len(accounts)]
+
+    def contact_body(i):
+        return {
+            "first_name": f"new{i:04d}",
+            "last_name": "contact",
+            "email": f"new{i}@example.com",
+            "phone_number": "380000000000",
+            "birthday": "1990-01-01",
+        }
+
+    def created_contact(i):
+        owner, contact_id = created[i % len(created)]
+        return owner, contact_id
+
+    def batch_ids(i):
+        ids = account(i)["contacts"]
+        # a few ids of another user come back as not_found
+        return [ids[(i + k) % len(ids)] for k in range(20)] + account(i + 1)["contacts"][:2]
+
+    return [
+        Scenario(
+            "POST /auth/signup",
+            "POST",
+            lambda i: (
+                "/api/auth/signup",
+                {"json": {"username": f"signup{i}", "email": f"signup{i}@example.com", "password": PASSWORD}},
+            ),
+            ok=(201,),
+        ),
+        Scenario(
+            "POST /auth/login",
+            "POST",
+            lambda i: (
+                "/api/auth/login",
+                {"data": {"username": account(i)["email"], "password": PASSWORD}},
+            ),
+        ),
+        Scenario("GET /users/me", "GET", lambda i: ("/api/users/me", {"headers": account(i)["headers"]})),
+        Scenario(
+            "GET /contacts/",
+            "GET",
+            lambda i: ("/api/contacts/?limit=50", {"headers": account(i)["headers"]}),
+        ),
+        Scenario(
+            "GET /contacts/all",
+            "GET",
+            lambda i: ("/api/contacts/all?limit=500", {"headers": accounts[0]["headers"]}),
+        ),
+        Scenario(
+            "GET /contacts/search",
+            "GET",
+            lambda i: ("/api/contacts/search?first_name=first1", {"headers": account(i)["headers"]}),
+        ),
+        Scenario(
+            "GET /contacts/birthdays",
+            "GET",
+            lambda i: ("/api/contacts/birthdays", {"headers": account(i)["headers"]}),
+        ),
+        Scenario(
+            "GET /contacts/changes",
+            "GET",
+            lambda i: ("/api/contacts/changes", {"headers": account(i)["headers"]}),
+        ),
+        Scenario(
+            "GET /contacts/stats",
+            "GET",
+            lambda i: ("/api/contacts/stats", {"headers": account(i)["headers"]}),
+        ),
+        Scenario(
+            "POST /contacts/batch-get",
+            "POST",
+            lambda i: (
+                "/api/contacts/batch-get",
+                {"headers": account(i)["headers"], "json": {"ids": batch_ids(i)}},
+            ),
+        ),
+        Scenario(
+            "GET /contacts/events",
+            "GET",
+            lambda i: ("/api/contacts/events", {"headers": account(i)["headers"]}),
+            stream=True,
+        ),
+        Scenario(
+            "GET /contacts/{id}",
+            "GET",
+            lambda i: (
+                f"/api/contacts/{account(i)['contacts'][i % len(account(i)['contacts'])]}",
+                {"headers": account(i)["headers"]},
+            ),
+        ),
+        Scenario(
+            "POST /contacts/",
+            "POST",
+            lambda i: ("/api/contacts/", {"headers": account(i)["headers"], "json": contact_body(i)}),
+            ok=(201,),
+        ),
+        Scenario(
+            "PUT /contacts/{id}",
+            "PUT",
+            lambda i: (
+                f"/api/contacts/{created_contact(i)[1]}",
+                {"headers": created_contact(i)[0]["headers"], "json": contact_body(i)},
+            ),
+            ok=(202,),
+        ),
+        Scenario(
+            "DELETE /contacts/{id}",
+            "DELETE",
+            lambda i: (
+                f"/api/contacts/{created_contact(i)[1]}",
+                {"headers": created_contact(i)[0]["headers"]},
+            ),
+            ok=(204,),
+        ),
+        Scenario(
+            "POST /contacts/export",
+            "POST",
+            lambda i: ("/api/contacts/export?format=ndjson", {"headers": accounts[0]["headers"]}),
+            ok=(202,),
+        ),
+        Scenario(
+            "GET /contacts/export/{id}",
+            "GET",
+            lambda i: (
+                f"/api/contacts/export/{export_jobs[i % len(export_jobs)]}",
+                {"headers": accounts[0]["headers"]},
+            ),
+        ),
+    ]
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int, on_response=None):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            url, kwargs = scenario.request(i)
+            started = time.perf_counter()
+            if scenario.stream:
+                response = await open_event_stream(url, kwargs.get("headers", {}))
+            else:
+                response = await client.request(scenario.method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in scenario.ok:
+                if not errors:
+                    print(f"{scenario.name}: {response.status_code} {response.text[:200]}", file=sys.stderr)
+                errors += 1
+            elif on_response is not None:
+                on_response(i, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run(
+    users: int,
+    contacts: int,
+    requests: int,
+    concurrency: int,
+    bcrypt_rounds: int = config.BCRYPT_MIN_ROUNDS,
+) -> dict[str, dict]:
+    workdir = tempfile.mkdtemp(prefix="bench-http-")
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{workdir}/bench.db", connect_args={"timeout": SQLITE_BUSY_TIMEOUT}
+    )
+    session_maker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    auth_service.session_factory = session_maker
+    read_coalescer.session_factory = session_maker
+    idempotency_store.session_factory = session_maker
+    contact_exporter.session_factory = session_maker
+    contact_exporter.directory = Path(workdir) / "exports"
+    contact_exporter.start()
+    auth_service.configure_bcrypt(bcrypt_rounds)
+    # SQLite's single writer looks like congestion to the admission limit; the benchmark
+    # measures the routes, so the limit must not shed the benchmark's own workers
+    admission_limit.min_limit = max(admission_limit.min_limit, 2 * concurrency)
+    admission_limit.limit = max(admission_limit.limit, admission_limit.min_limit)
+    auth_service.cache = FakeAsyncRedis()
+    await FastAPILimiter.init(FakeAsyncRedis(enforce_rate_limits=False))
+
+    accounts = await seed(engine, users, contacts)
+    created: list[tuple[dict, int]] = []
+    export_jobs: list[str] = []
+    scenarios = build_scenarios(accounts, created, export_jobs)
+
+    def remember_created(i, response):
+        created.append((accounts[i % len(accounts)], response.json()["id"]))
+
+    def remember_export(i, response):
+        export_jobs.append(response.json()["id"])
+
+    callbacks = {"POST /contacts/": remember_created, "POST /contacts/export": remember_export}
+    # login is bcrypt bound and every export job reads all contacts, keep them to a sample
+    sampled = {"POST /auth/login": 50, "POST /contacts/export": 20}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios:
+            count = min(requests, sampled.get(scenario.name, requests))
+            callback = callbacks.get(scenario.name)
+            results[scenario.name] = await run_scenario(client, scenario, count, concurrency, callback)
+    await contact_exporter.stop()
+    app.dependency_overrides.pop(get_db, None)
+    await engine.dispose()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=50, help="contacts per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bcrypt-rounds", type=int, default=config.BCRYPT_MIN_ROUNDS)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.users, args.contacts, args.requests, args.concurrency, args.bcrypt_rounds))
+    print_report(results)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Microbenchmarks for the repositories and ``Auth``.
+
+For each dataset size (total contacts) a fresh database is loaded with ``benchmarks.datagen``,
+at 100 contacts per user. Then every function in ``src/repository/contacts.py`` and
+``get_user_by_email`` is timed. The size-independent ``Auth`` work is timed once: bcrypt hash
+and verify, JWT encode and decode, and pickling users for the Redis cache. ``statement.*`` is the
+Python work SQLAlchemy does per query before touching the database (building the statement and
+its compiled-cache key), for a plain ``select()`` and for the repository's lambda statement. ``--bcrypt-rounds``
+sweeps the bcrypt cost: ``auth.login_verify[rounds=N]`` ops/s is logins per core at that cost,
+since a verify runs on a single core.
+
+Usage::
+
+    python -m benchmarks.micro                                   # sizes 1k,10k,100k,1M on SQLite
+    python -m benchmarks.micro --sizes 1000,10000 --iterations 500
+    python -m benchmarks.micro --db-url postgresql+asyncpg://...  # tables are dropped and recreated
+    python -m benchmarks.micro --save-baseline / --tolerance 0.2
+    python -m benchmarks.micro --sizes 1000 --bcrypt-rounds 10,11,12,13
+"""
+import argparse
+import asyncio
+import json
+import pickle
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from jose import jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks import datagen
+from benchmarks.stats import compare, print_report, summarize
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
+from src.schemas.contact import ContactCreateSchema, ContactUpdateSchema
+from src.servises.auth import auth_service
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_BASELINE = RESULTS_DIR / "micro_baseline.json"
+CONTACTS_PER_USER = 100
+
+
+async def timed(fn, iterations: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        result = fn(i)
+        if asyncio.iscoroutine(result):
+            await result
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def bench_auth(iterations: int) -> dict:
+    results = {}
+    hashed = auth_service.get_password_hash(datagen.PASSWORD)
+    bcrypt_iterations = max(iterations // 20, 5)
+    results["auth.bcrypt_hash"] = await timed(
+        lambda i: auth_service.get_password_hash(datagen.PASSWORD), bcrypt_iterations
+    )
+    results["auth.bcrypt_verify"] = await timed(
+        lambda i: auth_service.verify_password(datagen.PASSWORD, hashed), bcrypt_iterations
+    )
+    results["auth.jwt_encode"] = await timed(
+        lambda i: auth_service.create_access_token({"sub": f"user{i}@example.com"}), iterations
+    )
+    token = await auth_service.create_access_token({"sub": "user@example.com"})
+    results["auth.jwt_decode"] = await timed(
+        lambda i: jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM]),
+        iterations,
+    )
+    user = User(id=1, username="bench", email="bench@example.com", password=hashed, confirmed=True)
+    payload = pickle.dumps(user)
+    results["auth.cache_dumps"] = await timed(lambda i: pickle.dumps(user), iterations)
+    results["auth.cache_loads"] = await timed(lambda i: pickle.loads(payload), iterations)
+    return results
+
+
+async def bench_statements(iterations: int) -> dict:
+    return {
+        "statement.get_contact[select]": await timed(
+            lambda i: select(Contact).filter_by(id=i, user_id=1)._generate_cache_key(), iterations
+        ),
+        "statement.get_contact[lambda]": await timed(
+            lambda i: repository_contacts._own_contact_stmt(i, 1)._generate_cache_key(), iterations
+        ),
+    }
+
+
+async def bench_bcrypt_costs(rounds: list[int], iterations: int) -> dict:
+    results = {}
+    original = auth_service.pwd_context
+    try:
+        for cost in rounds:
+            auth_service.configure_bcrypt(cost)
+            hashed = auth_service.get_password_hash(datagen.PASSWORD)
+            results[f"auth.login_verify[rounds={cost}]"] = await timed(
+                lambda i: auth_service.verify_and_update_password(datagen.PASSWORD, hashed),
+                max(iterations // 2 ** max(cost - 8, 0), 3),
+            )
+    finally:
+        auth_service.pwd_context = original
+    return results
+
+
+async def bench_size(db_url: str, size: int, iterations: int) -> dict:
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    started = time.perf_counter()
+    data = await datagen.generate(engine, max(size // CONTACTS_PER_USER, 1), size)
+    print(f"[{size}] loaded in {time.perf_counter() - started:.1f}s")
+
+    session_maker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    rng = random.Random(size)
+    results = {}
+    async with session_maker() as db:
+        user = await repository_users.get_user_by_email(data.emails[-1], db)
+        own = await repository_contacts.get_contacts(CONTACTS_PER_USER, 0, db, user)
+        own_ids = [contact.id for contact in own]
+        per_user = max(len(own_ids), 1)
+
+        def run(name, fn, count=iterations):
+            async def go():
+                results[f"{name}[{size}]"] = await timed(fn, count)
+            return go()
+
+        await run(
+            "users.get_user_by_email",
+            lambda i: repository_users.get_user_by_email(rng.choice(data.emails), db),
+        )
+        await run("contacts.get_contacts", lambda i: repository_contacts.get_contacts(50, 0, db, user))
+        await run(
+            "contacts.get_contacts_deep",
+            lambda i: repository_contacts.get_contacts(10, max(per_user - 10, 0), db, user),
+        )
+        await run(
+            "contacts.get_all_contacts",
+            lambda i: repository_contacts.get_all_contacts(500, rng.randrange(max(size - 500, 1)), db),
+            max(iterations // 10, 5),
+        )
+        await run(
+            "contacts.get_contact",
+            lambda i: repository_contacts.get_contact(rng.choice(own_ids), db, user),
+        )
+        await run(
+            "contacts.search_contacts",
+            lambda i: repository_contacts.search_contacts(
+                rng.choice(datagen.FIRST_NAMES), None, None, db, user
+            ),
+        )
+
+        body = ContactCreateSchema(
+            first_name="Bench", last_name="Contact", email="bench@example.com",
+            phone_number="380000000000", birthday="1990-01-01",
+        )
+        created = []
+
+        async def create(i):
+            created.append((await repository_contacts.create_contact(body, db, user)).id)
+
+        await run("contacts.create_contact", create)
+        update = ContactUpdateSchema(**body.model_dump())
+        await run(
+            "contacts.update_contact",
+            lambda i: repository_contacts.update_contact(created[i % len(created)], update, db, user),
+        )
+        await run(
+            "contacts.delete_contact",
+            lambda i: repository_contacts.delete_contact(created[i], db, user),
+            len(created),
+        )
+    await engine.dispose()
+    return results
+
+
+async def run_all(db_url: str | None, sizes: list[int], iterations: int, bcrypt_rounds: list[int]) -> dict:
+    results = await bench_auth(iterations)
+    results.update(await bench_statements(iterations))
+    results.update(await bench_bcrypt_costs(bcrypt_rounds, iterations))
+    for size in sizes:
+        url = db_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-micro-')}/micro.db"
+        results.update(await bench_size(url, size, iterations))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Repository and auth microbenchmarks.")
+    parser.add_argument("--db-url", default=None, help="defaults to a temporary SQLite file per size")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--bcrypt-rounds", default="", help="comma separated bcrypt costs to sweep")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    bcrypt_rounds = [int(cost) for cost in args.bcrypt_rounds.split(",") if cost]
+    results = asyncio.run(run_all(args.db_url, sizes, args.iterations, bcrypt_rounds))
+    print_report(results, width=40)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import statistics
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """
+    The summarize function turns raw latencies (in seconds) into the numbers we report.
+
+    :param latencies: list[float]: One latency per operation
+    :param elapsed: float: Wall-clock time for all operations, used for throughput
+    :param errors: int: How many operations failed
+    :return: A dict with the count, errors, ops per second and p50/p95/p99 in milliseconds
+
+    """
+    ordered = sorted(latencies) or [0.0]
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    The compare function lists every entry whose p95 or throughput got worse than the
+    baseline by more than tolerance (a fraction, 0.2 means 20%).
+
+    :param results: dict: The current results, keyed by benchmark name
+    :param baseline: dict: Previously stored results in the same shape
+    :param tolerance: float: The allowed relative regression
+    :return: Human readable regression lines
+
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_report(results: dict, width: int = 26) -> None:
+    header = f"{'name':<{width}}{'ops':>8}{'errs':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<{width}}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        )
@@ -1,21 +1,36 @@
+import logging
 from pathlib import Path
 
 import fastapi
 import uvicorn
 import re
 import redis.asyncio as redis
-from fastapi import Depends, HTTPException, status, Request
-from fastapi_limiter import FastAPILimiter
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.staticfiles import StaticFiles
-from src.database.db import get_db
-from src.routes import contacts, auth, users
+from fastapi import HTTPException, status, Request
+from src.routes import contacts, auth, users, batch
 from src.conf.config import config
+from src.servises.compression import CompressionMiddleware, PrecompressedStaticFiles
+from src.servises.admission import AdmissionMiddleware
+from src.servises.avatar import MAX_REQUEST_BYTES as AVATAR_MAX_REQUEST_BYTES
+from src.servises.body_limit import BodySizeLimitMiddleware
+from src.servises.deadline import DeadlineMiddleware
+from src.servises.logs import RequestContextMiddleware, async_logging
+from src.servises.idempotency import idempotency_store
+from src.servises.open_events import open_event_recorder
+from src.servises.contact_stats import contact_stats_reconciler
+from src.servises.email import mail_worker
+from src.servises.export import contact_exporter
+from src.servises.health import health_monitor
+from src.servises.cache_events import user_cache_events
+from src.servises.change_feed import RedisBroker, contact_events
+from src.servises.auth import auth_service
+from src.servises.rate_limit import init_rate_limiter
+from src.servises.sync import tombstone_purger
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Callable
 from fastapi.responses import JSONResponse
 
+logger = logging.getLogger("src.main")
+
 app = fastapi.FastAPI()
 
 origins = ["*"]
@@ -27,15 +42,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(DeadlineMiddleware, budget=config.REQUEST_DEADLINE)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits=[(r"^/api/users/avatar$", AVATAR_MAX_REQUEST_BYTES)],
+    detail="Avatar is too large",
+)
+app.add_middleware(RequestContextMiddleware)
 
 
 BASE_DIR = Path(__file__).parent
 directory = BASE_DIR.joinpath("src").joinpath("static")
-app.mount("/static", StaticFiles(directory=directory), name="static")
+app.mount(
+    "/static",
+    PrecompressedStaticFiles(directory=directory, max_age=config.STATIC_MAX_AGE),
+    name="static",
+)
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(contacts.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
 
 
 user_agent_ban_list = [r"Python-urllib"]
@@ -74,8 +103,50 @@ async def startup():
     :return: A value that is passed to the fastapi instance
 
     """
-    r = await redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0)
-    await FastAPILimiter.init(r)
+    async_logging.start()
+    r = redis.Redis(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=0,
+        socket_timeout=config.REDIS_TIMEOUT,
+        socket_connect_timeout=config.REDIS_TIMEOUT,
+    )
+    if config.BCRYPT_ROUNDS:
+        auth_service.configure_bcrypt(config.BCRYPT_ROUNDS)
+    else:
+        rounds = await auth_service.configure_shared_bcrypt(r)
+        logger.info("bcrypt cost configured", extra={"fields": {"rounds": rounds}})
+    await init_rate_limiter(r)
+    open_event_recorder.start()
+    mail_worker.start()
+    contact_exporter.start()
+    contact_stats_reconciler.start()
+    tombstone_purger.start()
+    health_monitor.start(redis=r)
+    user_cache_events.start(redis=r)
+    idempotency_store.start(redis=r)
+    await contact_events.start(RedisBroker(r))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It writes out any buffered email-open events so they are not lost on restart,
+    and closes the pooled SMTP connections of the mail worker.
+
+    :return: None
+
+    """
+    await open_event_recorder.stop()
+    await mail_worker.stop()
+    await contact_exporter.stop()
+    await contact_stats_reconciler.stop()
+    await tombstone_purger.stop()
+    await contact_events.stop()
+    await health_monitor.stop()
+    await user_cache_events.stop()
+    async_logging.stop()
 
 
 @app.get("/")
@@ -92,27 +163,46 @@ def index():
 
 
 @app.get("/api/healthchecker")
-async def healthchecker(db: AsyncSession = Depends(get_db)):
+async def healthchecker():
     """
-    The healthchecker function is a simple function that checks if the database is up and running.
-    It does this by making a request to the database, which will raise an exception if it's not working.
+    The healthchecker function reports whether the database is up and running.
+    It reads the verdict cached by the health monitor instead of querying the database itself.
 
-    :param db: AsyncSession: Inject the database session
     :return: A json object with a message
 
     """
-    try:
-        # Make request
-        result = await db.execute(text("SELECT 1"))
-        result = result.fetchone()
-        if result is None:
-            raise HTTPException(
-                status_code=500, detail="Database is not configured correctly"
-            )
-        return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+    database = health_monitor.checks.get("database")
+    if database is None or not database["ok"]:
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+    return {"message": "Welcome to FastAPI!"}
+
+
+@app.get("/api/health/live")
+async def liveness():
+    """
+    The liveness function answers the orchestrator's liveness probe.
+    It touches no dependency: if the event loop can answer, the process is alive.
+
+    :return: A json object with the status
+
+    """
+    return {"status": "alive"}
+
+
+@app.get("/api/health/ready")
+async def readiness():
+    """
+    The readiness function answers the readiness probe from the cached health verdict.
+    It returns 503 while Postgres is unreachable, the DB pool is close to exhausted,
+    the event loop is lagging, or the verdict is stale, so load balancers stop routing traffic here.
+    A Redis outage only marks the instance as degraded.
+
+    :return: A json object with the verdict and the individual checks
+
+    """
+    result = health_monitor.status()
+    status_code = status.HTTP_200_OK if result["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=result)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,82 @@
 import contextlib
+import logging
+import uuid
+from fastapi import HTTPException, Request
+from sqlalchemy import event, make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
 
 from src.conf.config import config
+from src.servises.deadline import timeout_for
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineSession(Session):
+    pass
+
+
+@event.listens_for(DeadlineSession, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    """
+    The apply_statement_timeout function gives every transaction opened inside a request a
+    Postgres statement_timeout equal to the request's remaining budget, so a slow query is
+    cancelled by the server instead of holding the pooled connection past the deadline.
+
+    :param session: Session: The session that began a transaction
+    :param transaction: SessionTransaction: The new transaction
+    :param connection: Connection: The connection the transaction runs on
+    :return: None
+
+    """
+    left = timeout_for(None)
+    if left is not None and connection.dialect.name == "postgresql":
+        # SET LOCAL ends with the transaction, so the pooled connection is not affected
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+
+def engine_options(
+    url: str,
+    query_cache_size: int = config.DB_QUERY_CACHE_SIZE,
+    prepared_statement_cache_size: int = config.DB_PREPARED_STATEMENT_CACHE_SIZE,
+    pgbouncer: bool = config.DB_PGBOUNCER,
+) -> dict:
+    """
+    The engine_options function returns the create_async_engine arguments for url.
+
+    SQLAlchemy keeps up to query_cache_size compiled statements per engine. With asyncpg,
+    every connection also keeps up to prepared_statement_cache_size server-side prepared
+    statements. PgBouncer in transaction mode hands each transaction to any server
+    connection, where a statement prepared on another one does not exist, so with pgbouncer
+    both asyncpg caches are off and every statement gets a unique name.
+
+    :param url: str: The database url
+    :param query_cache_size: int: The size of SQLAlchemy's compiled statement cache
+    :param prepared_statement_cache_size: int: The prepared statements kept per asyncpg connection
+    :param pgbouncer: bool: Whether connections go through PgBouncer in transaction mode
+    :return: The keyword arguments for create_async_engine
+
+    """
+    options = {"query_cache_size": query_cache_size}
+    if make_url(url).get_driver_name() != "asyncpg":
+        return options
+    if pgbouncer:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": 0,
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        options["connect_args"] = {"prepared_statement_cache_size": prepared_statement_cache_size}
+    return options
 
 
 class DataBaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self._engine: AsyncEngine | None = create_async_engine(url, **engine_options(url))
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
-                                                                     bind=self._engine)
+                                                                     bind=self._engine,
+                                                                     sync_session_class=DeadlineSession)
 
     @contextlib.asynccontextmanager
     async def session(self):
@@ -17,9 +85,14 @@ class DataBaseSessionManager:
         session = self._session_maker()
         try:
             yield session
-        except Exception as err:
-            print(err)
+        except HTTPException:
+            # 401/404/409 responses are raised through the dependency, they are not failures
+            await session.rollback()
+            raise
+        except Exception:
+            logger.warning("session rolled back", exc_info=True)
             await session.rollback()
+            raise
         finally:
             await session.close()
 
@@ -27,6 +100,11 @@ class DataBaseSessionManager:
 sessionmanager = DataBaseSessionManager(config.DB_URL)
 
 
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncSession:
+    # sequential sub-requests of POST /api/batch share the batch's session
+    shared = getattr(request.state, "db", None)
+    if shared is not None:
+        yield shared
+        return
     async with sessionmanager.session() as session:
         yield session
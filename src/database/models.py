@@ -2,7 +2,7 @@ import enum
 
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean
+from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean, JSON, Index
 from datetime import date
 
 
@@ -12,6 +12,7 @@ class Base(DeclarativeBase):
 
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (Index("ix_contacts_user_id_updated_at", "user_id", "updated_at"),)
     id: Mapped[int] = mapped_column(primary_key=True)
     first_name: Mapped[str] = mapped_column(String(25))
     last_name: Mapped[str] = mapped_column(String(25))
@@ -25,6 +26,22 @@ class Contact(Base):
     user: Mapped["User"] = relationship("User", backref="contacts", lazy="joined")
 
 
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (Index("ix_contact_tombstones_user_id_deleted_at", "user_id", "deleted_at"),)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    contact_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    deleted_at: Mapped[date] = mapped_column("deleted_at", DateTime, default=func.now(), nullable=False)
+
+
+class ContactCounter(Base):
+    __tablename__ = "contact_counters"
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    name: Mapped[str] = mapped_column(String(20), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
 class Role(enum.Enum):
     admin: str = "admin"
     moderator: str = "moderator"
@@ -43,3 +60,32 @@ class User(Base):
     role: Mapped[Enum] = mapped_column("role", Enum(Role), default=Role.user, nullable=True)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
     avatar: Mapped[str] = mapped_column(String(255), nullable=True)
+
+
+class EmailOpen(Base):
+    __tablename__ = "email_opens"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), index=True)
+    opened_at: Mapped[date] = mapped_column("opened_at", DateTime, default=func.now())
+
+
+class EmailStatus(enum.Enum):
+    pending: str = "pending"
+    sending: str = "sending"
+    sent: str = "sent"
+    failed: str = "failed"
+
+
+class OutboundEmail(Base):
+    __tablename__ = "outbound_emails"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(String(75), nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    template_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    template_body: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[Enum] = mapped_column("status", Enum(EmailStatus), default=EmailStatus.pending, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[date] = mapped_column("next_attempt_at", DateTime, index=True)
+    last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[date] = mapped_column("created_at", DateTime, default=func.now())
+    sent_at: Mapped[date] = mapped_column("sent_at", DateTime, nullable=True)
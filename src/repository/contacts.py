@@ -1,11 +1,156 @@
-from sqlalchemy import select
+from collections import Counter
+from datetime import date, datetime
 
+from sqlalchemy import and_, delete, extract, func, lambda_stmt, or_, select, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.models import Contact
-from src.schemas.contact import ContactUpdateSchema, ContactCreateSchema
+from src.database.models import Contact, ContactCounter, ContactTombstone
+from src.schemas.contact import ContactUpdateSchema, ContactCreateSchema, ContactResponseSchema
+from src.servises.change_feed import contact_events
 from src.database.models import User
 
 
+TOTAL_COUNTER = "total"
+# pg advisory lock held by the worker that reconciles the contact counters
+RECONCILE_LOCK_ID = 7_046_001
+
+
+# The hot queries below are lambda statements: SQLAlchemy caches the construct per lambda and
+# only extracts the closure variables as bound parameters on each call, instead of building a
+# select() and computing its cache key every time. Closure variables must be plain values.
+
+
+def _own_contact_stmt(contact_id: int, user_id: int):
+    return lambda_stmt(lambda: select(Contact).filter_by(id=contact_id, user_id=user_id))
+
+
+def birthday_counter(month: int) -> str:
+    return f"birthday:{month:02d}"
+
+
+def _contact_counters(birthday: date | None) -> list[str]:
+    names = [TOTAL_COUNTER]
+    if birthday is not None:
+        names.append(birthday_counter(birthday.month))
+    return names
+
+
+async def _bump_counters(db: AsyncSession, user_id: int | None, deltas: Counter) -> None:
+    """
+    The _bump_counters function adds deltas to the user's contact counters in the current
+    transaction, with one INSERT ... ON CONFLICT DO UPDATE, so the counters change together
+    with the contacts they count.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int | None: The owner of the contacts
+    :param deltas: Counter: The change of every counter
+    :return: None
+
+    """
+    values = [
+        {"user_id": user_id, "name": name, "value": delta}
+        for name, delta in deltas.items()
+        if delta
+    ]
+    if user_id is None or not values:
+        return
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(ContactCounter).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ContactCounter.user_id, ContactCounter.name],
+        set_={"value": ContactCounter.value + stmt.excluded.value},
+    )
+    await db.execute(stmt)
+
+
+async def _publish_change(event_type: str, contact: Contact) -> None:
+    if contact.user_id is None:
+        return
+    payload = None
+    if event_type != "deleted":
+        payload = ContactResponseSchema.model_validate(contact).model_dump(mode="json")
+    await contact_events.publish(contact.user_id, event_type, contact.id, payload)
+
+
+async def get_contact_counters(db: AsyncSession, current_user: User) -> dict[str, int]:
+    """
+    The get_contact_counters function returns the user's contact counters: the total and
+    one counter per birthday month. It reads at most 13 rows by primary key.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the user whose counters are read
+    :return: A dict of counter name to value
+
+    """
+    user_id = current_user.id
+    stmt = lambda_stmt(
+        lambda: select(ContactCounter.name, ContactCounter.value).filter_by(user_id=user_id)
+    )
+    rows = await db.execute(stmt)
+    return dict(rows.all())
+
+
+async def reconcile_contact_counters(db: AsyncSession) -> int:
+    """
+    The reconcile_contact_counters function recounts every user's contacts and corrects
+    the stored counters that differ from the result, fixing any drift.
+
+    On Postgres only one worker reconciles at a time, the others return at once. The
+    counters table is locked against writes while the contacts are counted: a contact
+    write bumps its counters in the same transaction, so every write either finished before
+    the count (and is counted) or waits and bumps the corrected counter after it.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The number of counters corrected
+
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    if dialect is postgresql:
+        if not await db.scalar(select(func.pg_try_advisory_xact_lock(RECONCILE_LOCK_ID))):
+            await db.rollback()
+            return 0
+        await db.execute(text(f"LOCK TABLE {ContactCounter.__tablename__} IN EXCLUSIVE MODE"))
+    month = extract("month", Contact.birthday)
+    totals = await db.execute(
+        select(Contact.user_id, func.count())
+        .where(Contact.user_id.isnot(None))
+        .group_by(Contact.user_id)
+    )
+    months = await db.execute(
+        select(Contact.user_id, month, func.count())
+        .where(Contact.user_id.isnot(None), Contact.birthday.isnot(None))
+        .group_by(Contact.user_id, month)
+    )
+    counts = {(user_id, TOTAL_COUNTER): count for user_id, count in totals.all()}
+    counts.update(
+        ((user_id, birthday_counter(int(month))), count) for user_id, month, count in months.all()
+    )
+    stored = await db.execute(
+        select(ContactCounter.user_id, ContactCounter.name, ContactCounter.value)
+    )
+    stored = {(user_id, name): value for user_id, name, value in stored.all()}
+
+    changed = [
+        {"user_id": user_id, "name": name, "value": count}
+        for (user_id, name), count in counts.items()
+        if stored.get((user_id, name)) != count
+    ]
+    stale = [key for key, value in stored.items() if value and key not in counts]
+    if changed:
+        stmt = dialect.insert(ContactCounter).values(changed)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ContactCounter.user_id, ContactCounter.name],
+            set_={"value": stmt.excluded.value},
+        )
+        await db.execute(stmt)
+    if stale:
+        await db.execute(
+            delete(ContactCounter).where(tuple_(ContactCounter.user_id, ContactCounter.name).in_(stale))
+        )
+    await db.commit()
+    return len(changed) + len(stale)
+
+
 async def get_contacts(limit: int, offset: int, db: AsyncSession, current_user: User):
     """
     The get_contacts function returns a list of contacts for the current user.
@@ -17,11 +162,44 @@ async def get_contacts(limit: int, offset: int, db: AsyncSession, current_user:
     :return: A list of contacts
 
     """
-    stmt = select(Contact).filter_by(user=current_user).offset(offset).limit(limit)
+    user_id = current_user.id
+    stmt = lambda_stmt(
+        lambda: select(Contact)
+        .filter_by(user_id=user_id)
+        .order_by(Contact.id)
+        .offset(offset)
+        .limit(limit)
+    )
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
 
+async def get_contacts_versions(
+    limit: int, offset: int, db: AsyncSession, current_user: User
+):
+    """
+    The get_contacts_versions function returns the id and updated_at pairs of the page
+    that get_contacts would return, without loading the contacts themselves.
+
+    :param limit: int: Limit the number of rows returned
+    :param offset: int: Specify the number of records to skip
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the current user from the database
+    :return: A list of (id, updated_at) rows
+
+    """
+    user_id = current_user.id
+    stmt = lambda_stmt(
+        lambda: select(Contact.id, Contact.updated_at)
+        .filter_by(user_id=user_id)
+        .order_by(Contact.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    rows = await db.execute(stmt)
+    return rows.all()
+
+
 async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
     """
     The get_all_contacts function returns a list of all contacts in the database.
@@ -32,11 +210,136 @@ async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
     :return: A list of contacts
 
     """
-    stmt = select(Contact).offset(offset).limit(limit)
+    stmt = lambda_stmt(lambda: select(Contact).offset(offset).limit(limit))
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
 
+async def get_contact_id_range(db: AsyncSession) -> tuple[int | None, int | None]:
+    """
+    The get_contact_id_range function returns the smallest and the largest contact id.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The lowest and highest id, both None if there are no contacts
+
+    """
+    stmt = select(func.min(Contact.id), func.max(Contact.id))
+    result = await db.execute(stmt)
+    return tuple(result.one())
+
+
+async def get_contacts_chunk(first_id: int, end_id: int, db: AsyncSession):
+    """
+    The get_contacts_chunk function returns the plain column values of every contact whose
+    id lies in [first_id, end_id), without joining the owner.
+
+    :param first_id: int: The first id of the range
+    :param end_id: int: The id right after the range
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of row mappings ordered by id
+
+    """
+    stmt = (
+        select(Contact.__table__)
+        .where(Contact.id >= first_id, Contact.id < end_id)
+        .order_by(Contact.id)
+    )
+    rows = await db.execute(stmt)
+    return rows.mappings().all()
+
+
+def _as_column_time(db: AsyncSession, value: datetime):
+    # SQLite stores func.now() defaults as text without fractions of a second, while a bound
+    # datetime is rendered with microseconds, so compare it in the stored format
+    if db.get_bind().dialect.name == "sqlite":
+        return func.datetime(value)
+    return value
+
+
+async def get_database_time(db: AsyncSession) -> datetime:
+    """
+    The get_database_time function returns the database's current time, the clock that
+    sets updated_at and deleted_at. The columns are naive timestamps, so the time is naive
+    too: on Postgres it is LOCALTIMESTAMP, the value now() is stored as in those columns,
+    since asyncpg returns now() itself timezone-aware.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The current time of the database, without a timezone
+
+    """
+    now = func.localtimestamp() if db.get_bind().dialect.name == "postgresql" else func.now()
+    return (await db.scalar(select(now))).replace(tzinfo=None)
+
+
+async def get_contact_changes(
+    after: tuple[datetime, int] | None, limit: int, db: AsyncSession, current_user: User
+):
+    """
+    The get_contact_changes function returns the user's contacts ordered by (updated_at, id),
+    starting right after the given position. It is served by the (user_id, updated_at) index.
+
+    :param after: tuple[datetime, int] | None: The (updated_at, id) to continue after, None for all
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the user whose contacts are read
+    :return: A list of contacts
+
+    """
+    stmt = select(Contact).filter_by(user_id=current_user.id)
+    if after is not None:
+        updated_at, contact_id = after
+        updated_at = _as_column_time(db, updated_at)
+        stmt = stmt.where(
+            or_(
+                Contact.updated_at > updated_at,
+                and_(Contact.updated_at == updated_at, Contact.id > contact_id),
+            )
+        )
+    stmt = stmt.order_by(Contact.updated_at, Contact.id).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+async def get_contact_tombstones(
+    since: datetime, until: datetime | None, db: AsyncSession, current_user: User
+) -> list[int]:
+    """
+    The get_contact_tombstones function returns the ids of the user's contacts deleted
+    between since and until, both inclusive.
+
+    :param since: datetime: The earliest deletion time
+    :param until: datetime | None: The latest deletion time, None for no limit
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the user whose deletions are read
+    :return: A list of contact ids
+
+    """
+    stmt = select(ContactTombstone.contact_id).where(
+        ContactTombstone.user_id == current_user.id,
+        ContactTombstone.deleted_at >= _as_column_time(db, since),
+    )
+    if until is not None:
+        stmt = stmt.where(ContactTombstone.deleted_at <= _as_column_time(db, until))
+    rows = await db.execute(stmt.order_by(ContactTombstone.deleted_at, ContactTombstone.id))
+    return list(dict.fromkeys(rows.scalars().all()))
+
+
+async def purge_contact_tombstones(before: datetime, db: AsyncSession) -> int:
+    """
+    The purge_contact_tombstones function deletes the tombstones older than before.
+
+    :param before: datetime: Delete the tombstones of contacts deleted before this time
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The number of tombstones deleted
+
+    """
+    result = await db.execute(
+        delete(ContactTombstone).where(ContactTombstone.deleted_at < _as_column_time(db, before))
+    )
+    await db.commit()
+    return result.rowcount
+
+
 async def get_contact(contact_id: int, db: AsyncSession, current_user: User):
     """
     The get_contact function returns a contact from the database.
@@ -47,11 +350,48 @@ async def get_contact(contact_id: int, db: AsyncSession, current_user: User):
     :return: A contact object
 
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=current_user)
-    contacts = await db.execute(stmt)
+    contacts = await db.execute(_own_contact_stmt(contact_id, current_user.id))
     return contacts.scalar_one_or_none()
 
 
+async def get_contacts_by_ids(ids: list[int], db: AsyncSession, current_user: User):
+    """
+    The get_contacts_by_ids function returns the current user's contacts with the given ids
+    in one query.
+
+    :param ids: list[int]: The ids of the contacts
+    :param db: AsyncSession: Pass in the database session
+    :param current_user: User: Ensure that the user is only able to access their own contacts
+    :return: A list of contacts in no particular order
+
+    """
+    user_id = current_user.id
+    stmt = lambda_stmt(
+        lambda: select(Contact).filter(Contact.id.in_(ids)).filter_by(user_id=user_id)
+    )
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+async def get_contact_version(contact_id: int, db: AsyncSession, current_user: User):
+    """
+    The get_contact_version function returns the id and updated_at of a single contact,
+    without loading the contact itself.
+
+    :param contact_id: int: Specify the id of the contact
+    :param db: AsyncSession: Pass in the database session
+    :param current_user: User: Ensure that the user is only able to access their own contacts
+    :return: A (id, updated_at) row or None
+
+    """
+    user_id = current_user.id
+    stmt = lambda_stmt(
+        lambda: select(Contact.id, Contact.updated_at).filter_by(id=contact_id, user_id=user_id)
+    )
+    row = await db.execute(stmt)
+    return row.one_or_none()
+
+
 async def create_contact(
     body: ContactCreateSchema, db: AsyncSession, current_user: User
 ):
@@ -66,8 +406,10 @@ async def create_contact(
     """
     contact = Contact(**body.model_dump(exclude_unset=True), user=current_user)
     db.add(contact)
+    await _bump_counters(db, current_user.id, Counter(_contact_counters(contact.birthday)))
     await db.commit()
     await db.refresh(contact)
+    await _publish_change("created", contact)
     return contact
 
 
@@ -84,17 +426,20 @@ async def update_contact(
     :return: The updated contact
 
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=current_user)
-    result = await db.execute(stmt)
+    result = await db.execute(_own_contact_stmt(contact_id, current_user.id))
     contact = result.scalar_one_or_none()
     if contact:
+        deltas = Counter(_contact_counters(body.birthday))
+        deltas.subtract(_contact_counters(contact.birthday))
         contact.first_name = body.first_name
         contact.last_name = body.last_name
         contact.email = body.email
         contact.phone_number = body.phone_number
         contact.birthday = body.birthday
+        await _bump_counters(db, contact.user_id, deltas)
         await db.commit()
         await db.refresh(contact)
+        await _publish_change("updated", contact)
     return contact
 
 
@@ -108,12 +453,18 @@ async def delete_contact(contact_id: int, db: AsyncSession, current_user: User):
     :return: A contact object
 
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=current_user)
-    contact = await db.execute(stmt)
+    contact = await db.execute(_own_contact_stmt(contact_id, current_user.id))
     contact = contact.scalar_one_or_none()
     if contact:
         await db.delete(contact)
+        if contact.user_id is not None:
+            # keep a tombstone so delta sync clients learn about the deletion
+            db.add(ContactTombstone(contact_id=contact.id, user_id=contact.user_id))
+        deltas = Counter()
+        deltas.subtract(_contact_counters(contact.birthday))
+        await _bump_counters(db, contact.user_id, deltas)
         await db.commit()
+        await _publish_change("deleted", contact)
     return contact
 
 
@@ -131,15 +482,16 @@ async def search_contacts(
     :return: A list of contact objects
 
     """
+    user_id = current_user.id
+    query = lambda_stmt(lambda: select(Contact).filter_by(user_id=user_id))
 
-    query = select(Contact).filter_by(user=current_user)
-
+    # each combination of filters is cached separately
     if first_name:
-        query = query.filter(Contact.first_name == first_name)
+        query += lambda s: s.filter(Contact.first_name == first_name)
     if last_name:
-        query = query.filter(Contact.last_name == last_name)
+        query += lambda s: s.filter(Contact.last_name == last_name)
     if email:
-        query = query.filter(Contact.email == email)
+        query += lambda s: s.filter(Contact.email == email)
 
     contacts = await db.execute(query)
     return contacts.scalars().all()
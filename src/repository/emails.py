@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import OutboundEmail, EmailStatus
+
+
+async def enqueue_email(
+    recipient: str,
+    subject: str,
+    template_name: str,
+    template_body: dict,
+    db: AsyncSession,
+) -> OutboundEmail:
+    """
+    The enqueue_email function stores an outbound email in the queue table.
+    The message is durable as soon as this returns, and a mail worker will pick it up.
+
+    :param recipient: str: The address to send the email to
+    :param subject: str: The subject line
+    :param template_name: str: The template used to render the body
+    :param template_body: dict: The variables passed to the template
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The queued email
+
+    """
+    email = OutboundEmail(
+        recipient=recipient,
+        subject=subject,
+        template_name=template_name,
+        template_body=template_body,
+        status=EmailStatus.pending,
+        attempts=0,
+        next_attempt_at=datetime.now(),
+    )
+    db.add(email)
+    await db.commit()
+    return email
+
+
+async def claim_emails(limit: int, lease: float, db: AsyncSession) -> list[OutboundEmail]:
+    """
+    The claim_emails function takes up to limit due emails off the queue.
+    Claimed rows are marked as sending and leased for lease seconds. If a worker dies mid-send,
+    the lease expires and another worker picks the row up again.
+    On Postgres the rows are locked with SKIP LOCKED, so concurrent workers never claim the same email.
+
+    :param limit: int: The maximum number of emails to claim
+    :param lease: float: How long the claim is valid, in seconds
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of detached emails
+
+    """
+    now = datetime.now()
+    stmt = (
+        select(OutboundEmail)
+        .where(
+            OutboundEmail.status.in_((EmailStatus.pending, EmailStatus.sending)),
+            OutboundEmail.next_attempt_at <= now,
+        )
+        .order_by(OutboundEmail.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(stmt)
+    emails = result.scalars().all()
+    for email in emails:
+        email.status = EmailStatus.sending
+        email.attempts += 1
+        email.next_attempt_at = now + timedelta(seconds=lease)
+    await db.flush()
+    # detach before commit so the worker can read the rows without them being expired
+    for email in emails:
+        db.expunge(email)
+    await db.commit()
+    return emails
+
+
+async def mark_sent(email_ids: list[int], db: AsyncSession) -> None:
+    """
+    The mark_sent function marks delivered emails as sent.
+
+    :param email_ids: list[int]: The ids of the delivered emails
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+
+    """
+    if not email_ids:
+        return
+    stmt = (
+        update(OutboundEmail)
+        .where(OutboundEmail.id.in_(email_ids))
+        .values(status=EmailStatus.sent, sent_at=datetime.now(), last_error=None)
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def mark_failed(
+    email: OutboundEmail, error: str, max_attempts: int, backoff: float, db: AsyncSession
+) -> None:
+    """
+    The mark_failed function records a failed delivery attempt.
+    The email is rescheduled with exponential backoff, or given up on once it
+    has used all max_attempts attempts.
+
+    :param email: OutboundEmail: The email that could not be delivered
+    :param error: str: The delivery error
+    :param max_attempts: int: Give up after this many attempts
+    :param backoff: float: The delay before the first retry, in seconds
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+
+    """
+    if email.attempts >= max_attempts:
+        values = {"status": EmailStatus.failed}
+    else:
+        delay = min(backoff * 2 ** (email.attempts - 1), 3600)
+        values = {
+            "status": EmailStatus.pending,
+            "next_attempt_at": datetime.now() + timedelta(seconds=delay),
+        }
+    stmt = (
+        update(OutboundEmail)
+        .where(OutboundEmail.id == email.id)
+        .values(last_error=error[:255], **values)
+    )
+    await db.execute(stmt)
+    await db.commit()
@@ -1,11 +1,12 @@
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import lambda_stmt, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
 
 from src.database.db import get_db
 from src.database.models import User
 from src.schemas.user import UserSchema
+from src.servises.cache_events import user_cache_events
 
 
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
@@ -18,26 +19,50 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     :return: A single user object
 
     """
-    stmt = select(User).filter_by(email=email)
+    stmt = lambda_stmt(lambda: select(User).filter_by(email=email))
     user = await db.execute(stmt)
     user = user.scalar_one_or_none()
     return user
 
 
-async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
+async def get_user_by_id(user_id: int, db: AsyncSession):
+    """
+    The get_user_by_id function returns the user with the given id, or None.
+
+    :param user_id: int: The id of the user
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A single user object
+
+    """
+    return await db.get(User, user_id)
+
+
+async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)) -> User | None:
     """
     The create_user function creates a new user in the database.
+    It is a single INSERT ... ON CONFLICT DO NOTHING RETURNING statement, so two concurrent
+    signups with the same email cannot both pass an existence check and fail on the unique index.
 
     :param body: UserSchema: Validate the request body
     :param db: AsyncSession: Pass the database session to the function
-    :return: A user object
+    :return: The new user object, or None if the email is already taken
 
     """
-    avatar: Optional[str] = None
-    new_user = User(**body.model_dump(), avatar=avatar)
-    db.add(new_user)
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = (
+        dialect.insert(User)
+        .values(**body.model_dump(), avatar=None)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    )
+    new_user = await db.scalar(stmt)
+    if new_user is None:
+        await db.rollback()
+        return None
+    # detach before commit so the returned row is not expired and reloaded
+    db.expunge(new_user)
     await db.commit()
-    await db.refresh(new_user)
+    await user_cache_events.publish(new_user.email)
     return new_user
 
 
@@ -53,37 +78,56 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     """
     user.refresh_token = token
     await db.commit()
+    await user_cache_events.publish(user.email)
 
 
-async def confirmed_email(email: str, db: AsyncSession) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> bool:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
+    It is one UPDATE statement that only touches a user who is not confirmed yet.
 
-
-    :param email: str: Get the user's email address, and the db: asyncsession parameter is used to connect to our database
+    :param email: str: Get the user's email address
     :param db: AsyncSession: Pass the database connection to the function
-    :return: None
+    :return: True if the user was confirmed now, False if there is no such unconfirmed user
 
     """
-    user = await get_user_by_email(email, db)
-    user.confirmed = True
+    stmt = (
+        update(User)
+        .where(User.email == email, User.confirmed.isnot(True))
+        .values(confirmed=True)
+        .returning(User.id)
+    )
+    user_id = await db.scalar(stmt)
     await db.commit()
+    if user_id is None:
+        return False
+    await user_cache_events.publish(email)
+    return True
 
 
-async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
+async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User | None:
     """
     The update_avatar_url function updates the avatar url of a user.
+    It is a single UPDATE ... RETURNING statement instead of a read, a write and a refresh.
 
     :param email: str: Identify the user
     :param url: str | None: Specify that the url parameter can be either a string or none
     :param db: AsyncSession: Pass the database session to the function
-    :return: The updated user object
+    :return: The updated user object, or None if there is no such user
 
     """
-
-    user = await get_user_by_email(email, db)
-    user.avatar = url
+    stmt = (
+        update(User)
+        .where(User.email == email)
+        .values(avatar=url)
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+    user = await db.scalar(stmt)
+    if user is not None:
+        db.expunge(user)
     await db.commit()
-    await db.refresh(user)
+    if user is not None:
+        await user_cache_events.publish(email)
     return user
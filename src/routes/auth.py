@@ -1,9 +1,10 @@
+import asyncio
+
 from fastapi import (
     APIRouter,
     HTTPException,
     Depends,
     status,
-    BackgroundTasks,
     Request,
     Response,
 )
@@ -19,15 +20,18 @@ from src.schemas.user import (
     TokenSchema,
     RequestEmailSchema,
 )
+from src.conf import messages
 from src.database.db import get_db
 from src.repository import users as repositories_users
 from src.servises.auth import auth_service
 from src.servises.email import send_email
-from fastapi.responses import FileResponse
+from src.servises.open_events import open_event_recorder
+from pathlib import Path
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 get_refresh_token = HTTPBearer()
+OPEN_EMAIL_PIXEL = Path(__file__).parent.parent.joinpath("static", "1x1.png").read_bytes()
 
 
 @router.post(
@@ -35,32 +39,38 @@ get_refresh_token = HTTPBearer()
 )
 async def signup(
     body: UserSchema,
-    bt: BackgroundTasks,
     request: Request,
     db: AsyncSession = Depends(get_db),
 ):
     """
     The signup function creates a new user in the database.
         It takes in a UserSchema object, which is validated by pydantic.
+        It hashes the password and creates a new user using create_user from repositories/users.py.
         If the email already exists, it raises an HTTPException with status code 409 (Conflict).
-        Otherwise, it hashes the password and creates a new user using create_user from repositories/users.py.
+        A known email is rejected before the costly hash, and the check's transaction ends
+        before hashing; the conflict-safe insert still catches two concurrent signups with
+        the same email.
 
     :param body: UserSchema: Validate the request body
-    :param bt: BackgroundTasks: Add a background task to the queue
     :param request: Request: Get the base url of the request
     :param db: AsyncSession: Get the database session
     :return: A new user
 
     """
 
-    exist_user = await repositories_users.get_user_by_email(body.email, db)
-    if exist_user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Account already exists"
-        )
-    body.password = auth_service.get_password_hash(body.password)
+    account_exists = HTTPException(
+        status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST
+    )
+    if await repositories_users.get_user_by_email(body.email, db) is not None:
+        raise account_exists
+    # end the read transaction, so no connection or lock is held through the hash
+    await db.rollback()
+    # bcrypt releases the GIL; hashed on the loop it would stall every other request
+    body.password = await asyncio.to_thread(auth_service.get_password_hash, body.password)
     new_user = await repositories_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    if new_user is None:
+        raise account_exists
+    await send_email(new_user.email, new_user.username, str(request.base_url), db)
     return new_user
 
 
@@ -70,6 +80,8 @@ async def login(
 ):
     """
     The login function is used to authenticate a user.
+    The password is checked in a worker thread, so bcrypt does not block the event loop.
+    A stored hash with an outdated bcrypt cost is replaced in the same UPDATE as the refresh token.
 
     :param body: OAuth2PasswordRequestForm: Validate the request body
     :param db: AsyncSession: Get a database session
@@ -86,10 +98,16 @@ async def login(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed"
         )
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await asyncio.to_thread(
+        auth_service.verify_and_update_password, body.password, user.password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
         )
+    if new_hash is not None:
+        # the hash uses an outdated cost, it is written together with the refresh token
+        user.password = new_hash
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
@@ -155,21 +173,20 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
 
     email = await auth_service.get_email_from_token(token)
+    if await repositories_users.confirmed_email(email, db):
+        return {"message": "Email confirmed"}
+    # nothing was updated: either there is no such user or it is already confirmed
     user = await repositories_users.get_user_by_email(email, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error"
         )
-    if user.confirmed:
-        return {"message": "Your email is already confirmed"}
-    await repositories_users.confirmed_email(email, db)
-    return {"message": "Email confirmed"}
+    return {"message": "Your email is already confirmed"}
 
 
 @router.post("/request_email")
 async def request_email(
     body: RequestEmailSchema,
-    background_tasks: BackgroundTasks,
     request: Request,
     db: AsyncSession = Depends(get_db),
 ):
@@ -180,7 +197,6 @@ async def request_email(
     email with a confirmation link.
 
     :param body: RequestEmailSchema: Validate the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base_url of the request
     :param db: AsyncSession: Get the database session
     :return: A message that the user can see
@@ -192,34 +208,30 @@ async def request_email(
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(
-            send_email, user.email, user.username, str(request.base_url)
-        )
+        await send_email(user.email, user.username, str(request.base_url), db)
     return {"message": "Check your email for confirmation"}
 
 
 @router.get("/{username}")
-async def request_email(
-    username: str, response: Response, db: AsyncSession = Depends(get_db)
-):
+async def open_email(username: str):
     """
-    The request_email function is used to send an email to the user's email address.
-    The function takes in a username and returns a response object with the image of an open envelope.
+    The open_email function serves the tracking pixel embedded in our emails.
+    The pixel is kept in memory and the open event is only buffered here,
+    so the request does no disk or database I/O; the buffer is written to the
+    email_opens table in batches by the open event recorder.
 
-    :param username: str: Get the username of the user that is requesting to open their email
-    :param response: Response: Return a response to the user
-    :param db: AsyncSession: Get the database session
-    :return: A file response, which is a type of response that returns a file
+    :param username: str: Get the username of the user that opened the email
+    :return: A 1x1 png image
 
     """
 
-    print("--------------------------------------")
-    print("--------------------------------------")
-    print(f"{username} open email")
-    print("--------------------------------------")
-    print("--------------------------------------")
-    return FileResponse(
-        "src/static/open_email.png",
-        media_type="image.png",
-        content_disposition_type="inline",
+    open_event_recorder.record(username)
+    return Response(
+        content=OPEN_EMAIL_PIXEL,
+        media_type="image/png",
+        headers={
+            "Content-Disposition": "inline",
+            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+            "Pragma": "no-cache",
+        },
     )
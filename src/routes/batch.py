@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import get_db
+from src.database.models import User
+from src.schemas.batch import BatchResponseSchema, BatchSchema
+from src.servises.auth import auth_service
+from src.servises.batch import run_batch
+from src.servises.rate_limit import RateLimiter
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+
+@router.post(
+    "",
+    response_model=BatchResponseSchema,
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def batch(
+    body: BatchSchema,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The batch function runs several API requests in one round trip, e.g. everything a page
+    needs on load. The caller is authenticated once for all of them; each sub-request still
+    passes its route's own checks and rate limits and gets its own status in the response.
+
+    :param body: BatchSchema: The sub-requests, each with method, path, headers and body
+    :param request: Request: The batch request the sub-requests are derived from
+    :param db: AsyncSession: The session shared by sub-requests that are not GETs
+    :param user: User: The authenticated user
+    :return: The responses in request order
+
+    """
+    return {"responses": await run_batch(request, body.requests, user, db)}
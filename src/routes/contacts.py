@@ -1,21 +1,45 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
-from fastapi_limiter.depends import RateLimiter
+import logging
+
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Header, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.contact import (
+    ContactBatchGetSchema,
+    ContactBatchResponseSchema,
+    ContactChangesSchema,
     ContactCreateSchema,
     ContactResponseSchema,
+    ContactStatsSchema,
     ContactUpdateSchema,
+    ExportJobSchema,
 )
 from src.database.db import get_db
 from src.repository import contacts as repositories_contacts
+from src.repository import users as repositories_users
 from datetime import datetime, timedelta
 from src.database.models import Contact, User, Role
 from sqlalchemy import select, cast, Date
 from src.servises.auth import auth_service
+from src.servises.change_feed import EventStreamResponse, contact_events
+from src.servises.rate_limit import RateLimiter
+from src.servises.coalesce import read_coalescer
+from src.servises.contact_stats import contact_stats
+from src.servises.deadline import RequestDeadline
+from src.servises.etag import make_etag, etag_matches
+from src.servises.export import contact_exporter
+from src.servises.idempotency import REPLAYED_HEADER, fingerprint, idempotency_store
 from src.servises.role import RoleAccess
+from src.servises.sync import get_changes
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 access_to_route_all = RoleAccess([Role.admin, Role.moderator])
+access_to_export = RoleAccess([Role.admin])
+contact_list = TypeAdapter(list[ContactResponseSchema])
 
 
 @router.get(
@@ -24,26 +48,38 @@ access_to_route_all = RoleAccess([Role.admin, Role.moderator])
     dependencies=[Depends(RateLimiter(times=1, seconds=20))],
 )
 async def get_contacts(
+    response: Response,
     limit: int = Query(10, ge=10, le=500),
     offset: int = Query(0, ge=0),
+    if_none_match: str | None = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The get_contacts function returns a list of contacts.
+    The page carries a strong ETag built from the contact ids and updated_at values,
+    and a request whose If-None-Match matches it gets 304 Not Modified without a body.
 
     :param limit: int: Limit the number of results returned
     :param ge: Specify the minimum value for a parameter
     :param le: Limit the number of contacts returned to 500
     :param offset: int: Skip the first n records
     :param ge: Specify a minimum value, and the le parameter is used to specify a maximum value
+    :param if_none_match: str | None: The ETag the client already holds
     :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the current user from the database
     :param : Get the contact id
     :return: A list of contacts
 
     """
+    versions = await repositories_contacts.get_contacts_versions(
+        limit, offset, db, current_user
+    )
+    etag = make_etag(versions, current_user.id, current_user.updated_at)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     contacts = await repositories_contacts.get_contacts(limit, offset, db, current_user)
     return contacts
 
@@ -51,32 +87,181 @@ async def get_contacts(
 @router.get(
     "/all",
     response_model=list[ContactResponseSchema],
-    dependencies=[Depends(access_to_route_all)],
+    # admin listing scans up to 500 rows of every user, give it more than the default budget
+    dependencies=[Depends(RequestDeadline(30)), Depends(access_to_route_all)],
 )
 async def get_all_contacts(
+    request: Request,
     limit: int = Query(10, ge=10, le=500),
     offset: int = Query(0, ge=0),
-    db: AsyncSession = Depends(get_db),
     user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The get_all_contacts function returns a list of contacts.
+    Identical concurrent requests of the same user share one query and one serialized body,
+    run on a session of the coalescer, since it may outlive this request.
 
+    :param request: Request: Build the coalescing key from the route and query parameters
     :param limit: int: Limit the number of contacts returned
     :param ge: Set a minimum value for the limit parameter
     :param le: Limit the number of contacts returned to 500
     :param offset: int: Specify the offset of the contacts to be returned
     :param ge: Set the minimum value for the limit parameter
-    :param db: AsyncSession: Get the database session
     :param user: User: Get the user who sent the request
     :param : Get the contact by id
     :return: A list of contacts
 
     """
-    contacts = await repositories_contacts.get_all_contacts(limit, offset, db)
-    print(contacts)
-    return contacts
+
+    async def load(db: AsyncSession) -> bytes:
+        contacts = await repositories_contacts.get_all_contacts(limit, offset, db)
+        logger.debug("listed all contacts", extra={"fields": {"count": len(contacts), "offset": offset}})
+        return contact_list.dump_json(contact_list.validate_python(contacts, from_attributes=True))
+
+    body = await read_coalescer.run(read_coalescer.key(request, user.id), load)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/changes",
+    response_model=ContactChangesSchema,
+    # a sync may take a few pages in a row
+    dependencies=[Depends(RateLimiter(times=10, seconds=20))],
+)
+async def get_contact_changes(
+    since: str | None = Query(None, max_length=128),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+
+    The get_contact_changes function lets a client keep an offline copy of its contacts in
+    sync. It returns the contacts created or updated since the sync token and the ids of the
+    contacts deleted since then, so the traffic follows the number of changes.
+
+    :param since: str | None: The next_token of the previous sync, None for a full sync
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: The changed contacts, the deleted ids, next_token and has_more
+
+    """
+    return await get_changes(since, db, current_user)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_contact_events(
+    last_event_id: str | None = Header(None, max_length=64),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+
+    The stream_contact_events function pushes the current user's contact changes as
+    server-sent events (created, updated, deleted), with a heartbeat comment while idle.
+    A client that reconnects with Last-Event-ID receives what it missed, or a reset event
+    telling it to resync with /contacts/changes.
+
+    :param last_event_id: str | None: The id of the last event the client received
+    :param db: AsyncSession: The session used to authenticate the user
+    :param current_user: User: Get the current user from the database
+    :return: A text/event-stream response
+
+    """
+    subscription = contact_events.open(current_user.id, last_event_id)
+    try:
+        # the stream may stay open for hours, do not keep the pooled connection used for auth
+        await db.close()
+    except BaseException:
+        contact_events.release(subscription)
+        raise
+    return EventStreamResponse(contact_events, subscription)
+
+
+@router.get("/stats", response_model=ContactStatsSchema)
+async def get_contact_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+
+    The get_contact_stats function returns how many contacts the current user has and how
+    many of them have a birthday in each month. It reads the maintained counters, so the
+    cost does not grow with the number of contacts.
+
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: The contact stats
+
+    """
+    counters = await repositories_contacts.get_contact_counters(db, current_user)
+    return contact_stats(counters)
+
+
+@router.get(
+    "/stats/{user_id}",
+    response_model=ContactStatsSchema,
+    dependencies=[Depends(access_to_route_all)],
+)
+async def get_user_contact_stats(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+
+    The get_user_contact_stats function returns the contact stats of any user for admins
+    and moderators.
+
+    :param user_id: int: The id of the user
+    :param db: AsyncSession: Get the database session
+    :return: The contact stats
+
+    """
+    user = await repositories_users.get_user_by_id(user_id, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    counters = await repositories_contacts.get_contact_counters(db, user)
+    return contact_stats(counters)
+
+
+@router.post(
+    "/export",
+    response_model=ExportJobSchema,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(access_to_export)],
+)
+async def export_contacts(
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+
+    The export_contacts function starts a background export of every contact to compressed
+    chunk files and returns the job, whose progress can be followed with get_export.
+
+    :param export_format: str: csv or ndjson
+    :param user: User: Get the admin who asked for the export
+    :return: The export job
+
+    """
+    return await contact_exporter.submit(export_format, user.id)
+
+
+@router.get(
+    "/export/{job_id}",
+    response_model=ExportJobSchema,
+    dependencies=[Depends(access_to_export)],
+)
+async def get_export(job_id: str = Path(..., pattern="^[0-9a-f]{32}$")):
+    """
+
+    The get_export function returns the progress of an export job.
+
+    :param job_id: str: The id of the job returned by export_contacts
+    :return: The export job
+
+    """
+    job = await contact_exporter.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return job
 
 
 @router.get(
@@ -116,29 +301,84 @@ async def search_contacts(
     dependencies=[Depends(RateLimiter(times=1, seconds=20))],
 )
 async def get_upcoming_birthdays(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
     current_user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The get_upcoming_birthdays function returns a list of contacts whose birthday is within the next week.
+    Identical concurrent requests of the same user share one query and one serialized body,
+    run on a session of the coalescer, since it may outlive this request.
 
-    :param db: AsyncSession: Get the database session
+    :param request: Request: Build the coalescing key from the route
     :param current_user: User: Get the current user from the database
     :param : Get the database session
     :return: A list of contacts with a birthday between today and the next week
 
     """
-    today = datetime.today().date()
-    next_week = (datetime.today() + timedelta(days=7)).date()
 
-    query = (
-        select(Contact)
-        .filter_by(user=current_user)
-        .filter(cast(Contact.birthday, Date).between(today, next_week))
+    async def load(db: AsyncSession) -> bytes:
+        today = datetime.today().date()
+        next_week = (datetime.today() + timedelta(days=7)).date()
+
+        query = (
+            select(Contact)
+            .filter_by(user_id=current_user.id)
+            .filter(cast(Contact.birthday, Date).between(today, next_week))
+        )
+        contacts = await db.execute(query)
+        return contact_list.dump_json(
+            contact_list.validate_python(contacts.scalars().all(), from_attributes=True)
+        )
+
+    body = await read_coalescer.run(read_coalescer.key(request, current_user.id), load)
+    return Response(content=body, media_type="application/json")
+
+
+@router.post(
+    "/batch-get",
+    response_model=ContactBatchResponseSchema,
+    dependencies=[Depends(RateLimiter(times=1, seconds=20))],
+)
+async def batch_get_contacts(
+    body: ContactBatchGetSchema,
+    response: Response,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+
+    The batch_get_contacts function returns the contacts with the given ids in request order,
+    read with one query, and lists the ids that do not exist or belong to someone else.
+    The response carries an ETag like the other reads, and a request whose If-None-Match
+    matches it gets 304 Not Modified without a body.
+
+    :param body: ContactBatchGetSchema: The ids of the contacts
+    :param response: Response: Set the ETag header on the response
+    :param if_none_match: str | None: The ETag the client already holds
+    :param db: AsyncSession: Get a database connection
+    :param current_user: User: Get the current user from the database
+    :return: The found contacts and the ids that were not found
+
+    """
+    ids = list(dict.fromkeys(body.ids))
+    found = {
+        contact.id: contact
+        for contact in await repositories_contacts.get_contacts_by_ids(ids, db, current_user)
+    }
+    contacts = [found[contact_id] for contact_id in ids if contact_id in found]
+    not_found = [contact_id for contact_id in ids if contact_id not in found]
+    etag = make_etag(
+        [(contact.id, contact.updated_at) for contact in contacts],
+        current_user.id,
+        current_user.updated_at,
+        *not_found,
     )
-    contacts = await db.execute(query)
-    return contacts.scalars().all()
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return {"contacts": contacts, "not_found": not_found}
 
 
 @router.get(
@@ -148,6 +388,8 @@ async def get_upcoming_birthdays(
 )
 async def get_contact(
     contact_id: int,
+    response: Response,
+    if_none_match: str | None = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
@@ -155,14 +397,24 @@ async def get_contact(
 
     The get_contact function is a GET request that returns the contact with the given ID.
     If no such contact exists, it raises an HTTP 404 error.
+    If the client's If-None-Match matches the contact's ETag, it returns 304 Not Modified.
 
     :param contact_id: int: Get the contact_id from the url
+    :param response: Response: Set the ETag header on the response
+    :param if_none_match: str | None: The ETag the client already holds
     :param db: AsyncSession: Get a database connection
     :param current_user: User: Get the current user from the database
     :param : Get the contact id from the url
     :return: A contact object, which is a pydantic model
 
     """
+    version = await repositories_contacts.get_contact_version(contact_id, db, current_user)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    etag = make_etag([version], current_user.id, current_user.updated_at)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     contact = await repositories_contacts.get_contact(contact_id, db, current_user)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
@@ -177,22 +429,42 @@ async def get_contact(
 )
 async def create_contact(
     body: ContactCreateSchema,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The create_contact function creates a new contact in the database.
+    With an Idempotency-Key header, a retried request gets the first response replayed
+    instead of creating a duplicate contact.
 
     :param body: ContactCreateSchema: Validate the request body
+    :param response: Response: Mark replayed responses
+    :param idempotency_key: str | None: The client's Idempotency-Key header
     :param db: AsyncSession: Get the database connection
     :param current_user: User: Get the user who is currently logged in
     :param : Get the contact id from the url
     :return: A contact object
 
     """
-    contact = await repositories_contacts.create_contact(body, db, current_user)
-    return contact
+
+    async def create(db: AsyncSession):
+        contact = await repositories_contacts.create_contact(body, db, current_user)
+        read_coalescer.forget(current_user.id)
+        return ContactResponseSchema.model_validate(contact).model_dump(mode="json")
+
+    result, replayed = await idempotency_store.run(
+        idempotency_key,
+        f"{current_user.id}:contacts",
+        fingerprint("POST", "/contacts", body.model_dump(mode="json")),
+        create,
+        db,
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
 
 @router.put(
@@ -204,27 +476,46 @@ async def create_contact(
 async def update_contact(
     contact_id: int,
     body: ContactUpdateSchema,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The update_contact function updates a contact in the database.
+    With an Idempotency-Key header, a retried request gets the first response replayed.
 
     :param contact_id: int: Get the contact id from the url
     :param body: ContactUpdateSchema: Get the data from the request body
+    :param response: Response: Mark replayed responses
+    :param idempotency_key: str | None: The client's Idempotency-Key header
     :param db: AsyncSession: Pass the database session to the repository
     :param current_user: User: Get the user who is currently logged in
     :param : Get the contact id
     :return: A contact object
 
     """
-    contact = await repositories_contacts.update_contact(
-        contact_id, body, db, current_user
+
+    async def update(db: AsyncSession):
+        contact = await repositories_contacts.update_contact(
+            contact_id, body, db, current_user
+        )
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+        read_coalescer.forget(current_user.id)
+        return ContactResponseSchema.model_validate(contact).model_dump(mode="json")
+
+    result, replayed = await idempotency_store.run(
+        idempotency_key,
+        f"{current_user.id}:contacts",
+        fingerprint("PUT", f"/contacts/{contact_id}", body.model_dump(mode="json")),
+        update,
+        db,
     )
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
-    return contact
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
 
 @router.delete(
@@ -234,19 +525,38 @@ async def update_contact(
 )
 async def delete_contact(
     contact_id: int,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     """
 
     The delete_contact function deletes a contact from the database.
+    With an Idempotency-Key header, a retried request is answered without deleting again.
 
     :param contact_id: int: Specify the contact to be deleted
+    :param response: Response: Mark replayed responses
+    :param idempotency_key: str | None: The client's Idempotency-Key header
     :param db: AsyncSession: Pass the database session to the repository
     :param current_user: User: Get the user id from the current_user object
     :param : Specify the contact id of the contact to be deleted
     :return: None, which means that the api endpoint will return an empty response
 
     """
-    await repositories_contacts.delete_contact(contact_id, db, current_user)
+
+    async def delete(db: AsyncSession):
+        await repositories_contacts.delete_contact(contact_id, db, current_user)
+        read_coalescer.forget(current_user.id)
+        return None
+
+    _, replayed = await idempotency_store.run(
+        idempotency_key,
+        f"{current_user.id}:contacts",
+        fingerprint("DELETE", f"/contacts/{contact_id}"),
+        delete,
+        db,
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
     return None
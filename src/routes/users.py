@@ -1,22 +1,14 @@
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, Depends, UploadFile, File
-from fastapi_limiter.depends import RateLimiter
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.conf.config import config
 from src.database.db import get_db
 from src.schemas.user import UserResponseSchema
 from src.servises.auth import auth_service
+from src.servises.rate_limit import RateLimiter
+from src.servises.avatar import AvatarStorage, get_avatar_storage, store_avatar
 from src.database.models import User
 from src.repository import users as repositories_user
 
 router = APIRouter(prefix="/users", tags=["users"])
-cloudinary.config(
-    cloud_name=config.CLD_NAME,
-    api_key=config.CLD_API_KEY,
-    api_secret=config.CLD_API_SECRET,
-    secure=True,
-)
 
 
 @router.get(
@@ -46,21 +38,24 @@ async def get_avatar(
     file: UploadFile = File(),
     user: User = Depends(auth_service.get_current_user),
     db: AsyncSession = Depends(get_db),
+    storage: AvatarStorage = Depends(get_avatar_storage),
 ):
     """
     The get_avatar function is used to upload a new avatar for the user.
+    The 100x150 thumbnail is built locally in a worker pool and stored under its content hash,
+    so the event loop is never blocked and re-uploading the same picture costs no upload.
 
     :param file: UploadFile: Receive the file from the client
     :param user: User: Get the current user from the database
     :param db: AsyncSession: Pass the database session to the repository layer
+    :param storage: AvatarStorage: The storage backend for avatars
     :param : Get the current user from the database
     :return: The user object with the updated avatar_url field
 
     """
-    public_id = f"Web16/{user.email}"
-    res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
-    res_url = cloudinary.CloudinaryImage(public_id).build_url(
-        width=100, height=150, crop="fill", version=res.get("version")
-    )
+    res_url = await store_avatar(file, storage)
     user = await repositories_user.update_avatar_url(user.email, res_url, db)
+    if user is None:
+        # the account was deleted after the token was checked
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
@@ -0,0 +1,28 @@
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field
+
+from src.conf.config import config
+
+
+class BatchItemSchema(BaseModel):
+    id: str | None = Field(None, max_length=64)
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(..., pattern=r"^/api/", max_length=2048)
+    headers: dict[str, str] = Field(default_factory=dict)
+    body: Any = None
+
+
+class BatchSchema(BaseModel):
+    requests: list[BatchItemSchema] = Field(..., min_length=1, max_length=config.BATCH_MAX_REQUESTS)
+
+
+class BatchItemResponseSchema(BaseModel):
+    id: str | None
+    status: int
+    headers: dict[str, str]
+    body: Any
+
+
+class BatchResponseSchema(BaseModel):
+    responses: list[BatchItemResponseSchema]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 from datetime import date, datetime
+from src.conf.config import config
 from src.schemas.user import UserResponseSchema
 
 
@@ -39,3 +40,39 @@ class ContactResponseSchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ContactBatchGetSchema(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=config.CONTACTS_BATCH_MAX_IDS)
+
+
+class ContactBatchResponseSchema(BaseModel):
+    contacts: list[ContactResponseSchema]
+    not_found: list[int]
+
+
+class ContactChangesSchema(BaseModel):
+    changed: list[ContactResponseSchema]
+    deleted: list[int]
+    next_token: str
+    has_more: bool
+
+
+class ContactStatsSchema(BaseModel):
+    total: int
+    birthdays_this_month: int
+    birthdays_by_month: dict[int, int]
+
+
+class ExportJobSchema(BaseModel):
+    id: str
+    format: str
+    status: str
+    requested_by: int
+    chunks_total: int | None
+    chunks_done: int
+    rows: int
+    files: list[str]
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
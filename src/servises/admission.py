@@ -0,0 +1,184 @@
+import logging
+import re
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+# fraction of the concurrency limit each class may use: expensive routes are shed first
+PRIORITY_SHARES = {"high": 1.0, "normal": 0.8, "low": 0.5}
+
+DEFAULT_PRIORITIES = [
+    (r"^/api/health/", None),  # probes are never shed
+    (r"^/api/healthchecker$", None),
+    (r"^/api/contacts/events$", None),  # long-lived streams, capped per user instead
+    (r"^/api/users/me$", "high"),
+    (r"^/api/auth/refresh_token$", "high"),
+    (r"^/api/auth/(signup|login|request_email)$", "normal"),  # bcrypt and SMTP bound
+    (r"^/api/auth/[^/]+$", "high"),  # email open tracking pixel
+    (r"^/static/", "high"),
+    (r"^/api/contacts/all$", "low"),
+    (r"^/api/contacts/export$", "low"),
+]
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit driven by observed latency.
+
+    Every route keeps its own baseline, the best latency seen for it, so a slow route such as
+    a bcrypt-bound login does not look like congestion next to fast reads. Each successful
+    request is compared to the baseline of its route, and the smoothed ratio is the
+    congestion signal. Other responses (401, 429, 304, validation errors) only free their
+    slot: they skip the real work, so a burst of them would drag the baseline down and make
+    ordinary requests look congested. When it exceeds ``tolerance`` (requests queue for the database pool
+    instead of doing work), the limit is cut by ``backoff``, at most once per smoothed
+    latency. Otherwise the limit grows by about one every ``limit`` requests: back up to
+    ``initial`` at any load, and past it only while the limit is in use.
+    """
+
+    def __init__(
+        self,
+        initial: int = config.ADMISSION_INITIAL_LIMIT,
+        min_limit: int = config.ADMISSION_MIN_LIMIT,
+        max_limit: int = config.ADMISSION_MAX_LIMIT,
+        tolerance: float = config.ADMISSION_LATENCY_TOLERANCE,
+        backoff: float = 0.9,
+        smoothing: float = 0.2,
+        baseline_drift: float = 0.001,
+    ):
+        self.limit = float(initial)
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.congestion = 1.0
+        # route -> best latency seen, crept up slowly so it follows real workload changes
+        self.baselines: dict[str | None, float] = {}
+        self.shed = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self, share: float = 1.0) -> bool:
+        if self.in_flight >= max(int(self.limit * share), 1):
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, route: str | None = None, success: bool = True) -> None:
+        in_use = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        if not success:
+            return
+        baseline = self.baselines.get(route, latency)
+        baseline = self.baselines[route] = min(latency, baseline * (1 + self.baseline_drift))
+        if self.latency is None:
+            self.latency = latency
+            return
+        self.latency += self.smoothing * (latency - self.latency)
+        ratio = latency / baseline if baseline > 0 else 1.0
+        self.congestion += self.smoothing * (ratio - self.congestion)
+
+        now = time.monotonic()
+        if self.congestion > self.tolerance:
+            if now - self._last_decrease >= self.latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif in_use or self.limit < self.initial:
+            ceiling = self.max_limit if in_use else self.initial
+            self.limit = min(ceiling, self.limit + 1 / self.limit)
+
+    def status(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 2),
+            "congestion": round(self.congestion, 2),
+            "shed": self.shed,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Admission control in front of the app.
+
+    Every HTTP request is classified by path (``priorities`` is a list of regex and class,
+    first match wins, ``None`` bypasses admission, unmatched paths are ``normal``). A request
+    is admitted while the requests in flight stay below its class's share of the adaptive
+    limit; otherwise it fails fast with 503 and Retry-After instead of queueing.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: AdaptiveLimit | None = None,
+        priorities: list[tuple[str, str | None]] | None = None,
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.limiter = limiter or admission_limit
+        self.priorities = [
+            (re.compile(pattern), priority)
+            for pattern, priority in (DEFAULT_PRIORITIES if priorities is None else priorities)
+        ]
+        self.retry_after = str(retry_after).encode()
+
+    def classify(self, path: str) -> str | None:
+        for pattern, priority in self.priorities:
+            if pattern.search(path):
+                return priority
+        return "normal"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = self.classify(scope["path"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.try_acquire(PRIORITY_SHARES[priority]):
+            logger.info("request shed", extra={"fields": {"priority": priority, **self.limiter.status()}})
+            await self._overloaded(send)
+            return
+        started = time.monotonic()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router stores the matched route in the scope; unrouted paths share their class
+            route = getattr(scope.get("route"), "path", None) or priority
+            self.limiter.release(time.monotonic() - started, route, 200 <= status_code < 300)
+
+    async def _overloaded(self, send: Send) -> None:
+        body = b'{"detail":"Server is overloaded, retry later"}'
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", self.retry_after),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+admission_limit = AdaptiveLimit()
@@ -1,26 +1,148 @@
-import redis
+import asyncio
+import logging
+import math
+import random
+import time
+
 import pickle
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from passlib.context import CryptContext
+from redis import asyncio as redis
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from src.database.db import get_db
+from src.database.db import sessionmanager
 from src.repository import users as repository_users
 from src.conf.config import config
+from src.servises.circuit_breaker import CircuitOpenError, redis_breaker
+from src.servises.cache_events import FLUSH_ALL, user_cache_events
+from src.servises.logs import bind_user
+from src.servises.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+# invalid tokens are frequent, they get their own logger so they can be sampled
+jwt_logger = logging.getLogger(f"{__name__}.jwt")
 
 
 class Auth:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = config.API_KEY_JWT
     ALGORITHM = config.ALGORITHM
-    cache = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0)
+    cache = redis.Redis(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=0,
+        socket_timeout=config.REDIS_TIMEOUT,
+        socket_connect_timeout=config.REDIS_TIMEOUT,
+    )
+    CACHE_TTL = config.USER_CACHE_TTL
+    CACHE_EARLY_REFRESH_BETA = config.USER_CACHE_EARLY_REFRESH_BETA
+    LOCAL_CACHE_TTL = config.USER_LOCAL_CACHE_TTL
+    LOCAL_CACHE_DEGRADED_TTL = config.USER_LOCAL_CACHE_DEGRADED_TTL
+    LOCAL_CACHE_SIZE = config.USER_LOCAL_CACHE_SIZE
+    _user_flight = SingleFlight()
+    # the shared load of a user outlives the request that started it, so it has its own session
+    session_factory = sessionmanager.session
+    # per-worker tier in front of Redis: email -> (pickled user, monotonic time it was stored)
+    _local_cache: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+    # emails being loaded from the database -> whether they were invalidated meanwhile
+    _loading: dict[str, bool] = {}
 
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        The verify_and_update_password function checks a password like verify_password and,
+        when the stored hash uses a lower bcrypt cost than the configured one, also returns
+        a new hash to store in its place. Hashes with a higher cost are left alone.
+
+        :param plain_password: str: The password the user entered
+        :param hashed_password: str: The stored hash
+        :return: A (valid, new_hash) tuple, new_hash is None when the hash is up to date
+
+        """
+        return self.pwd_context.verify_and_update(plain_password, hashed_password)
+
+    def configure_bcrypt(self, rounds: int) -> None:
+        # min equal to the default makes needs_update flag weaker hashes only, so workers
+        # that disagree on the cost never rehash a password back and forth
+        self.pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+        )
+
+    def calibrate_bcrypt(
+        self,
+        budget_ms: float = config.BCRYPT_HASH_BUDGET_MS,
+        min_rounds: int = config.BCRYPT_MIN_ROUNDS,
+        max_rounds: int = config.BCRYPT_MAX_ROUNDS,
+    ) -> int:
+        """
+        The calibrate_bcrypt function picks the highest bcrypt cost whose hash still fits in
+        budget_ms on this machine, but never less than min_rounds, and configures it.
+        Every extra round doubles the work, so a single timing at min_rounds is enough.
+
+        :param budget_ms: float: The per-hash latency budget in milliseconds
+        :param min_rounds: int: The security floor
+        :param max_rounds: int: The highest cost to consider
+        :return: The chosen number of rounds
+
+        """
+        sample = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=min_rounds)
+        elapsed = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            sample.hash("calibration")
+            elapsed = min(elapsed, (time.perf_counter() - started) * 1000)
+        rounds = min_rounds
+        while rounds < max_rounds and elapsed * 2 <= budget_ms:
+            elapsed *= 2
+            rounds += 1
+        self.configure_bcrypt(rounds)
+        return rounds
+
+    async def configure_shared_bcrypt(
+        self,
+        redis,
+        key: str = config.BCRYPT_CALIBRATION_KEY,
+        ttl: int = config.BCRYPT_CALIBRATION_TTL,
+    ) -> int:
+        """
+        The configure_shared_bcrypt function configures the bcrypt cost every worker uses.
+        The first worker to start calibrates and stores the result in Redis for ttl seconds,
+        the others take it from there. Without Redis the worker calibrates on its own.
+
+        :param redis: The async Redis client
+        :param key: str: The Redis key of the shared cost
+        :param ttl: int: How long the shared cost is kept before it is calibrated again
+        :return: The configured number of rounds
+
+        """
+        try:
+            stored = await redis_breaker.acall(redis.get, key)
+        except Exception as err:
+            logger.warning("shared bcrypt cost unavailable: %s", err)
+            return await asyncio.to_thread(self.calibrate_bcrypt)
+        if stored is None:
+            rounds = await asyncio.to_thread(self.calibrate_bcrypt)
+            try:
+                if await redis_breaker.acall(redis.set, key, rounds, ex=ttl, nx=True):
+                    return rounds
+                # another worker calibrated at the same time, follow it
+                stored = await redis_breaker.acall(redis.get, key)
+            except Exception as err:
+                logger.warning("shared bcrypt cost not stored: %s", err)
+            if stored is None:
+                return rounds
+        rounds = int(stored)
+        self.configure_bcrypt(rounds)
+        return rounds
+
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
@@ -79,13 +201,19 @@ class Auth:
             )
 
     async def get_current_user(
-        self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+        self,
+        token: str = Depends(oauth2_scheme),
+        request: Request = None,
     ):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+        # sub-requests of POST /api/batch reuse the user their batch was authenticated as
+        user = None if request is None else getattr(request.state, "current_user", None)
+        if user is not None:
+            return user
         email = None
         try:
             # Decode JWT
@@ -97,23 +225,130 @@ class Auth:
             else:
                 raise credentials_exception
         except JWTError as err:
-            print(f"Ошиииибка {err}")
-
-        user_cache = str(email)
-        # database Redis
-        user = self.cache.get(user_cache)
+            jwt_logger.info("invalid access token", extra={"fields": {"error": str(err)}})
+            raise credentials_exception
 
+        user = await self.get_cached_user(email)
         if user is None:
-            # database Postgres
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_cache, pickle.dumps(user))
-            self.cache.expire(user_cache, 300)
-        else:
-            user = pickle.dumps(user)
+            raise credentials_exception
+        bind_user(user.id)
         return user
 
+    def _should_refresh_early(self, expires_at: float, delta: float) -> bool:
+        # probabilistic early expiration (XFetch): the closer to expiry and the slower the
+        # lookup, the more likely a request refreshes the entry before it actually expires
+        jitter = -math.log(1.0 - random.random())
+        return time.time() + delta * self.CACHE_EARLY_REFRESH_BETA * jitter >= expires_at
+
+    def _remember_locally(self, email: str, payload: bytes) -> None:
+        self._local_cache[email] = (payload, time.monotonic())
+        self._local_cache.move_to_end(email)
+        while len(self._local_cache) > self.LOCAL_CACHE_SIZE:
+            self._local_cache.popitem(last=False)
+
+    def _get_locally(self, email: str) -> bytes | None:
+        entry = self._local_cache.get(email)
+        if entry is None:
+            return None
+        payload, stored_at = entry
+        # while invalidations from other workers may be missed, only trust recent copies
+        ttl = self.LOCAL_CACHE_TTL if user_cache_events.healthy else self.LOCAL_CACHE_DEGRADED_TTL
+        if stored_at + ttl <= time.monotonic():
+            self._local_cache.pop(email, None)
+            return None
+        return payload
+
+    async def _redis(self, command: str, *args, **kwargs):
+        # degraded mode: while Redis fails or the breaker is open, the cache is a miss and
+        # users come from the local tier or the database
+        try:
+            return await redis_breaker.acall(getattr(self.cache, command), *args, **kwargs)
+        except (CircuitOpenError, *redis_breaker.errors):
+            return None
+
+    async def delete_cached_user(self, email: str) -> None:
+        """
+        The delete_cached_user function removes a changed user from Redis. It runs once per
+        change, in the worker that published it, before the other workers are told.
+
+        :param email: str: The email of the changed user
+        :return: None
+
+        """
+        await self._redis("delete", str(email))
+
+    def drop_cached_user(self, email: str) -> None:
+        """
+        The drop_cached_user function handles an invalidation event from user_cache_events.
+        It removes the user from this worker's local tier, or clears the whole local tier when
+        the event is FLUSH_ALL. Redis is left to the publisher, see delete_cached_user.
+
+        :param email: str: The email of the changed user, or FLUSH_ALL
+        :return: None
+
+        """
+        if email == FLUSH_ALL:
+            for loading in self._loading:
+                self._loading[loading] = True
+            self._local_cache.clear()
+            return
+        if email in self._loading:
+            self._loading[email] = True
+        self._local_cache.pop(email, None)
+
+    async def _load_user(self, email: str) -> bytes | None:
+        # the single flight runs one load per email at a time
+        self._loading[email] = False
+        try:
+            started = time.monotonic()
+            # database Postgres
+            async with self.session_factory() as db:
+                user = await repository_users.get_user_by_email(email, db)
+        finally:
+            invalidated = self._loading.pop(email)
+        if user is None:
+            return None
+        payload = pickle.dumps(user)
+        # the user changed while we were reading it, serve it but do not cache it
+        if invalidated:
+            return payload
+        delta = time.monotonic() - started
+        entry = pickle.dumps((payload, time.time() + self.CACHE_TTL, delta))
+        await self._redis("set", str(email), entry, ex=self.CACHE_TTL)
+        self._remember_locally(email, payload)
+        return payload
+
+    async def get_cached_user(self, email: str):
+        """
+        The get_cached_user function returns the user for an email, from this worker's local
+        tier or Redis when possible. Both tiers are invalidated through user_cache_events on
+        every write in the users repository, so they can live long. While Redis is down only
+        the local tier is used, and its entries are trusted for LOCAL_CACHE_DEGRADED_TTL
+        seconds only, since invalidations from other workers may be missed. Concurrent misses for the same email share a single database
+        lookup, and hot entries are refreshed shortly before they expire, so an expiring entry
+        does not send every in-flight request to Postgres at once.
+
+        :param email: str: The email of the user
+        :return: A detached user object, or None if there is no such user
+
+        """
+        payload = self._get_locally(email)
+        if payload is not None:
+            return pickle.loads(payload)
+        # database Redis
+        entry = await self._redis("get", str(email))
+        cached = pickle.loads(entry) if entry is not None else None
+        # entries written before the envelope format are plain users, treat them as a miss
+        if isinstance(cached, tuple):
+            payload, expires_at, delta = cached
+            if self._user_flight.in_flight(email) or not self._should_refresh_early(
+                expires_at, delta
+            ):
+                self._remember_locally(email, payload)
+                return pickle.loads(payload)
+        payload = await self._user_flight.do(email, lambda: self._load_user(email))
+        return None if payload is None else pickle.loads(payload)
+
     def create_email_token(self, data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=1)
@@ -126,8 +361,8 @@ class Auth:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             email = payload["sub"]
             return email
-        except JWTError as e:
-            print(e)
+        except JWTError as err:
+            jwt_logger.info("invalid email token", extra={"fields": {"error": str(err)}})
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="Invalid token for email verification",
@@ -135,3 +370,5 @@ class Auth:
 
 
 auth_service = Auth()
+user_cache_events.subscribe(auth_service.drop_cached_user)
+user_cache_events.on_publish(auth_service.delete_cached_user)
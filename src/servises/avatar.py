@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import io
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.conf.config import config
+
+AVATAR_SIZE = (100, 150)
+CHUNK_SIZE = 64 * 1024
+# the whole multipart request may carry the boundaries and part headers on top of the image
+MAX_REQUEST_BYTES = config.AVATAR_MAX_BYTES + 64 * 1024
+
+image_executor = ThreadPoolExecutor(
+    max_workers=config.AVATAR_WORKERS, thread_name_prefix="avatar"
+)
+
+
+class AvatarStorage(ABC):
+    """
+    Async interface for avatar storage backends.
+    Objects are addressed by a content-hash key, so an existing key never needs to be uploaded again.
+    """
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Stores avatars in Cloudinary under a public id derived from the content hash.
+
+    exists never calls the rate-limited Admin API: it only remembers the keys this worker has
+    already uploaded. A key it does not know is uploaded with overwrite=False, and Cloudinary
+    answers with the existing resource when another worker stored the same thumbnail first.
+    """
+
+    def __init__(self, folder: str = "Web16", max_known: int = 10_000):
+        self.folder = folder
+        self.max_known = max_known
+        self._known: OrderedDict[str, None] = OrderedDict()
+        cloudinary.config(
+            cloud_name=config.CLD_NAME,
+            api_key=config.CLD_API_KEY,
+            api_secret=config.CLD_API_SECRET,
+            secure=True,
+        )
+
+    def public_id(self, key: str) -> str:
+        # cloudinary keeps the format apart from the public id
+        return f"{self.folder}/{key.rsplit('.', 1)[0]}"
+
+    async def exists(self, key: str) -> bool:
+        if key in self._known:
+            self._known.move_to_end(key)
+            return True
+        return False
+
+    async def save(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(
+            cloudinary.uploader.upload,
+            io.BytesIO(data),
+            public_id=self.public_id(key),
+            overwrite=False,
+            unique_filename=False,
+        )
+        self._known[key] = None
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+
+    def url(self, key: str) -> str:
+        width, height = AVATAR_SIZE
+        return cloudinary.CloudinaryImage(self.public_id(key)).build_url(
+            width=width, height=height, crop="fill"
+        )
+
+
+class LocalStorage(AvatarStorage):
+    def __init__(self, directory: str | Path, base_url: str):
+        self.directory = Path(directory)
+        self.base_url = base_url.rstrip("/")
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.directory.joinpath(key).exists)
+
+    async def save(self, key: str, data: bytes) -> None:
+        def write():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory.joinpath(f".{key}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(self.directory.joinpath(key))
+
+        await asyncio.to_thread(write)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """
+    The read_upload function reads an uploaded file chunk by chunk and stops
+    as soon as it grows past max_bytes, so an oversized upload is never held in memory.
+
+    :param file: UploadFile: The uploaded file
+    :param max_bytes: int: The size cap in bytes
+    :return: The file content
+
+    """
+    buffer = bytearray()
+    while chunk := await file.read(CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Avatar is too large",
+            )
+    return bytes(buffer)
+
+
+def make_thumbnail(data: bytes) -> tuple[bytes, str]:
+    """
+    The make_thumbnail function crops and resizes an image to the avatar size.
+    It is CPU bound and runs in the image worker pool.
+
+    :param data: bytes: The original image
+    :return: The thumbnail bytes and their file extension
+
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            thumbnail = ImageOps.fit(image, AVATAR_SIZE, Image.LANCZOS)
+            if thumbnail.mode not in ("RGB", "RGBA"):
+                thumbnail = thumbnail.convert("RGBA")
+            output = io.BytesIO()
+            thumbnail.save(output, format="PNG", optimize=True)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image"
+        )
+    return output.getvalue(), "png"
+
+
+async def store_avatar(file: UploadFile, storage: AvatarStorage) -> str:
+    """
+    The store_avatar function runs the avatar pipeline: read the upload with a size cap,
+    build the thumbnail in the worker pool, and upload it under its content hash unless
+    the same thumbnail is already stored.
+
+    :param file: UploadFile: The uploaded image
+    :param storage: AvatarStorage: The storage backend
+    :return: The url of the stored avatar
+
+    """
+    data = await read_upload(file, config.AVATAR_MAX_BYTES)
+    loop = asyncio.get_running_loop()
+    thumbnail, extension = await loop.run_in_executor(image_executor, make_thumbnail, data)
+    key = f"{hashlib.sha256(thumbnail).hexdigest()}.{extension}"
+    if not await storage.exists(key):
+        await storage.save(key, thumbnail)
+    return storage.url(key)
+
+
+def build_storage() -> AvatarStorage:
+    if config.AVATAR_STORAGE == "local":
+        return LocalStorage(config.AVATAR_LOCAL_DIR, config.AVATAR_LOCAL_URL)
+    return CloudinaryStorage()
+
+
+avatar_storage = build_storage()
+
+
+def get_avatar_storage() -> AvatarStorage:
+    return avatar_storage
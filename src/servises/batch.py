@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Message
+
+from src.conf.config import config
+from src.database.models import User
+from src.schemas.batch import BatchItemSchema
+
+logger = logging.getLogger(__name__)
+
+# streams never finish and a batch must not contain itself
+EXCLUDED_PATHS = frozenset({"/api/batch", "/api/contacts/events"})
+# taken over from the batch request; a sub-request cannot authenticate as someone else
+FORWARDED_HEADERS = frozenset({b"authorization", b"user-agent", b"accept-language"})
+IGNORED_ITEM_HEADERS = frozenset({"authorization", "host", "content-length", "content-type"})
+INHERITED_SCOPE_KEYS = (
+    "type",
+    "asgi",
+    "http_version",
+    "scheme",
+    "server",
+    "client",
+    "root_path",
+    "app",
+    "starlette.exception_handlers",
+)
+
+
+def _response(item: BatchItemSchema, status_code: int, headers: dict, body) -> dict:
+    return {"id": item.id, "status": status_code, "headers": headers, "body": body}
+
+
+async def dispatch(
+    parent: Request, item: BatchItemSchema, user: User, db: AsyncSession | None
+) -> dict:
+    """
+    The dispatch function runs one sub-request through the app's router, without the
+    middleware stack the batch request already went through.
+
+    :param parent: Request: The batch request
+    :param item: BatchItemSchema: The sub-request
+    :param user: User: The user the batch was authenticated as
+    :param db: AsyncSession | None: The session to share, None to let the route open its own
+    :return: The id, status, headers and decoded body of the response
+
+    """
+    path, _, query = item.path.partition("?")
+    if path.rstrip("/") in EXCLUDED_PATHS:
+        return _response(item, 400, {}, {"detail": "Not allowed in a batch"})
+
+    body = b"" if item.body is None else json.dumps(item.body).encode()
+    headers = [(name, value) for name, value in parent.scope["headers"] if name in FORWARDED_HEADERS]
+    headers += [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in item.headers.items()
+        if name.lower() not in IGNORED_ITEM_HEADERS
+    ]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    state = {"current_user": user}
+    if db is not None:
+        state["db"] = db
+    scope = {key: parent.scope[key] for key in INHERITED_SCOPE_KEYS if key in parent.scope}
+    scope.update(
+        method=item.method,
+        path=path,
+        raw_path=path.encode(),
+        query_string=query.encode(),
+        headers=headers,
+        state=state,
+    )
+
+    body_sent = False
+
+    async def receive() -> Message:
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status_code, response_headers, chunks = 500, {}, []
+
+    async def send(message: Message) -> None:
+        nonlocal status_code, response_headers
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in message.get("headers", [])
+                if name != b"content-length"
+            }
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await parent.app.router(scope, receive, send)
+    except Exception:
+        logger.exception("batch sub-request failed", extra={"fields": {"path": path}})
+        status_code, response_headers, chunks = 500, {}, [b'{"detail":"Internal Server Error"}']
+        response_headers["content-type"] = "application/json"
+    if db is not None and status_code >= 400:
+        # a failed write may leave the shared session mid-transaction; the successful
+        # writes before it are committed already, so the later ones start clean. The
+        # rollback also expires the batch's user, which the next sub-requests still use
+        await db.rollback()
+        db.add(user)
+        await db.refresh(user)
+
+    raw = b"".join(chunks)
+    if not raw:
+        content = None
+    elif response_headers.get("content-type", "").startswith("application/json"):
+        content = json.loads(raw)
+    else:
+        content = raw.decode("utf-8", "replace")
+    return _response(item, status_code, response_headers, content)
+
+
+async def run_batch(
+    parent: Request,
+    items: list[BatchItemSchema],
+    user: User,
+    db: AsyncSession,
+    read_concurrency: int = config.BATCH_READ_CONCURRENCY,
+) -> list[dict]:
+    """
+    The run_batch function runs the sub-requests and returns their responses in order.
+
+    Consecutive GETs run concurrently, each on its own session, since a session cannot be
+    used by two queries at once; at most read_concurrency of them at a time, so one batch
+    cannot take the whole connection pool. Every other method runs alone, in order, on the
+    batch's session, so the writes see each other and the reads before them are finished.
+
+    :param parent: Request: The batch request
+    :param items: list[BatchItemSchema]: The sub-requests
+    :param user: User: The user the batch was authenticated as
+    :param db: AsyncSession: The session of the batch request
+    :param read_concurrency: int: The most GETs running at once
+    :return: The responses in the order of items
+
+    """
+    responses: list[dict | None] = [None] * len(items)
+    reads: list[int] = []
+    connections = asyncio.Semaphore(read_concurrency)
+
+    async def read(item: BatchItemSchema) -> dict:
+        async with connections:
+            return await dispatch(parent, item, user, None)
+
+    async def run_reads() -> None:
+        results = await asyncio.gather(*(read(items[index]) for index in reads))
+        for index, result in zip(reads, results):
+            responses[index] = result
+        reads.clear()
+
+    for index, item in enumerate(items):
+        if item.method == "GET":
+            reads.append(index)
+            continue
+        await run_reads()
+        responses[index] = await dispatch(parent, item, user, db)
+    await run_reads()
+    return responses
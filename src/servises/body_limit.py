@@ -0,0 +1,74 @@
+import json
+import re
+
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    Caps the request body of selected paths before the route ever sees it.
+
+    Starlette spools a multipart body to disk while it parses the form, which happens before
+    the route's dependencies run, so a cap inside the route only applies after the whole upload
+    has been received. This middleware answers 413 straight away when Content-Length is over the
+    limit, and otherwise counts the bytes as they are received and aborts the request as soon as
+    a chunked or dishonest body grows past it.
+    """
+
+    def __init__(self, app: ASGIApp, limits: list[tuple[str, int]], detail: str = "Request body is too large"):
+        self.app = app
+        self.limits = [(re.compile(path), max_bytes) for path, max_bytes in limits]
+        self.detail = detail
+
+    def limit_for(self, path: str) -> int | None:
+        for pattern, max_bytes in self.limits:
+            if pattern.match(path):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        max_bytes = self.limit_for(scope["path"])
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            await self._too_large(send)
+            return
+
+        received = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # the form parser re-raises HTTPException, so the app renders it as a 413
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=self.detail
+                    )
+            return message
+
+        await self.app(scope, receive_wrapper, send)
+
+    async def _too_large(self, send: Send) -> None:
+        body = json.dumps({"detail": self.detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from src.conf.config import config
+from src.servises.circuit_breaker import redis_breaker
+
+logger = logging.getLogger(__name__)
+
+# delivered to every subscriber after a (re)subscribe, when messages may have been missed
+FLUSH_ALL = "*"
+
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidation events to every worker.
+
+    Once ``start`` is given a Redis client, events go through Redis pub/sub on ``channel``, so
+    every worker (including the publisher) receives them. Without Redis, for example in tests
+    or a single worker, ``publish`` calls the local subscribers directly. Work that must happen
+    once per event rather than once per worker, such as deleting a shared Redis entry, is
+    registered with ``on_publish`` and run by the publishing worker only.
+
+    While the subscription is down or Redis is failing, events from other workers may be
+    missed; ``healthy`` is False then, and subscribers should not trust long-lived copies.
+    """
+
+    def __init__(self, channel: str, reconnect_delay: float = 1.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.redis = None
+        self._handlers: list[Callable[[str], None]] = []
+        self._publish_handlers: list[Callable[[str], Awaitable[None]]] = []
+        self._task: asyncio.Task | None = None
+        self._subscribed = False
+
+    @property
+    def healthy(self) -> bool:
+        # without Redis every event is delivered locally, so nothing can be missed
+        if self.redis is None or self._task is None:
+            return True
+        return self._subscribed and not redis_breaker.is_open
+
+    def subscribe(self, handler: Callable[[str], None]) -> None:
+        self._handlers.append(handler)
+
+    def on_publish(self, handler: Callable[[str], Awaitable[None]]) -> None:
+        self._publish_handlers.append(handler)
+
+    def _deliver(self, key: str) -> None:
+        for handler in self._handlers:
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("cache invalidation handler failed")
+
+    async def publish(self, key: str) -> None:
+        """
+        The publish function tells every worker that the cached value under key is stale.
+        If Redis cannot be reached, the local subscribers are still notified.
+
+        :param key: str: The cache key to drop
+        :return: None
+
+        """
+        for handler in self._publish_handlers:
+            try:
+                await handler(key)
+            except Exception:
+                logger.exception("cache invalidation publish handler failed")
+        if self.redis is not None and self._task is not None:
+            try:
+                await redis_breaker.acall(self.redis.publish, self.channel, key)
+                return
+            except Exception as err:
+                logger.warning("invalidation publish failed, delivering locally: %s", err)
+        self._deliver(key)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self._subscribed = True
+                self._deliver(FLUSH_ALL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    self._deliver(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("invalidation subscription lost: %s", err)
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                self._subscribed = False
+                await pubsub.aclose()
+
+    def start(self, redis) -> None:
+        self.redis = redis
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+user_cache_events = InvalidationBus(config.USER_CACHE_CHANNEL)
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from src.conf.config import config
+from src.servises.circuit_breaker import redis_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    In-process broker: a published message is handed straight to the feed of this worker.
+    Enough for a single worker and for tests.
+    """
+
+    def __init__(self):
+        self._handler: Callable[[str], None] | None = None
+
+    def attach(self, handler: Callable[[str], None]) -> None:
+        self._handler = handler
+
+    def _deliver(self, message: str) -> None:
+        if self._handler is not None:
+            self._handler(message)
+
+    async def publish(self, message: str) -> None:
+        self._deliver(message)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisBroker(LocalBroker):
+    """
+    Broker over Redis pub/sub on ``channel``, so every worker (including the publisher)
+    receives every event. If a publish fails, the event still reaches this worker.
+    """
+
+    def __init__(self, redis, channel: str = config.SSE_CHANNEL, reconnect_delay: float = 1.0):
+        super().__init__()
+        self.redis = redis
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._task: asyncio.Task | None = None
+
+    async def publish(self, message: str) -> None:
+        try:
+            await redis_breaker.acall(self.redis.publish, self.channel, message)
+        except Exception as err:
+            logger.warning("change event publish failed, delivering locally: %s", err)
+            self._deliver(message)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    self._deliver(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("change feed subscription lost: %s", err)
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class _Subscription:
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+        # events from the history the client missed, None if they are no longer remembered
+        self.missed: list[dict] | None = []
+
+    def offer(self, event: dict | None) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+RETRY_MS = 3000
+
+
+class ChangeFeed:
+    """
+    Fans the contact change events of every user out to that user's open SSE streams.
+
+    Events travel through a broker, so every worker sees every event, and each worker keeps
+    the last ``history`` events of each of ``history_users`` recently active users. A
+    reconnecting client sends Last-Event-ID and gets the events it missed; if that id is no
+    longer remembered, it gets a ``reset`` event and should resync with /contacts/changes.
+    A stream whose ``queue_size`` events are not consumed in time gets ``reset`` as well and
+    is closed, so a slow client never holds memory or blocks the publisher.
+    """
+
+    def __init__(
+        self,
+        broker: LocalBroker | None = None,
+        history: int = config.SSE_HISTORY_SIZE,
+        history_users: int = config.SSE_HISTORY_USERS,
+        queue_size: int = config.SSE_QUEUE_SIZE,
+        max_streams_per_user: int = config.SSE_MAX_STREAMS_PER_USER,
+        heartbeat: float = config.SSE_HEARTBEAT,
+    ):
+        self.history = history
+        self.history_users = history_users
+        self.queue_size = queue_size
+        self.max_streams_per_user = max_streams_per_user
+        self.heartbeat = heartbeat
+        self._history: OrderedDict[int, deque] = OrderedDict()
+        self._subscribers: dict[int, set[_Subscription]] = {}
+        self.broker = None
+        self.use(broker or LocalBroker())
+
+    def use(self, broker: LocalBroker) -> None:
+        broker.attach(self._deliver)
+        self.broker = broker
+
+    async def start(self, broker: LocalBroker) -> None:
+        self.use(broker)
+        await broker.start()
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+        self.use(LocalBroker())
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.offer(None)
+
+    async def publish(self, user_id: int, event_type: str, contact_id: int, contact: dict | None = None) -> None:
+        """
+        The publish function announces a change of one of the user's contacts.
+
+        :param user_id: int: The owner of the contact
+        :param event_type: str: created, updated or deleted
+        :param contact_id: int: The id of the contact
+        :param contact: dict | None: The contact as the API returns it, None for deletions
+        :return: None
+
+        """
+        event = {
+            "id": uuid.uuid4().hex,
+            "type": event_type,
+            "user_id": user_id,
+            "contact_id": contact_id,
+            "contact": contact,
+        }
+        try:
+            await self.broker.publish(json.dumps(event, separators=(",", ":")))
+        except Exception:
+            # the write is committed already, a lost event is recovered by /contacts/changes
+            logger.exception("change event not published")
+
+    def _deliver(self, message: str) -> None:
+        try:
+            event = json.loads(message)
+            user_id = event["user_id"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("malformed change event dropped")
+            return
+        recent = self._history.get(user_id)
+        if recent is None:
+            recent = self._history[user_id] = deque(maxlen=self.history)
+            while len(self._history) > self.history_users:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(user_id)
+        recent.append(event)
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.offer(event)
+
+    def _missed(self, user_id: int, last_event_id: str) -> list[dict] | None:
+        recent = list(self._history.get(user_id, ()))
+        for index, event in enumerate(recent):
+            if event["id"] == last_event_id:
+                return recent[index + 1:]
+        return None
+
+    def open(self, user_id: int, last_event_id: str | None = None) -> _Subscription:
+        """
+        The open function reserves one of the user's streams and subscribes it to the user's
+        events, starting after last_event_id. The reservation is taken right away, so
+        concurrent requests cannot all pass the limit; hand the subscription to stream, or
+        to release if the stream is never served.
+
+        :param user_id: int: The id of the user
+        :param last_event_id: str | None: The Last-Event-ID the client reconnects with
+        :return: The subscription to pass to stream
+        :raises HTTPException: 429 if the user has max_streams_per_user streams open
+
+        """
+        subscriptions = self._subscribers.setdefault(user_id, set())
+        if len(subscriptions) >= self.max_streams_per_user:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many open event streams",
+            )
+        subscription = _Subscription(user_id, self.queue_size)
+        # register and read the history without awaiting in between, so nothing falls in a gap
+        subscriptions.add(subscription)
+        if last_event_id is not None:
+            subscription.missed = self._missed(user_id, last_event_id)
+        return subscription
+
+    def release(self, subscription: _Subscription) -> None:
+        """
+        The release function unsubscribes a stream and frees its reservation. Releasing a
+        subscription twice is harmless.
+
+        :param subscription: _Subscription: The subscription returned by open
+        :return: None
+
+        """
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    async def stream(self, subscription: _Subscription) -> AsyncIterator[str]:
+        """
+        The stream function yields a subscription's events as server-sent events, starting
+        with the ones it missed, with a comment line every heartbeat seconds while idle.
+        The subscription is released when the stream ends.
+
+        :param subscription: _Subscription: The subscription returned by open
+        :return: An async iterator of SSE frames
+
+        """
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if subscription.missed is None:
+                yield RESET_EVENT
+            else:
+                for event in subscription.missed:
+                    yield format_event(event)
+            subscription.missed = []
+            while True:
+                if subscription.overflowed:
+                    yield RESET_EVENT
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    return
+                yield format_event(event)
+        finally:
+            self.release(subscription)
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Serves a change feed subscription as text/event-stream. The subscription is released
+    however the response ends, also when the client is gone before the stream started.
+    """
+
+    def __init__(self, feed: ChangeFeed, subscription: _Subscription):
+        super().__init__(
+            feed.stream(subscription),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        self.feed = feed
+        self.subscription = subscription
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.feed.release(self.subscription)
+
+
+contact_events = ChangeFeed()
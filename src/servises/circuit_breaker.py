@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import redis
+
+from src.conf.config import config
+from src.servises.deadline import timeout_for
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing, so callers degrade immediately instead of
+    each waiting for their own timeout.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and every call fails
+    fast with CircuitOpenError. After ``reset_timeout`` seconds a single probe call is let
+    through: if it succeeds the circuit closes, otherwise it stays open for another period.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = config.REDIS_BREAKER_FAILURES,
+        reset_timeout: float = config.REDIS_BREAKER_RESET,
+        timeout: float = config.REDIS_TIMEOUT,
+        errors: tuple = (redis.RedisError, OSError, asyncio.TimeoutError),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.errors = errors
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def call(self, fn, *args, **kwargs):
+        """
+        The call function runs a blocking client call through the breaker.
+        The client itself must enforce the timeout (socket_timeout for redis-py).
+
+        :param fn: Callable: The client method
+        :return: Whatever fn returns
+        :raises CircuitOpenError: If the circuit is open
+        :raises DeadlineExceeded: If the current request's budget is already spent
+        :raises: The client's error, which is also counted as a failure
+
+        """
+        # a spent request budget fails fast without counting against Redis
+        timeout_for(None)
+        if not self.allow():
+            raise CircuitOpenError("circuit is open")
+        try:
+            result = fn(*args, **kwargs)
+        except redis.ResponseError:
+            # Redis answered, the command was wrong (e.g. NOSCRIPT): the server is healthy
+            self.record_success()
+            raise
+        except self.errors:
+            self.record_failure()
+            raise
+        except BaseException:
+            # e.g. a cancelled request: no verdict, let the next call probe again
+            self._probing = False
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn, *args, **kwargs):
+        """
+        The acall function awaits an async client call through the breaker, cut off after
+        timeout seconds or when the current request's deadline is reached, whichever is first.
+
+        :param fn: Callable: The async client method
+        :return: Whatever fn returns
+        :raises CircuitOpenError: If the circuit is open
+        :raises: The client's error or asyncio.TimeoutError, counted as a failure
+
+        """
+        timeout = timeout_for(self.timeout)
+        if not self.allow():
+            raise CircuitOpenError("circuit is open")
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), timeout=timeout)
+        except redis.ResponseError:
+            # Redis answered, the command was wrong (e.g. NOSCRIPT): the server is healthy
+            self.record_success()
+            raise
+        except self.errors:
+            self.record_failure()
+            raise
+        except BaseException:
+            # e.g. a cancelled request: no verdict, let the next call probe again
+            self._probing = False
+            raise
+        self.record_success()
+        return result
+
+    def status(self) -> dict:
+        return {"open": self.is_open, "failures": self.failures}
+
+
+# Auth's cache, the rate limiter and the invalidation bus all talk to the same Redis
+redis_breaker = CircuitBreaker()
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.servises.singleflight import SingleFlight
+
+
+class ReadCoalescer:
+    """
+    Shares one execution and one serialized body between identical concurrent reads.
+
+    A route opts in by building its key with ``key`` (route template, query parameters and
+    the principal) and passing a loader that returns the JSON body to ``run``. Requests that
+    arrive while the loader runs await its body instead of running their own query. The
+    loader outlives the request that started it, so it gets a session of its own from
+    ``session_factory`` rather than using that request's session. With a
+    ``window`` above zero the body is also served for that many seconds after it was built,
+    so a burst of tabs refreshing a dashboard hits the database once.
+    """
+
+    def __init__(
+        self,
+        window: float = config.READ_COALESCE_WINDOW,
+        max_entries: int = config.READ_COALESCE_MAX_ENTRIES,
+        session_factory: Callable = sessionmanager.session,
+    ):
+        self.window = window
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._flight = SingleFlight()
+        self._recent: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+
+    @staticmethod
+    def key(request: Request, principal: Hashable) -> tuple:
+        """
+        The key function identifies a read by its route, parameters and principal.
+
+        :param request: Request: The incoming request
+        :param principal: Hashable: Whose data the response contains, e.g. the user id
+        :return: A hashable key for run
+
+        """
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or request.url.path
+        params = tuple(sorted(request.path_params.items())) + tuple(
+            sorted(request.query_params.multi_items())
+        )
+        return path, params, principal
+
+    def _get_recent(self, key: Hashable) -> bytes | None:
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        expires_at, body = entry
+        if expires_at <= time.monotonic():
+            del self._recent[key]
+            return None
+        return body
+
+    def _remember(self, key: Hashable, body: bytes, window: float) -> None:
+        self._recent[key] = (time.monotonic() + window, body)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    async def run(
+        self,
+        key: Hashable,
+        load: Callable[[AsyncSession], Awaitable[bytes]],
+        window: float | None = None,
+    ) -> bytes:
+        """
+        The run function returns the body for key, running load only if no identical read is
+        in flight or was answered within the window.
+
+        :param key: Hashable: The key built by the key function
+        :param load: Callable: Runs the query on the session it is given and returns the serialized body
+        :param window: float | None: Seconds to keep serving the body, the default if None
+        :return: The serialized body
+
+        """
+        window = self.window if window is None else window
+        body = self._get_recent(key)
+        if body is not None:
+            return body
+
+        async def load_and_remember() -> bytes:
+            async with self.session_factory() as db:
+                body = await load(db)
+            if window > 0:
+                self._remember(key, body, window)
+            return body
+
+        return await self._flight.do(key, load_and_remember)
+
+    def forget(self, principal: Hashable) -> None:
+        """
+        The forget function drops the recent bodies of a principal, so a client reading right
+        after its own write does not get the body from before it.
+
+        :param principal: Hashable: The principal passed to key
+        :return: None
+
+        """
+        for key in [key for key in self._recent if key[-1] == principal]:
+            del self._recent[key]
+
+
+read_coalescer = ReadCoalescer()
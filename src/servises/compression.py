@@ -0,0 +1,313 @@
+import gzip
+import os
+import stat
+import sys
+import zlib
+from mimetypes import guess_type
+from pathlib import Path
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.staticfiles import NotModifiedResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset(
+    {
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    }
+)
+# streamed events must reach the client as they are sent, not when a compressor or a proxy
+# buffering a compressed stream lets them through
+INCOMPRESSIBLE_TYPES = frozenset({"text/event-stream"})
+# request headers whose entity tags may carry the suffix of a compressed representation
+CONDITIONAL_HEADERS = (b"if-none-match", b"if-range")
+PRECOMPRESS_SUFFIXES = frozenset(
+    {".css", ".js", ".html", ".svg", ".json", ".txt", ".xml", ".map"}
+)
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """
+    The accepted_encodings function parses an Accept-Encoding header.
+    Encodings sent with q=0 are treated as refused.
+
+    :param accept_encoding: str: The raw Accept-Encoding header value
+    :return: The set of encodings the client accepts
+
+    """
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    return accepted
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    The encoded_etag function derives the ETag of a compressed representation.
+    A strong validator must differ between representations, so the encoding is added to the
+    opaque tag; weak validators only claim semantic equivalence and are kept as they are.
+
+    :param etag: str: The ETag of the uncompressed response
+    :param encoding: str: The content coding, e.g. gzip or br
+    :return: The ETag to send with the compressed response
+
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoded_etags(value: str) -> str:
+    """
+    The strip_encoded_etags function maps the ETags in an If-None-Match or If-Range header
+    back to the ones the app produced, so its own comparison works for compressed responses.
+
+    :param value: str: The raw header value
+    :return: The header value without encoding suffixes
+
+    """
+    tags = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        for encoding in ("gzip", "br"):
+            suffix = f'-{encoding}"'
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)] + '"'
+                break
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            chunk = self._obj.process(data)
+            return chunk + (self._obj.finish() if final else self._obj.flush())
+        chunk = self._obj.compress(data)
+        return chunk + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with brotli (when installed) or gzip.
+
+    Only responses whose content type is on the allowlist are compressed, and a response
+    that arrives in a single chunk smaller than ``minimum_size`` is passed through untouched.
+    Streaming responses are compressed chunk by chunk and flushed after every chunk,
+    so the client keeps receiving data incrementally; server-sent events are never compressed.
+    A compressed response gets its own strong ETag (see encoded_etag), and the suffix is
+    stripped from If-None-Match and If-Range before the app compares them.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compressible_types: frozenset[str] = COMPRESSIBLE_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressible_types = compressible_types
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        if any(name in CONDITIONAL_HEADERS for name, _ in scope["headers"]):
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, strip_encoded_etags(value.decode("latin-1")).encode("latin-1"))
+                if name in CONDITIONAL_HEADERS
+                else (name, value)
+                for name, value in scope["headers"]
+            ]
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send, if_none_match)
+        await self.app(scope, receive, responder.send)
+
+    def is_compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type in INCOMPRESSIBLE_TYPES:
+            return False
+        return content_type.startswith("text/") or content_type in self.compressible_types
+
+
+class _CompressionResponder:
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, send: Send, if_none_match: str
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.if_none_match = [tag.strip() for tag in if_none_match.split(",")]
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if start["status"] == 304 and "etag" in headers:
+                # the client revalidated the compressed representation, confirm its tag
+                encoded = encoded_etag(headers["etag"], self.encoding)
+                if encoded in self.if_none_match:
+                    headers["ETag"] = encoded
+            if (
+                start["status"] in (204, 304)
+                or not self.middleware.is_compressible(headers)
+                or (not more_body and len(body) < self.middleware.minimum_size)
+            ):
+                await self._send(start)
+                await self._send(message)
+                return
+            self.compressor = _Compressor(
+                self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+            )
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            body = self.compressor.compress(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.compressor is None:
+            await self._send(message)
+            return
+        body = self.compressor.compress(body, final=not more_body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves ``.br``/``.gz`` siblings produced by precompress_directory
+    when the client accepts them, and marks every asset as cacheable for ``max_age`` seconds.
+    """
+
+    def __init__(self, *args, max_age: int = 31536000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+
+    async def get_response(self, path: str, scope: Scope):
+        response = None
+        if scope["method"] in ("GET", "HEAD"):
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if encoding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(
+                    self.lookup_path, path + suffix
+                )
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.precompressed_response(
+                        path, full_path, stat_result, encoding, scope
+                    )
+                    break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = self.cache_control
+        response.headers.add_vary_header("Accept-Encoding")
+        return response
+
+    def precompressed_response(self, path, full_path, stat_result, encoding, scope):
+        media_type = guess_type(path)[0] or "text/plain"
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+        response.headers["Content-Encoding"] = encoding
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def precompress_directory(directory: Path, minimum_size: int = 256) -> list[Path]:
+    """
+    The precompress_directory function writes .gz (and .br when brotli is installed)
+    siblings next to every compressible asset in a directory tree.
+    It is meant to run at build time, so requests never pay for compressing static files.
+
+    :param directory: Path: The static directory to walk
+    :param minimum_size: int: Skip files smaller than this many bytes
+    :return: The list of files written
+
+    """
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            source = Path(root) / name
+            if source.suffix not in PRECOMPRESS_SUFFIXES:
+                continue
+            data = source.read_bytes()
+            if len(data) < minimum_size:
+                continue
+            variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", brotli.compress(data, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) >= len(data):
+                    continue
+                target = source.with_name(source.name + suffix)
+                target.write_bytes(compressed)
+                written.append(target)
+    return written
+
+
+if __name__ == "__main__":
+    static_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parents[1] / "static"
+    for path in precompress_directory(static_dir):
+        print(path)
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from datetime import date
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.repository import contacts as repositories_contacts
+
+logger = logging.getLogger(__name__)
+
+
+def contact_stats(counters: dict[str, int], today: date | None = None) -> dict:
+    """
+    The contact_stats function turns a user's contact counters into the stats response.
+
+    :param counters: dict[str, int]: The counters returned by get_contact_counters
+    :param today: date | None: The date that decides the current month, today if None
+    :return: The total, the birthdays of the current month and the birthdays per month
+
+    """
+    today = today or date.today()
+    by_month = {
+        month: counters.get(repositories_contacts.birthday_counter(month), 0)
+        for month in range(1, 13)
+    }
+    return {
+        "total": counters.get(repositories_contacts.TOTAL_COUNTER, 0),
+        "birthdays_this_month": by_month[today.month],
+        "birthdays_by_month": by_month,
+    }
+
+
+class ContactStatsReconciler:
+    """
+    Recounts the contact counters on startup and then every ``interval`` seconds.
+
+    The counters are kept up to date by the contact writes themselves; this only repairs
+    drift, e.g. from rows changed outside the app, and fills the counters after the table
+    is first created.
+    """
+
+    def __init__(
+        self,
+        session_factory=sessionmanager.session,
+        interval: float = config.CONTACT_STATS_RECONCILE_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def reconcile(self) -> int:
+        async with self.session_factory() as session:
+            written = await repositories_contacts.reconcile_contact_counters(session)
+        logger.info("contact counters reconciled", extra={"fields": {"counters": written}})
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("contact counter reconciliation failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+contact_stats_reconciler = ContactStatsReconciler()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+
+DEADLINE_HEADER = "x-request-timeout"
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """
+    The time budget of one request.
+
+    ``at`` is a ``time.monotonic()`` timestamp. A route can move it with RequestDeadline, but
+    never past what the client asked for in the X-Request-Timeout header.
+    """
+
+    def __init__(self, started: float, budget: float, client_budget: float | None = None):
+        self.started = started
+        self.client_budget = client_budget
+        self.at = started + self._limit(budget)
+
+    def _limit(self, budget: float) -> float:
+        budget = min(budget, config.REQUEST_DEADLINE_MAX)
+        if self.client_budget is not None:
+            budget = min(budget, self.client_budget)
+        return budget
+
+    def set_budget(self, budget: float) -> None:
+        self.at = self.started + self._limit(budget)
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+
+_current: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """
+    The remaining function returns how many seconds the current request has left,
+    or None outside of a request.
+
+    :return: The remaining budget in seconds, or None
+
+    """
+    deadline = _current.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def timeout_for(default: float | None) -> float | None:
+    """
+    The timeout_for function caps a client timeout by the current request's remaining budget.
+
+    :param default: float | None: The timeout the call would use on its own
+    :return: The smaller of default and the remaining budget
+    :raises DeadlineExceeded: If the budget is already spent
+
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return left if default is None else min(default, left)
+
+
+class RequestDeadline:
+    """
+    Route dependency that gives a route its own budget instead of REQUEST_DEADLINE, e.g.
+    ``dependencies=[Depends(RequestDeadline(30))]``.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    async def __call__(self, request: Request) -> None:
+        deadline = _current.get()
+        if deadline is not None:
+            deadline.set_budget(self.seconds)
+
+
+def _client_budget(scope: Scope) -> float | None:
+    value = Headers(scope=scope).get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        budget = float(value)
+    except ValueError:
+        return None
+    return budget if budget > 0 else None
+
+
+class DeadlineMiddleware:
+    """
+    Gives every HTTP request a deadline and answers 503 once it is spent.
+
+    The budget is REQUEST_DEADLINE, or the route's RequestDeadline, capped by the client's
+    X-Request-Timeout header (seconds). Redis calls and SQL statements read the remaining
+    budget from a context variable. When it runs out before the response has started, the
+    handler is cancelled, which releases its pooled connection, and the client gets a 503.
+    """
+
+    def __init__(self, app: ASGIApp, budget: float = config.REQUEST_DEADLINE):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(time.monotonic(), self.budget, _client_budget(scope))
+        token = _current.set(deadline)
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            response_started = True
+            await send(message)
+
+        task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        try:
+            while not task.done():
+                left = deadline.remaining()
+                if left <= 0:
+                    if not response_started:
+                        task.cancel()
+                    await asyncio.wait({task})
+                    break
+                # a route may move the deadline while it runs, so wake up and re-check
+                await asyncio.wait({task}, timeout=left)
+        finally:
+            _current.reset(token)
+            if not task.done():
+                task.cancel()
+
+        if response_started:
+            task.result()
+            return
+        if not task.cancelled():
+            error = task.exception()
+            if error is None:
+                return
+            # a statement or Redis timeout caused by the spent budget is a 503, not a 500
+            if deadline.remaining() > 0 and not isinstance(error, DeadlineExceeded):
+                raise error
+        await self._timed_out(send)
+
+    async def _timed_out(self, send: Send) -> None:
+        body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
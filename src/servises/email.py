@@ -1,37 +1,213 @@
+import asyncio
+import logging
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
-from src.conf.config import config
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.repository import emails as repository_emails
 from src.servises.auth import auth_service
+from src.servises.deadline import timeout_for
+
+logger = logging.getLogger(__name__)
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.MAIL_USERNAME,
-    MAIL_PASSWORD=config.MAIL_PASSWORD,
-    MAIL_FROM=config.MAIL_FROM,
-    MAIL_PORT=config.MAIL_PORT,
-    MAIL_SERVER=config.MAIL_SERVER,
-    MAIL_FROM_NAME="FastAPI systems",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+TEMPLATE_FOLDER = Path(__file__).parent / "templates"
+MAIL_FROM_NAME = "FastAPI systems"
+
+# compile every template once at import instead of on each message
+template_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"])
 )
+templates = {name: template_env.get_template(name) for name in template_env.list_templates()}
+
+
+async def send_email(email: EmailStr, username: str, host: str, db: AsyncSession):
+    """
+    The send_email function queues the email verification message for a user.
+    Delivery happens in the mail worker, so the message survives a restart of this process.
 
+    :param email: EmailStr: The address to send the email to
+    :param username: str: Greet the user by name in the email
+    :param host: str: Build the confirmation link
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The queued email
 
-async def send_email(email: EmailStr, username: str, host: str):
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
+    """
+    token_verification = auth_service.create_email_token({"sub": email})
+    return await repository_emails.enqueue_email(
+        email,
+        "Confirm your email ",
+        "verify_email.html",
+        {"host": host, "username": username, "token": token_verification},
+        db,
+    )
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to ``size`` authenticated SMTP connections open and reuses them across messages.
+
+    The pool size doubles as the concurrency limit for outgoing mail. A connection that errors
+    is dropped, and an idle connection the server has closed is replaced transparently.
+    """
+
+    def __init__(
+        self,
+        hostname: str = config.MAIL_SERVER,
+        port: int = config.MAIL_PORT,
+        username: str | None = config.MAIL_USERNAME,
+        password: str | None = config.MAIL_PASSWORD,
+        use_tls: bool = config.MAIL_SSL_TLS,
+        start_tls: bool = config.MAIL_STARTTLS,
+        size: int = config.MAIL_QUEUE_CONCURRENCY,
+        timeout: float = config.MAIL_TIMEOUT,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: list[aiosmtplib.SMTP] = []
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
         )
+        await smtp.connect()
+        self.connections_opened += 1
+        return smtp
+
+    async def send_message(self, message: EmailMessage) -> None:
+        async with self._semaphore:
+            # the queue worker has no request deadline, a caller inside a request is capped by it
+            timeout = timeout_for(self.timeout)
+            smtp = self._idle.pop() if self._idle else None
+            if smtp is None or not smtp.is_connected:
+                smtp = await self._connect()
+            try:
+                try:
+                    await smtp.send_message(message, timeout=timeout)
+                except aiosmtplib.SMTPServerDisconnected:
+                    # the server dropped an idle connection, retry once on a fresh one
+                    smtp = await self._connect()
+                    await smtp.send_message(message, timeout=timeout_for(self.timeout))
+            except Exception:
+                smtp.close()
+                raise
+            self._idle.append(smtp)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+
+class MailQueueWorker:
+    """
+    Drains the outbound_emails queue through a shared SMTPConnectionPool.
+
+    Each pass claims up to ``batch_size`` due emails and sends them concurrently (bounded by
+    the pool). Failed attempts are retried with exponential backoff until ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        pool: SMTPConnectionPool | None = None,
+        session_factory=sessionmanager.session,
+        batch_size: int = config.MAIL_QUEUE_BATCH_SIZE,
+        max_attempts: int = config.MAIL_QUEUE_MAX_ATTEMPTS,
+        backoff: float = config.MAIL_QUEUE_RETRY_BACKOFF,
+        poll_interval: float = config.MAIL_QUEUE_POLL_INTERVAL,
+        lease: float = config.MAIL_QUEUE_LEASE,
+    ):
+        self.pool = pool or SMTPConnectionPool()
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._task: asyncio.Task | None = None
+
+    def build_message(self, email) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = formataddr((MAIL_FROM_NAME, config.MAIL_FROM))
+        message["To"] = email.recipient
+        message["Subject"] = email.subject
+        html = templates[email.template_name].render(**email.template_body)
+        message.set_content(html, subtype="html")
+        return message
+
+    async def _deliver(self, email) -> str | None:
+        try:
+            await self.pool.send_message(self.build_message(email))
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as err:
+            return str(err) or err.__class__.__name__
+        except Exception as err:
+            # e.g. a template that fails to render: fail this message, not the whole batch
+            logger.exception("email %s could not be delivered", email.id)
+            return f"{err.__class__.__name__}: {err}"
+        return None
+
+    async def drain_once(self) -> int:
+        async with self.session_factory() as db:
+            emails = await repository_emails.claim_emails(self.batch_size, self.lease, db)
+        if not emails:
+            return 0
+        errors = await asyncio.gather(*(self._deliver(email) for email in emails))
+        async with self.session_factory() as db:
+            await repository_emails.mark_sent(
+                [email.id for email, error in zip(emails, errors) if error is None], db
+            )
+            for email, error in zip(emails, errors):
+                if error is not None:
+                    await repository_emails.mark_failed(
+                        email, error, self.max_attempts, self.backoff, db
+                    )
+        return len(emails)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception:
+                logger.exception("mail queue pass failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        print(err)
+mail_worker = MailQueueWorker()
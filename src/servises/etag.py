@@ -0,0 +1,45 @@
+import hashlib
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+def make_etag(rows: Iterable[tuple[int, Optional[datetime]]], *salt) -> str:
+    """
+    The make_etag function builds a strong ETag from (id, updated_at) rows.
+    Any change to the set of ids, their order or their updated_at values yields a new tag.
+
+    :param rows: Iterable[tuple[int, Optional[datetime]]]: The rows that make up the response
+    :param salt: Extra values that affect the representation (e.g. the owner id)
+    :return: A quoted ETag string
+
+    """
+    digest = hashlib.sha256()
+    for value in salt:
+        digest.update(f"{value};".encode())
+    for row_id, updated_at in rows:
+        stamp = updated_at.isoformat() if updated_at else ""
+        digest.update(f"{row_id}:{stamp};".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    The etag_matches function checks an If-None-Match header against the current ETag.
+    Per RFC 9110 the comparison is weak, so a W/ prefix on the client side is ignored.
+
+    :param if_none_match: Optional[str]: The raw If-None-Match header value
+    :param etag: str: The current ETag of the resource
+    :return: True if the client already has the current representation
+
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
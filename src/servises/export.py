@@ -0,0 +1,219 @@
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import HTTPException, status
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.repository import contacts as repositories_contacts
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "ndjson")
+MANIFEST = "job.json"
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_chunk(path: Path, export_format: str, rows: list) -> None:
+    """
+    The write_chunk function writes rows to a gzip compressed CSV (with a header) or NDJSON
+    file. The file appears under its final name only once it is complete.
+
+    :param path: Path: Where to write the chunk
+    :param export_format: str: csv or ndjson
+    :param rows: list: Row mappings of one id range
+    :return: None
+
+    """
+
+    def write(tmp: Path) -> None:
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as file:
+            if export_format == "csv":
+                writer = csv.writer(file)
+                if rows:
+                    writer.writerow(rows[0].keys())
+                writer.writerows(row.values() for row in rows)
+            else:
+                for row in rows:
+                    file.write(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n")
+
+    _atomic_write(path, write)
+
+
+class ContactExporter:
+    """
+    Exports the whole ``contacts`` table in the background for admins.
+
+    A job splits the id space into ranges of ``chunk_ids`` ids and reads up to
+    ``concurrency`` ranges at once, each over its own pooled connection. Every range becomes
+    one gzip compressed chunk file in ``<directory>/<job id>/``, next to a ``job.json``
+    manifest holding the progress, so the status can be read from any worker sharing the disk.
+    Jobs run one at a time on a worker task started with the app, outside of any request.
+    Ranges are read in separate transactions, so rows changed during the export may appear
+    in their old or new state.
+    """
+
+    def __init__(
+        self,
+        session_factory=sessionmanager.session,
+        directory: str = config.EXPORT_DIR,
+        chunk_ids: int = config.EXPORT_CHUNK_IDS,
+        concurrency: int = config.EXPORT_CONCURRENCY,
+    ):
+        self.session_factory = session_factory
+        self.directory = Path(directory)
+        self.chunk_ids = chunk_ids
+        self.concurrency = concurrency
+        self._jobs: dict[str, dict] = {}
+        self._save_lock = asyncio.Lock()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, export_format: str, requested_by: int) -> dict:
+        """
+        The submit function queues a new export job.
+
+        :param export_format: str: csv or ndjson
+        :param requested_by: int: The id of the admin who asked for it
+        :return: The job status
+        :raises HTTPException: 503 if the export worker is not running
+
+        """
+        if self._queue is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Export worker is not running",
+            )
+        job = {
+            "id": uuid.uuid4().hex,
+            "format": export_format,
+            "status": "pending",
+            "requested_by": requested_by,
+            "chunks_total": None,
+            "chunks_done": 0,
+            "rows": 0,
+            "files": [],
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+        }
+        self._jobs[job["id"]] = job
+        await self._save(job)
+        self._queue.put_nowait(job)
+        return dict(job)
+
+    async def status(self, job_id: str) -> dict | None:
+        """
+        The status function returns the progress of a job of this or another worker.
+
+        :param job_id: str: The id returned by submit
+        :return: The job status, or None if there is no such job
+
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job, files=list(job["files"]))
+        try:
+            manifest = await asyncio.to_thread((self.directory / job_id / MANIFEST).read_text)
+            return json.loads(manifest)
+        except (OSError, ValueError):
+            return None
+
+    async def _save(self, job: dict) -> None:
+        # chunks finish concurrently, keep their manifest writes in order
+        async with self._save_lock:
+            manifest = json.dumps(job)
+            await asyncio.to_thread((self.directory / job["id"]).mkdir, parents=True, exist_ok=True)
+            await asyncio.to_thread(
+                _atomic_write,
+                self.directory / job["id"] / MANIFEST,
+                lambda tmp: tmp.write_text(manifest),
+            )
+
+    async def _export_chunk(self, job: dict, index: int, first_id: int, end_id: int, limit) -> None:
+        async with limit:
+            async with self.session_factory() as session:
+                rows = await repositories_contacts.get_contacts_chunk(first_id, end_id, session)
+            name = f"contacts-{index:05d}.{job['format']}.gz"
+            await asyncio.to_thread(
+                write_chunk, self.directory / job["id"] / name, job["format"], rows
+            )
+        job["rows"] += len(rows)
+        job["chunks_done"] += 1
+        job["files"].append(name)
+        await self._save(job)
+
+    async def run_job(self, job: dict) -> None:
+        job["status"] = "running"
+        try:
+            async with self.session_factory() as session:
+                low, high = await repositories_contacts.get_contact_id_range(session)
+            ranges = [] if low is None else [
+                (start, min(start + self.chunk_ids, high + 1))
+                for start in range(low, high + 1, self.chunk_ids)
+            ]
+            job["chunks_total"] = len(ranges)
+            await self._save(job)
+            limit = asyncio.Semaphore(self.concurrency)
+            tasks = [
+                asyncio.ensure_future(self._export_chunk(job, index, first_id, end_id, limit))
+                for index, (first_id, end_id) in enumerate(ranges)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            job["files"].sort()
+            job["status"] = "done"
+        except asyncio.CancelledError:
+            job["status"] = "failed"
+            job["error"] = "cancelled"
+            raise
+        except Exception as err:
+            logger.exception("contact export failed", extra={"fields": {"job": job["id"]}})
+            job["status"] = "failed"
+            job["error"] = str(err)[:255]
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+            try:
+                await asyncio.shield(self._save(job))
+            except Exception:
+                logger.exception("export manifest not written")
+        logger.info(
+            "contact export finished",
+            extra={"fields": {"job": job["id"], "rows": job["rows"], "chunks": job["chunks_done"]}},
+        )
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            await self.run_job(job)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        self._queue = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+contact_exporter = ContactExporter()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.servises.circuit_breaker import redis_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Checks the application's dependencies in the background and caches the verdict.
+
+    Every ``interval`` seconds it checks Postgres, Redis, DB pool saturation and event loop lag.
+    Liveness and readiness probes then read the cached result, so frequent orchestrator probing
+    costs no database connection. A verdict older than three intervals counts as not ready.
+    Redis is not required for readiness: without it the app runs in degraded mode (see
+    redis_breaker), which the status reports instead.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        interval: float = config.HEALTH_CHECK_INTERVAL,
+        timeout: float = config.HEALTH_CHECK_TIMEOUT,
+        max_pool_usage: float = config.HEALTH_MAX_POOL_USAGE,
+        max_loop_lag: float = config.HEALTH_MAX_LOOP_LAG,
+        lag_tick: float = 0.5,
+    ):
+        self.engine = engine
+        self.redis = None
+        self.interval = interval
+        self.timeout = timeout
+        self.max_pool_usage = max_pool_usage
+        self.max_loop_lag = max_loop_lag
+        self.lag_tick = lag_tick
+        self.loop_lag = 0.0
+        self.checked_at: float | None = None
+        self.checks: dict = {}
+        self._tasks: list[asyncio.Task] = []
+        self.optional = {"redis"}
+
+    async def _timed(self, coro) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro, timeout=self.timeout)
+        except Exception as err:
+            return {"ok": False, "error": str(err) or err.__class__.__name__}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    async def _ping_database(self) -> None:
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    def pool_usage(self) -> dict:
+        pool = self.engine.sync_engine.pool
+        if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+            return {"ok": True}
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        in_use = pool.checkedout()
+        usage = in_use / capacity if capacity else 0.0
+        return {
+            "ok": usage < self.max_pool_usage,
+            "in_use": in_use,
+            "capacity": capacity,
+        }
+
+    async def check_once(self) -> None:
+        checks = {"database": await self._timed(self._ping_database())}
+        if self.redis is not None:
+            checks["redis"] = await self._timed(self.redis.ping())
+        checks["pool"] = self.pool_usage()
+        checks["event_loop"] = {
+            "ok": self.loop_lag < self.max_loop_lag,
+            "lag_ms": round(self.loop_lag * 1000, 2),
+        }
+        self.checks = checks
+        self.checked_at = time.monotonic()
+
+    def is_ready(self) -> bool:
+        if self.checked_at is None:
+            return False
+        if time.monotonic() - self.checked_at > self.interval * 3:
+            return False
+        return all(check["ok"] for name, check in self.checks.items() if name not in self.optional)
+
+    def is_degraded(self) -> bool:
+        return redis_breaker.is_open or not all(
+            self.checks.get(name, {"ok": True})["ok"] for name in self.optional
+        )
+
+    def status(self) -> dict:
+        age = None if self.checked_at is None else round(time.monotonic() - self.checked_at, 2)
+        return {
+            "ready": self.is_ready(),
+            "degraded": self.is_degraded(),
+            "age_s": age,
+            "checks": self.checks,
+            "redis_breaker": redis_breaker.status(),
+        }
+
+    async def _run_checks(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except Exception:
+                logger.exception("health check failed")
+            await asyncio.sleep(self.interval)
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_tick)
+            lag = max(loop.time() - started - self.lag_tick, 0.0)
+            # keep spikes visible for a few ticks instead of reporting only the last sample
+            self.loop_lag = max(lag, self.loop_lag * 0.5)
+
+    def start(self, redis=None) -> None:
+        self.redis = redis
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run_checks()),
+                asyncio.create_task(self._measure_lag()),
+            ]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+health_monitor = HealthMonitor(sessionmanager._engine)
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.servises.circuit_breaker import CircuitOpenError, redis_breaker
+from src.servises.deadline import timeout_for
+from src.servises.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    The fingerprint function hashes what identifies a request (method, path, body), so a key
+    reused for a different request can be told apart from a retry.
+
+    :param parts: Any: JSON serializable parts of the request
+    :return: A hex digest
+
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Runs a write at most once per Idempotency-Key and replays its result for retries.
+
+    The first request with a key claims it in Redis with SET NX (state ``in_flight``, expiring
+    after ``lock_ttl`` in case the worker dies), runs the write and stores the JSON result for
+    ``ttl`` seconds. Concurrent duplicates poll until the result is there instead of running
+    the write themselves. A failed write releases the key so the client can retry it.
+    While Redis is unavailable, duplicates are only coalesced within this worker. That write
+    runs detached from the first request, so a cancelled first request does not cut it short
+    for the duplicates; it gets its own session from ``session_factory`` for the same reason.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        ttl: int = config.IDEMPOTENCY_TTL,
+        lock_ttl: float = config.IDEMPOTENCY_LOCK_TTL,
+        poll_interval: float = 0.05,
+        prefix: str = "idempotency",
+        session_factory: Callable = sessionmanager.session,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self.session_factory = session_factory
+        self._local = SingleFlight()
+
+    def start(self, redis) -> None:
+        self.redis = redis
+
+    async def _get(self, key: str) -> dict | None:
+        raw = await redis_breaker.acall(self.redis.get, key)
+        return None if raw is None else json.loads(raw)
+
+    async def run(
+        self,
+        key: str | None,
+        scope: str,
+        request_fingerprint: str,
+        operation: Callable[[AsyncSession], Awaitable[Any]],
+        db: AsyncSession | None = None,
+    ) -> tuple[Any, bool]:
+        """
+        The run function executes operation once for key and returns its JSON result.
+
+        :param key: str | None: The client's Idempotency-Key, None runs operation directly
+        :param scope: str: Who the key belongs to, e.g. the user id and route
+        :param request_fingerprint: str: The fingerprint of the request
+        :param operation: Callable: Performs the write on the session it is given and returns
+            a JSON serializable result
+        :param db: AsyncSession | None: The request's session, the write runs on it unless it
+            is coalesced locally
+        :return: The result and whether it was replayed from an earlier request
+        :raises HTTPException: 422 if the key was used for a different request,
+            409 if the first request is still running after lock_ttl
+
+        """
+        if not key:
+            return await operation(db), False
+        record_key = f"{self.prefix}:{scope}:{key}"
+        if self.redis is None:
+            return await self._run_locally(record_key, operation), False
+        try:
+            return await self._run(record_key, request_fingerprint, operation, db)
+        except (CircuitOpenError, *redis_breaker.errors) as err:
+            logger.warning("idempotency store unavailable: %s", err)
+            return await self._run_locally(record_key, operation), False
+
+    async def _run_locally(self, record_key: str, operation) -> Any:
+        async def write() -> Any:
+            async with self.session_factory() as db:
+                return await operation(db)
+
+        return await self._local.do(record_key, write)
+
+    async def _run(
+        self, record_key: str, request_fingerprint: str, operation, db: AsyncSession | None
+    ) -> tuple[Any, bool]:
+        give_up_at = time.monotonic() + self.lock_ttl
+        claim = json.dumps({"state": "in_flight", "fingerprint": request_fingerprint})
+        while True:
+            claimed = await redis_breaker.acall(
+                self.redis.set, record_key, claim, nx=True, px=int(self.lock_ttl * 1000)
+            )
+            if claimed:
+                break
+            record = await self._get(record_key)
+            if record is None:
+                # released or expired between SET and GET, try to claim it again
+                continue
+            if record["fingerprint"] != request_fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if record["state"] == "done":
+                return record["result"], True
+            if time.monotonic() >= give_up_at:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                )
+            await asyncio.sleep(timeout_for(self.poll_interval))
+
+        try:
+            result = await operation(db)
+        except BaseException:
+            await self._release(record_key)
+            raise
+        done = json.dumps({"state": "done", "fingerprint": request_fingerprint, "result": result})
+        try:
+            await redis_breaker.acall(self.redis.set, record_key, done, ex=self.ttl)
+        except (CircuitOpenError, *redis_breaker.errors) as err:
+            # the write happened, so never fall back to running it again; without the stored
+            # result the in-flight claim simply expires after lock_ttl
+            logger.warning("idempotent result not stored: %s", err)
+        return result, False
+
+    async def _release(self, record_key: str) -> None:
+        try:
+            await redis_breaker.acall(self.redis.delete, record_key)
+        except (CircuitOpenError, *redis_breaker.errors) as err:
+            logger.warning("idempotency key not released: %s", err)
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,217 @@
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+user_id_var: ContextVar[int | None] = ContextVar("user_id", default=None)
+_scope_var: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+
+def bind_user(user_id: int | None) -> None:
+    """
+    The bind_user function attaches the authenticated user's id to every log record written
+    for the rest of the current request.
+
+    :param user_id: int | None: The id of the current user
+    :return: None
+
+    """
+    user_id_var.set(user_id)
+
+
+def _current_route() -> str | None:
+    scope = _scope_var.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    # the route template once routing is done, the raw path before that
+    return getattr(route, "path", None) or scope.get("path")
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Copies the request id, user id and route from the context variables onto the record.
+    It runs in the logging thread of the caller, before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        record.route = _current_route()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records of noisy loggers.
+
+    ``rates`` maps a logger name (or a parent of it) to the fraction of its records to keep.
+    Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the queue is full the record is dropped
+    and counted instead of waiting for the writer thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # render the message now, the arguments may change once the caller moves on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line. Values passed as
+    ``extra={"fields": {...}}`` are merged into the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "user_id", "route"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class AsyncLogging:
+    """
+    Routes the application's log records through a bounded queue to a background writer
+    thread, so a log call costs the event loop a put_nowait and never a write to stdout.
+    """
+
+    def __init__(
+        self,
+        level: str = config.LOG_LEVEL,
+        queue_size: int = config.LOG_QUEUE_SIZE,
+        sample_rates: dict[str, float] | None = None,
+        stream=None,
+    ):
+        self.level = level
+        self.queue_size = queue_size
+        self.sample_rates = config.LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        self.stream = stream
+        self.handler: DroppingQueueHandler | None = None
+        self._listener: QueueListener | None = None
+
+    def start(self, logger_name: str = "src") -> None:
+        if self._listener is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(self.queue_size)
+        output = logging.StreamHandler(self.stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.handler = DroppingQueueHandler(log_queue)
+        self.handler.addFilter(SamplingFilter(self.sample_rates))
+        self.handler.addFilter(RequestContextFilter())
+        logger = logging.getLogger(logger_name)
+        logger.setLevel(self.level)
+        logger.addHandler(self.handler)
+        logger.propagate = False
+        self._listener = QueueListener(log_queue, output, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self, logger_name: str = "src") -> None:
+        if self._listener is None:
+            return
+        # stop() lets the writer thread drain what is already queued
+        self._listener.stop()
+        self._listener = None
+        logger = logging.getLogger(logger_name)
+        logger.removeHandler(self.handler)
+        logger.propagate = True
+
+
+async_logging = AsyncLogging()
+
+
+class RequestContextMiddleware:
+    """
+    Binds a request id (the client's X-Request-ID or a new one) and the route to the log
+    context of every HTTP request, and echoes the id in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        tokens = (request_id_var.set(request_id), user_id_var.set(None), _scope_var.set(scope))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _scope_var.reset(tokens[2])
+            user_id_var.reset(tokens[1])
+            request_id_var.reset(tokens[0])
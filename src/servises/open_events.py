@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.models import EmailOpen
+
+logger = logging.getLogger(__name__)
+
+
+class OpenEventRecorder:
+    """
+    Buffers email-open events in memory and writes them to the ``email_opens`` table in batches.
+
+    ``record`` only appends to a list, so the tracking-pixel endpoint never waits on the database.
+    A background task flushes the buffer every ``flush_interval`` seconds, or sooner once
+    ``batch_size`` events are waiting. If the buffer reaches ``max_buffer`` while the database
+    is unavailable, new events are counted in ``dropped`` instead of growing memory without bound.
+    """
+
+    def __init__(
+        self,
+        session_factory=sessionmanager.session,
+        batch_size: int = config.OPEN_EVENTS_BATCH_SIZE,
+        flush_interval: float = config.OPEN_EVENTS_FLUSH_INTERVAL,
+        max_buffer: int = config.OPEN_EVENTS_MAX_BUFFER,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: list[dict] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def record(self, username: str) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append({"username": username, "opened_at": datetime.now()})
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def flush(self) -> int:
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        written = False
+        try:
+            async with self.session_factory() as session:
+                for start in range(0, len(batch), self.batch_size):
+                    await session.execute(
+                        insert(EmailOpen), batch[start:start + self.batch_size]
+                    )
+                await session.commit()
+                written = True
+        finally:
+            if not written:
+                # keep the events for the next flush, the database may be back by then
+                keep = max(self.max_buffer - len(self._buffer), 0)
+                self._buffer = batch[:keep] + self._buffer
+        return len(batch) if written else 0
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("flushing email open events failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+
+open_event_recorder = OpenEventRecorder()
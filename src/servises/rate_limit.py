@@ -0,0 +1,93 @@
+import logging
+import time
+from collections import OrderedDict
+
+import redis
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter as RedisRateLimiter
+
+from src.conf.config import config
+from src.servises.circuit_breaker import CircuitOpenError, redis_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTokenBuckets:
+    """
+    In-process token buckets used while Redis is unavailable.
+
+    Each key gets ``times`` tokens refilled evenly over the window. Limits are per worker in
+    this mode, so the effective limit is looser by the number of workers.
+    """
+
+    def __init__(self, max_keys: int = config.RATE_LIMIT_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, times: int, milliseconds: int) -> int:
+        """
+        The take function spends one token from the bucket of key.
+
+        :param key: str: The rate limit key
+        :param times: int: The bucket capacity
+        :param milliseconds: int: The window in which the bucket refills completely
+        :return: 0 if the request is allowed, otherwise the milliseconds until the next token
+
+        """
+        now = time.monotonic()
+        rate = times / (milliseconds / 1000) if milliseconds > 0 else float("inf")
+        tokens, updated_at = self._buckets.get(key, (float(times), now))
+        tokens = min(float(times), tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return max(int((1 - tokens) / rate * 1000), 1)
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0
+
+
+local_buckets = LocalTokenBuckets()
+
+
+class RateLimiter(RedisRateLimiter):
+    """
+    fastapi-limiter's RateLimiter with a degraded mode.
+
+    The Redis script runs through redis_breaker with a strict timeout. When Redis fails, or the
+    breaker is open, the request is checked against local token buckets instead, so a Redis
+    incident neither fails every route nor adds a timeout to each request.
+    """
+
+    async def _check(self, key):
+        try:
+            if FastAPILimiter.lua_sha is None:
+                FastAPILimiter.lua_sha = await redis_breaker.acall(
+                    FastAPILimiter.redis.script_load, FastAPILimiter.lua_script
+                )
+            return await redis_breaker.acall(
+                FastAPILimiter.redis.evalsha,
+                FastAPILimiter.lua_sha, 1, key, str(self.times), str(self.milliseconds),
+            )
+        except redis.exceptions.NoScriptError:
+            raise
+        except (CircuitOpenError, *redis_breaker.errors):
+            return local_buckets.take(key, self.times, self.milliseconds)
+
+
+async def init_rate_limiter(client) -> None:
+    """
+    The init_rate_limiter function initializes FastAPILimiter like FastAPILimiter.init,
+    but does not fail the startup when Redis is down: the script is loaded on first use.
+
+    :param client: The redis.asyncio client
+    :return: None
+
+    """
+    try:
+        await redis_breaker.acall(FastAPILimiter.init, client)
+    except (CircuitOpenError, *redis_breaker.errors) as err:
+        # init stores the client and callbacks before loading the script
+        logger.warning("rate limiter starts in degraded mode: %s", err)
+        FastAPILimiter.lua_sha = None
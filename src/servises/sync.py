@@ -0,0 +1,147 @@
+import asyncio
+import base64
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.models import User
+from src.repository import contacts as repositories_contacts
+
+logger = logging.getLogger(__name__)
+
+
+def encode_sync_token(at: datetime, contact_id: int = 0) -> str:
+    """
+    The encode_sync_token function packs a position in the (updated_at, id) order of a
+    user's contacts into an opaque token.
+
+    :param at: datetime: The updated_at of the position
+    :param contact_id: int: The id of the last contact seen at that time, 0 for none
+    :return: A URL safe token
+
+    """
+    raw = f"{at.isoformat()}|{contact_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> tuple[datetime, int]:
+    """
+    The decode_sync_token function reverses encode_sync_token.
+
+    :param token: str: A token returned by encode_sync_token
+    :return: The (updated_at, id) position
+    :raises ValueError: If the token is malformed
+
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        at, contact_id = raw.split("|")
+        return datetime.fromisoformat(at), int(contact_id)
+    except (ValueError, UnicodeDecodeError) as err:
+        raise ValueError("malformed sync token") from err
+
+
+async def get_changes(
+    since: str | None,
+    db: AsyncSession,
+    current_user: User,
+    page_size: int = config.SYNC_PAGE_SIZE,
+    safety_window: float = config.SYNC_SAFETY_WINDOW,
+    tombstone_ttl_days: int = config.SYNC_TOMBSTONE_TTL_DAYS,
+) -> dict:
+    """
+    The get_changes function returns one page of the contacts created or updated since the
+    sync token, and the ids of the contacts deleted since then.
+
+    Without a token every contact is returned. While has_more is true the client asks again
+    with next_token. The last page hands out a token ``safety_window`` seconds in the past,
+    because a write transaction stamps updated_at when it starts and may commit after a
+    later one, so recent changes can be delivered twice but are never skipped.
+
+    :param since: str | None: The next_token of the previous sync
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the user whose contacts are synced
+    :param page_size: int: The number of contacts per page
+    :param safety_window: float: How far back the last page's token points, in seconds
+    :param tombstone_ttl_days: int: How long deletions are remembered
+    :return: The changed contacts, the deleted ids, next_token and has_more
+    :raises HTTPException: 400 for a malformed token, 410 if deletions since then were purged
+
+    """
+    after = None
+    if since is not None:
+        try:
+            after = decode_sync_token(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    now = await repositories_contacts.get_database_time(db)
+    if after is not None and after[0] < now - timedelta(days=tombstone_ttl_days):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE, detail="Sync token expired, sync from scratch"
+        )
+
+    contacts = await repositories_contacts.get_contact_changes(after, page_size + 1, db, current_user)
+    has_more = len(contacts) > page_size
+    contacts = contacts[:page_size]
+    if has_more:
+        last = contacts[-1]
+        next_token = encode_sync_token(last.updated_at, last.id)
+        until = last.updated_at
+    else:
+        next_token = encode_sync_token(now - timedelta(seconds=safety_window))
+        until = None
+    deleted = []
+    if after is not None:
+        deleted = await repositories_contacts.get_contact_tombstones(after[0], until, db, current_user)
+    return {"changed": contacts, "deleted": deleted, "next_token": next_token, "has_more": has_more}
+
+
+class TombstonePurger:
+    """
+    Deletes contact tombstones older than ``ttl_days`` every ``interval`` seconds. Clients
+    with an older sync token get 410 and sync from scratch.
+    """
+
+    def __init__(
+        self,
+        session_factory=sessionmanager.session,
+        ttl_days: int = config.SYNC_TOMBSTONE_TTL_DAYS,
+        interval: float = config.SYNC_TOMBSTONE_PURGE_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def purge(self) -> int:
+        async with self.session_factory() as session:
+            now = await repositories_contacts.get_database_time(session)
+            return await repositories_contacts.purge_contact_tombstones(
+                now - timedelta(days=self.ttl_days), session
+            )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                purged = await self.purge()
+                logger.info("contact tombstones purged", extra={"fields": {"purged": purged}})
+            except Exception:
+                logger.exception("purging contact tombstones failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+tombstone_purger = TombstonePurger()
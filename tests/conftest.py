@@ -2,6 +2,7 @@ import asyncio
 
 import pytest
 import pytest_asyncio
+from fastapi import Request
 from fastapi.testclient import TestClient
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
@@ -10,6 +11,10 @@ from main import app
 from src.database.models import Base, User
 from src.database.db import get_db
 from src.servises.auth import auth_service
+from src.servises.cache_events import FLUSH_ALL
+from src.servises.circuit_breaker import redis_breaker
+from src.servises.coalesce import read_coalescer
+from src.servises.idempotency import idempotency_store
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
@@ -49,23 +54,39 @@ def init_models_wrap():
             await session.commit()
 
     asyncio.run(init_models())
+    auth_service.drop_cached_user(FLUSH_ALL)
+
+
+@pytest.fixture(autouse=True)
+def close_redis_breaker():
+    # there is no Redis in tests, so unpatched calls trip the shared breaker
+    redis_breaker.record_success()
+    yield
 
 
 @pytest.fixture(scope="module")
 def client():
     # Dependency override
 
-    async def override_get_db():
+    async def override_get_db(request: Request):
+        shared = getattr(request.state, "db", None)
+        if shared is not None:
+            yield shared
+            return
         session = TestingSessionLocal()
         try:
             yield session
         except Exception as err:
             print(err)
             await session.rollback()
+            raise
         finally:
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    auth_service.session_factory = TestingSessionLocal
+    read_coalescer.session_factory = TestingSessionLocal
+    idempotency_store.session_factory = TestingSessionLocal
 
     yield TestClient(app)
 
@@ -1,9 +1,14 @@
-from unittest.mock import Mock
+import asyncio
+import threading
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from sqlalchemy import select
 
-from src.database.models import User
+from src.database.models import User, EmailOpen
+from src.repository import users as repositories_users
+from src.servises.auth import auth_service
+from src.servises.open_events import open_event_recorder, OpenEventRecorder
 from tests.conftest import TestingSessionLocal
 from src.conf import messages
 
@@ -15,7 +20,7 @@ user_data = {
 
 
 def test_signup(client, monkeypatch):
-    mock_send_email = Mock()
+    mock_send_email = AsyncMock()
     monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
     response = client.post("api/auth/signup", json=user_data)
     assert response.status_code == 201, response.text
@@ -25,7 +30,7 @@ def test_signup(client, monkeypatch):
 
 
 def test_repeat_signup(client, monkeypatch):
-    mock_send_email = Mock()
+    mock_send_email = AsyncMock()
     monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
     response = client.post("api/auth/signup", json=user_data)
     assert response.status_code == 409, response.text
@@ -33,6 +38,35 @@ def test_repeat_signup(client, monkeypatch):
     assert data["detail"] == messages.ACCOUNT_EXIST
 
 
+def test_repeat_signup_skips_hashing(client, monkeypatch):
+    get_password_hash = Mock()
+    monkeypatch.setattr("src.routes.auth.auth_service.get_password_hash", get_password_hash)
+    response = client.post("api/auth/signup", json=user_data)
+    assert response.status_code == 409, response.text
+    get_password_hash.assert_not_called()
+
+
+def test_signup_hashes_outside_a_transaction(client, monkeypatch):
+    get_user_by_email = repositories_users.get_user_by_email
+    get_password_hash = auth_service.get_password_hash
+    sessions = []
+
+    async def remember_session(email, db):
+        sessions.append(db)
+        return await get_user_by_email(email, db)
+
+    def check_hash(password):
+        assert not sessions[0].in_transaction()
+        return get_password_hash(password)
+
+    monkeypatch.setattr("src.routes.auth.send_email", AsyncMock())
+    monkeypatch.setattr("src.routes.auth.repositories_users.get_user_by_email", remember_session)
+    monkeypatch.setattr("src.routes.auth.auth_service.get_password_hash", check_hash)
+    body = {**user_data, "username": "hashuser", "email": "hash@gmail.com"}
+    response = client.post("api/auth/signup", json=body)
+    assert response.status_code == 201, response.text
+
+
 def test_not_confirmed_login(client):
     response = client.post(
         "api/auth/login",
@@ -71,6 +105,37 @@ async def test_login(client):
     assert "token_type" in data
 
 
+def test_passwords_are_checked_off_the_event_loop(client, monkeypatch):
+    get_password_hash = auth_service.get_password_hash
+    verify_and_update_password = auth_service.verify_and_update_password
+    threads = []
+
+    def not_on_the_loop():
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        threads.append(threading.current_thread())
+
+    def check_hash(password):
+        not_on_the_loop()
+        return get_password_hash(password)
+
+    def check_verify(password, hashed):
+        not_on_the_loop()
+        return verify_and_update_password(password, hashed)
+
+    monkeypatch.setattr("src.routes.auth.send_email", AsyncMock())
+    monkeypatch.setattr("src.routes.auth.auth_service.get_password_hash", check_hash)
+    monkeypatch.setattr("src.routes.auth.auth_service.verify_and_update_password", check_verify)
+    body = {**user_data, "username": "threaduser", "email": "thread@gmail.com"}
+    assert client.post("api/auth/signup", json=body).status_code == 201
+    response = client.post(
+        "api/auth/login",
+        data={"username": user_data["email"], "password": user_data["password"]},
+    )
+    assert response.status_code == 200, response.text
+    assert len(threads) == 2
+
+
 def test_wrong_password_login(client):
     response = client.post(
         "api/auth/login",
@@ -98,3 +163,27 @@ def test_validation_error_login(client):
     assert response.status_code == 422, response.text
     data = response.json()
     assert "detail" in data
+
+
+def test_open_email_pixel(client):
+    pending = open_event_recorder.pending()
+    response = client.get("api/auth/testuser")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert "no-store" in response.headers["cache-control"]
+    assert response.content.startswith(b"\x89PNG")
+    assert open_event_recorder.pending() == pending + 1
+
+
+@pytest.mark.asyncio
+async def test_open_events_flush_in_batches():
+    recorder = OpenEventRecorder(session_factory=TestingSessionLocal, batch_size=2)
+    for _ in range(3):
+        recorder.record("batchuser")
+    assert await recorder.flush() == 3
+    assert recorder.pending() == 0
+    async with TestingSessionLocal() as session:
+        opens = await session.execute(
+            select(EmailOpen).where(EmailOpen.username == "batchuser")
+        )
+        assert len(opens.scalars().all()) == 3
@@ -0,0 +1,135 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.database.models import Contact
+from src.repository import contacts as repositories_contacts
+from src.schemas.batch import BatchItemSchema
+from src.servises import batch
+from src.servises.auth import auth_service
+
+
+def patch_limiter(monkeypatch):
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+
+def test_batch(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        patch_limiter(monkeypatch)
+        headers = {"Authorization": f"Bearer {get_token}"}
+        requests = [
+            {"id": "me", "path": "/api/users/me"},
+            {
+                "id": "create",
+                "method": "POST",
+                "path": "/api/contacts/",
+                "body": {
+                    "first_name": "batched",
+                    "last_name": "contact",
+                    "email": "batched@example.com",
+                    "phone_number": "380000000000",
+                    "birthday": "1990-01-01",
+                },
+            },
+            {"id": "list", "path": "/api/contacts/?limit=100"},
+            {"id": "stats", "path": "/api/contacts/stats"},
+            {"id": "missing", "path": "/api/contacts/999999"},
+            {"id": "invalid", "method": "POST", "path": "/api/contacts/", "body": {}},
+        ]
+        response = client.post("api/batch", headers=headers, json={"requests": requests})
+        assert response.status_code == 200, response.text
+        responses = {item["id"]: item for item in response.json()["responses"]}
+        assert [item["id"] for item in response.json()["responses"]] == [r["id"] for r in requests]
+
+        assert responses["me"]["status"] == 200
+        assert responses["me"]["body"]["email"] == "test@example.com"
+        assert responses["create"]["status"] == 201
+        created = responses["create"]["body"]["id"]
+        # reads after a write see it
+        assert created in [c["id"] for c in responses["list"]["body"]]
+        assert "etag" in responses["list"]["headers"]
+        assert responses["stats"]["body"]["total"] == len(responses["list"]["body"])
+        assert responses["missing"]["status"] == 404
+        assert responses["invalid"]["status"] == 422
+
+
+def test_batch_rejects_streams_and_nesting(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        patch_limiter(monkeypatch)
+        headers = {"Authorization": f"Bearer {get_token}"}
+        requests = [
+            {"path": "/api/contacts/events"},
+            {"method": "POST", "path": "/api/batch", "body": {"requests": []}},
+        ]
+        response = client.post("api/batch", headers=headers, json={"requests": requests})
+        assert response.status_code == 200, response.text
+        assert [item["status"] for item in response.json()["responses"]] == [400, 400]
+
+        response = client.post("api/batch", headers=headers, json={"requests": [{"path": "/static/x"}]})
+        assert response.status_code == 422, response.text
+
+
+def test_batch_requires_authentication(client, monkeypatch):
+    patch_limiter(monkeypatch)
+    response = client.post("api/batch", json={"requests": [{"path": "/api/users/me"}]})
+    assert response.status_code == 401, response.text
+
+
+def test_batch_write_after_a_failed_write(client, get_token, monkeypatch):
+    create_contact = repositories_contacts.create_contact
+    calls = 0
+
+    async def broken_once(body, db, current_user):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            db.add(Contact(first_name=None, last_name="broken", user=current_user))
+            await db.flush()
+        return await create_contact(body, db, current_user)
+
+    monkeypatch.setattr("src.routes.contacts.repositories_contacts.create_contact", broken_once)
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        patch_limiter(monkeypatch)
+        headers = {"Authorization": f"Bearer {get_token}"}
+        requests = [
+            {
+                "method": "POST",
+                "path": "/api/contacts/",
+                "body": {
+                    "first_name": name,
+                    "last_name": "contact",
+                    "email": f"{name}@example.com",
+                    "phone_number": "380000000000",
+                    "birthday": "1990-01-01",
+                },
+            }
+            for name in ("failing", "recovered")
+        ]
+        response = client.post("api/batch", headers=headers, json={"requests": requests})
+        assert response.status_code == 200, response.text
+        assert [item["status"] for item in response.json()["responses"]] == [500, 201]
+
+
+@pytest.mark.asyncio
+async def test_batch_caps_read_concurrency(monkeypatch):
+    running = peak = 0
+
+    async def dispatch(parent, item, user, db):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"id": item.id, "status": 200}
+
+    monkeypatch.setattr(batch, "dispatch", dispatch)
+    items = [BatchItemSchema(id=str(i), path="/api/users/me") for i in range(10)]
+    responses = await batch.run_batch(None, items, None, None, read_concurrency=3)
+    assert [item["id"] for item in responses] == [item.id for item in items]
+    assert peak == 3
@@ -1,12 +1,14 @@
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, patch, AsyncMock
 
 import pytest
 
 from src.servises.auth import auth_service
+from src.servises.idempotency import idempotency_store
+from benchmarks.fakes import FakeAsyncRedis
 
 
 def test_get_contacts(client, get_token):
-    with patch.object(auth_service, "cache") as redis_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         token = get_token
         headers = {"Authorization": f"Bearer {token}"}
@@ -17,7 +19,7 @@ def test_get_contacts(client, get_token):
 
 
 def test_create_contact(client, get_token, monkeypatch):
-    with patch.object(auth_service, "cache") as redis_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         token = get_token
         headers = {"Authorization": f"Bearer {token}"}
@@ -32,3 +34,104 @@ def test_create_contact(client, get_token, monkeypatch):
         assert data["first_name"] == "user"
         assert data["last_name"] == "test"
         assert data["email"] == "test@gmail.com"
+
+
+def test_get_contacts_not_modified(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("api/contacts", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["ETag"]
+
+        headers["If-None-Match"] = etag
+        response = client.get("api/contacts", headers=headers)
+        assert response.status_code == 304, response.text
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        headers["If-None-Match"] = '"stale"'
+        response = client.get("api/contacts", headers=headers)
+        assert response.status_code == 200, response.text
+
+
+def test_create_contact_idempotent(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        monkeypatch.setattr(idempotency_store, "redis", FakeAsyncRedis())
+        headers = {"Authorization": f"Bearer {get_token}", "Idempotency-Key": "create-1"}
+        body = {
+            "first_name": "retry",
+            "last_name": "contact",
+            "email": "retry@example.com",
+            "phone_number": "380000000000",
+            "birthday": "1990-01-01",
+        }
+        first = client.post("api/contacts", headers=headers, json=body)
+        assert first.status_code == 201, first.text
+        assert "Idempotent-Replayed" not in first.headers
+
+        retry = client.post("api/contacts", headers=headers, json=body)
+        assert retry.status_code == 201, retry.text
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+
+        body["first_name"] = "other"
+        response = client.post("api/contacts", headers=headers, json=body)
+        assert response.status_code == 422, response.text
+
+        response = client.get("api/contacts", headers={"Authorization": f"Bearer {get_token}"})
+        assert [c["email"] for c in response.json()].count("retry@example.com") == 1
+
+
+def test_batch_get_contacts(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        headers = {"Authorization": f"Bearer {get_token}"}
+        ids = [c["id"] for c in client.get("api/contacts", headers=headers).json()]
+        assert ids
+
+        requested = list(reversed(ids)) + [999999, ids[0]]
+        response = client.post("api/contacts/batch-get", headers=headers, json={"ids": requested})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [c["id"] for c in data["contacts"]] == list(reversed(ids))
+        assert data["not_found"] == [999999]
+
+        headers["If-None-Match"] = response.headers["ETag"]
+        response = client.post("api/contacts/batch-get", headers=headers, json={"ids": requested})
+        assert response.status_code == 304, response.text
+
+        response = client.post("api/contacts/batch-get", headers=headers, json={"ids": []})
+        assert response.status_code == 422, response.text
+
+
+def test_get_contact_stats(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        headers = {"Authorization": f"Bearer {get_token}"}
+        total = len(client.get("api/contacts", headers=headers).json())
+        response = client.get("api/contacts/stats", headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["total"] == total
+        assert sum(data["birthdays_by_month"].values()) == total
+
+        user_id = client.get("api/users/me", headers=headers).json()["id"]
+        response = client.get(f"api/contacts/stats/{user_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == data
+        assert client.get("api/contacts/stats/999999", headers=headers).status_code == 404
@@ -1,12 +1,14 @@
 from unittest.mock import Mock, patch, AsyncMock
+from pathlib import Path
 
 import pytest
+from PIL import Image
 
 from src.servises.auth import auth_service
 
 
 def test_get_me(client, get_token, monkeypatch):
-    with patch.object(auth_service, "cache") as redis_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -15,3 +17,77 @@ def test_get_me(client, get_token, monkeypatch):
         headers = {"Authorization": f"Bearer {token}"}
         response = client.get("api/users/me", headers=headers)
         assert response.status_code == 200, response.text
+        # a user who never uploaded an avatar
+        assert response.json()["avatar"] is None
+
+
+@pytest.fixture()
+def local_storage(tmp_path):
+    from main import app
+    from src.servises.avatar import LocalStorage, get_avatar_storage
+
+    storage = LocalStorage(tmp_path, "/static/avatars")
+    app.dependency_overrides[get_avatar_storage] = lambda: storage
+    yield storage
+    del app.dependency_overrides[get_avatar_storage]
+
+
+def test_update_avatar(client, get_token, monkeypatch, local_storage):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        save = AsyncMock(wraps=local_storage.save)
+        monkeypatch.setattr(local_storage, "save", save)
+        headers = {"Authorization": f"Bearer {get_token}"}
+        image = Path("src/static/1x1.png").read_bytes()
+
+        response = client.patch(
+            "api/users/avatar", headers=headers, files={"file": ("a.png", image, "image/png")}
+        )
+        assert response.status_code == 200, response.text
+        avatar = response.json()["avatar"]
+        assert avatar.startswith("/static/avatars/")
+        stored = local_storage.directory / avatar.rsplit("/", 1)[1]
+        with Image.open(stored) as thumbnail:
+            assert thumbnail.format == "PNG"
+            assert thumbnail.size == (100, 150)
+
+        response = client.patch(
+            "api/users/avatar", headers=headers, files={"file": ("b.png", image, "image/png")}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["avatar"] == avatar
+        save.assert_awaited_once()
+
+
+def test_update_avatar_too_large(client, get_token, monkeypatch, local_storage):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        monkeypatch.setattr("src.servises.avatar.config.AVATAR_MAX_BYTES", 10)
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.patch(
+            "api/users/avatar", headers=headers, files={"file": ("a.png", b"x" * 100, "image/png")}
+        )
+        assert response.status_code == 413, response.text
+
+
+def test_update_avatar_of_deleted_user(client, get_token, monkeypatch, local_storage):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+        monkeypatch.setattr(
+            "src.routes.users.repositories_user.update_avatar_url", AsyncMock(return_value=None)
+        )
+        headers = {"Authorization": f"Bearer {get_token}"}
+        image = Path("src/static/1x1.png").read_bytes()
+        response = client.patch(
+            "api/users/avatar", headers=headers, files={"file": ("a.png", image, "image/png")}
+        )
+        assert response.status_code == 404, response.text
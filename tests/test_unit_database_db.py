@@ -0,0 +1,22 @@
+import logging
+
+import pytest
+from fastapi import HTTPException
+
+from src.database.db import DataBaseSessionManager
+
+
+@pytest.mark.asyncio
+async def test_session_logs_failures_but_not_http_errors(caplog):
+    manager = DataBaseSessionManager("sqlite+aiosqlite:///:memory:")
+    caplog.set_level(logging.WARNING, logger="src.database.db")
+
+    with pytest.raises(HTTPException):
+        async with manager.session():
+            raise HTTPException(status_code=404)
+    assert caplog.records == []
+
+    with pytest.raises(ValueError):
+        async with manager.session():
+            raise ValueError("broken")
+    assert [record.getMessage() for record in caplog.records] == ["session rolled back"]
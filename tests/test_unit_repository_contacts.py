@@ -2,17 +2,22 @@ import datetime
 import unittest
 from unittest.mock import MagicMock, AsyncMock, Mock
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.models import Contact, User
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from src.database.models import Base, Contact, User
 from src.schemas.contact import ContactCreateSchema, ContactUpdateSchema
 from src.repository.contacts import (
     get_contact,
     get_contacts,
     get_all_contacts,
+    get_contacts_by_ids,
     create_contact,
     delete_contact,
     update_contact,
+    get_contact_counters,
+    reconcile_contact_counters,
 )
+from src.servises.contact_stats import contact_stats
 
 
 class TestAsyncTodo(unittest.IsolatedAsyncioTestCase):
@@ -60,6 +65,18 @@ class TestAsyncTodo(unittest.IsolatedAsyncioTestCase):
         result = await get_all_contacts(limit, offset, self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_by_ids(self):
+        contacts = [
+            Contact(id=2, first_name="test_title_2", email="test2@com.ua", user=self.user),
+            Contact(id=1, first_name="test_title_1", email="test@com.ua", user=self.user),
+        ]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result = await get_contacts_by_ids([1, 2], self.session, self.user)
+        self.assertEqual(result, contacts)
+        self.session.execute.assert_awaited_once()
+
     async def test_get_contacts(self):
         limit = 10
         offset = 0
@@ -147,3 +164,74 @@ class TestAsyncTodo(unittest.IsolatedAsyncioTestCase):
         self.session.commit.assert_called_once()
 
         self.assertIsInstance(result, Contact)
+
+
+class TestContactCounters(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(
+            bind=self.engine, autoflush=False, expire_on_commit=False
+        )
+        async with self.session_maker() as session:
+            self.user = User(username="counter_user", email="counter@example.com", password="qwerty")
+            session.add(self.user)
+            await session.commit()
+            await session.refresh(self.user)
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+    def body(self, birthday: datetime.date) -> ContactCreateSchema:
+        return ContactCreateSchema(
+            first_name="counted",
+            last_name="contact",
+            email="counted@example.com",
+            phone_number="0661122333",
+            birthday=birthday,
+        )
+
+    async def counters(self) -> dict:
+        async with self.session_maker() as session:
+            return await get_contact_counters(session, self.user)
+
+    async def test_counters_follow_writes(self):
+        async with self.session_maker() as session:
+            first = await create_contact(self.body(datetime.date(1990, 5, 1)), session, self.user)
+            await create_contact(self.body(datetime.date(1991, 5, 2)), session, self.user)
+            await create_contact(self.body(datetime.date(1992, 7, 3)), session, self.user)
+        self.assertEqual(await self.counters(), {"total": 3, "birthday:05": 2, "birthday:07": 1})
+
+        async with self.session_maker() as session:
+            body = ContactUpdateSchema(**self.body(datetime.date(1990, 7, 1)).model_dump())
+            await update_contact(first.id, body, session, self.user)
+        self.assertEqual(await self.counters(), {"total": 3, "birthday:05": 1, "birthday:07": 2})
+
+        async with self.session_maker() as session:
+            await delete_contact(first.id, session, self.user)
+        counters = await self.counters()
+        self.assertEqual(counters, {"total": 2, "birthday:05": 1, "birthday:07": 1})
+
+        stats = contact_stats(counters, today=datetime.date(2026, 7, 15))
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["birthdays_this_month"], 1)
+        self.assertEqual(stats["birthdays_by_month"][1], 0)
+
+    async def test_reconcile_fixes_drift(self):
+        async with self.session_maker() as session:
+            contact = await create_contact(self.body(datetime.date(1990, 5, 1)), session, self.user)
+            await create_contact(self.body(datetime.date(1990, 6, 1)), session, self.user)
+            # a change made outside the repository leaves the counters behind
+            await session.execute(
+                update(Contact).filter_by(id=contact.id).values(birthday=datetime.date(1990, 6, 2))
+            )
+            await session.commit()
+            self.assertEqual(await reconcile_contact_counters(session), 2)
+        self.assertEqual(await self.counters(), {"total": 2, "birthday:06": 2})
+
+        # counters that are right already are not rewritten
+        async with self.session_maker() as session:
+            self.assertEqual(await reconcile_contact_counters(session), 0)
+        self.assertEqual(await self.counters(), {"total": 2, "birthday:06": 2})
@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base
+from src.schemas.user import UserSchema
+from src.repository.users import (
+    confirmed_email,
+    create_user,
+    get_user_by_email,
+    update_avatar_url,
+)
+
+
+class TestAsyncUsers(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(bind=self.engine, autoflush=False)
+        self.body = UserSchema(username="repo_user", email="repo@example.com", password="12345678")
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+    async def test_create_user(self):
+        async with self.session_maker() as session:
+            user = await create_user(self.body, session)
+        self.assertEqual(user.email, self.body.email)
+        self.assertIsNotNone(user.id)
+        self.assertFalse(user.confirmed)
+
+    async def test_create_user_conflict(self):
+        async def signup():
+            async with self.session_maker() as session:
+                return await create_user(self.body, session)
+
+        results = await asyncio.gather(*(signup() for _ in range(3)))
+        self.assertEqual(sum(user is not None for user in results), 1)
+
+    async def test_confirmed_email(self):
+        async with self.session_maker() as session:
+            await create_user(self.body, session)
+            self.assertTrue(await confirmed_email(self.body.email, session))
+            self.assertFalse(await confirmed_email(self.body.email, session))
+            self.assertFalse(await confirmed_email("nobody@example.com", session))
+            user = await get_user_by_email(self.body.email, session)
+        self.assertTrue(user.confirmed)
+
+    async def test_update_avatar_url(self):
+        async with self.session_maker() as session:
+            await create_user(self.body, session)
+            user = await update_avatar_url(self.body.email, "http://avatar", session)
+            self.assertIsNone(await update_avatar_url("nobody@example.com", "x", session))
+        self.assertEqual(user.avatar, "http://avatar")
+        self.assertEqual(user.email, self.body.email)
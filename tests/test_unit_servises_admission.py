@@ -0,0 +1,149 @@
+import asyncio
+import random
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from src.servises.admission import PRIORITY_SHARES, AdaptiveLimit, AdmissionMiddleware
+
+
+def test_limit_grows_while_latency_is_stable():
+    limit = AdaptiveLimit(initial=4, min_limit=1, max_limit=10)
+    for _ in range(200):
+        for _ in range(4):
+            assert limit.try_acquire()
+        for _ in range(4):
+            limit.release(0.01)
+    assert limit.limit > 4
+    assert limit.in_flight == 0
+
+
+def test_limit_backs_off_when_latency_rises():
+    limit = AdaptiveLimit(initial=20, min_limit=2, max_limit=100, tolerance=2.0, backoff=0.5)
+    limit.try_acquire()
+    limit.release(0.001)
+    for _ in range(50):
+        limit.try_acquire()
+        limit.release(0.05)
+    assert limit.limit < 20
+    assert limit.limit >= 2
+
+
+def test_limit_never_drops_below_minimum():
+    limit = AdaptiveLimit(initial=4, min_limit=3, max_limit=10, backoff=0.1)
+    limit.try_acquire()
+    limit.release(0.0001)
+    for _ in range(20):
+        limit._last_decrease = 0.0
+        limit.try_acquire()
+        limit.release(1.0)
+    assert limit.limit == 3
+
+
+def test_slow_routes_do_not_look_like_congestion():
+    # 5% bcrypt-bound logins next to 95% fast reads, with a handful in flight
+    rng = random.Random(0)
+    limit = AdaptiveLimit(initial=64, min_limit=8, max_limit=512)
+    running = []
+    for i in range(5000):
+        assert limit.try_acquire(PRIORITY_SHARES["normal"])
+        if i % 20 == 0:
+            running.append((rng.uniform(0.25, 0.35), "/api/auth/login"))
+        else:
+            running.append((rng.uniform(0.004, 0.006), "/api/contacts/{contact_id}"))
+        if len(running) > 6:
+            limit.release(*running.pop(0))
+    assert limit.limit >= 64
+    assert limit.shed == 0
+
+
+def test_limit_recovers_without_load():
+    limit = AdaptiveLimit(initial=16, min_limit=2, max_limit=100)
+    limit.limit = 2.0
+    for _ in range(1000):
+        limit.try_acquire()
+        limit.release(0.01)
+    # back to the initial limit, but not past it while a single request is in flight
+    assert limit.limit == 16
+
+
+def test_fast_rejections_do_not_look_like_congestion():
+    limit = AdaptiveLimit(initial=16, min_limit=2, max_limit=100)
+    for i in range(2000):
+        limit.try_acquire()
+        if i % 2:
+            # a burst of 401s answered before any real work
+            limit.release(0.0002, "/api/contacts/", success=False)
+        else:
+            limit.release(0.01, "/api/contacts/")
+    assert limit.limit >= 16
+    assert limit.baselines["/api/contacts/"] == 0.01
+
+
+def test_low_priority_sheds_first():
+    limit = AdaptiveLimit(initial=4, min_limit=1, max_limit=10)
+    assert limit.try_acquire(0.5)
+    assert limit.try_acquire(0.5)
+    assert not limit.try_acquire(0.5)
+    assert limit.try_acquire(1.0)
+    assert limit.try_acquire(1.0)
+    assert not limit.try_acquire(1.0)
+    assert limit.shed == 2
+
+
+def make_app(limiter: AdaptiveLimit) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=limiter,
+        priorities=[(r"^/health$", None), (r"^/me$", "high"), (r"^/all$", "low")],
+    )
+
+    @app.get("/{name}")
+    async def route(name: str):
+        await asyncio.sleep(0)
+        if name == "denied":
+            raise HTTPException(status_code=401)
+        return {"name": name}
+
+    return app
+
+
+def test_middleware_rejects_over_limit_with_retry_after():
+    limiter = AdaptiveLimit(initial=4, min_limit=1, max_limit=10)
+    client = TestClient(make_app(limiter))
+    limiter.in_flight = 2  # requests already running elsewhere
+
+    response = client.get("/all")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    assert client.get("/me").status_code == 200
+    assert client.get("/other").status_code == 200
+    assert limiter.in_flight == 2
+
+
+def test_middleware_never_sheds_bypassed_routes():
+    limiter = AdaptiveLimit(initial=1, min_limit=1, max_limit=1)
+    client = TestClient(make_app(limiter))
+    limiter.in_flight = 10
+
+    assert client.get("/health").status_code == 200
+    assert client.get("/me").status_code == 503
+
+
+def test_middleware_keeps_a_baseline_per_route():
+    limiter = AdaptiveLimit(initial=4, min_limit=1, max_limit=10)
+    client = TestClient(make_app(limiter))
+    client.get("/me")
+    client.get("/other")
+    assert set(limiter.baselines) == {"/{name}"}
+
+
+def test_middleware_keeps_rejections_out_of_the_baseline():
+    limiter = AdaptiveLimit(initial=4, min_limit=1, max_limit=10)
+    client = TestClient(make_app(limiter))
+    assert client.get("/denied").status_code == 401
+    assert limiter.baselines == {}
+    client.get("/other")
+    assert set(limiter.baselines) == {"/{name}"}
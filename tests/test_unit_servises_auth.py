@@ -0,0 +1,341 @@
+import asyncio
+import contextlib
+import pickle
+import time
+from unittest.mock import PropertyMock, patch
+
+import pytest
+
+from src.database.models import User
+from src.servises.auth import auth_service
+from src.servises.cache_events import FLUSH_ALL, InvalidationBus, user_cache_events
+from src.servises.circuit_breaker import redis_breaker
+from src.servises.deadline import Deadline, _current, remaining
+from src.servises.singleflight import SingleFlight
+from benchmarks.fakes import FakeAsyncRedis, FaultyRedis
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(10)))
+        assert not flight.in_flight("key")
+        return results
+
+    assert asyncio.run(main()) == [1] * 10
+    assert calls == 1
+
+
+def test_get_cached_user_coalesces_misses():
+    user = User(id=1, username="flight", email="flight@example.com", password="x", confirmed=True)
+    lookups = 0
+
+    async def get_user_by_email(email, db):
+        nonlocal lookups
+        lookups += 1
+        await asyncio.sleep(0.01)
+        return user
+
+    async def main():
+        return await asyncio.gather(
+            *(auth_service.get_cached_user(user.email) for _ in range(20))
+        )
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()) as cache, patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        users = asyncio.run(main())
+        assert lookups == 1
+        assert {u.email for u in users} == {user.email}
+        # every caller gets its own copy
+        assert len({id(u) for u in users}) == len(users)
+        assert 0 < cache.sync.pttl(user.email) <= auth_service.CACHE_TTL * 1000
+
+        # a fresh entry is served from the cache
+        asyncio.run(auth_service.get_cached_user(user.email))
+        assert lookups == 1
+
+        # an entry about to expire is refreshed early
+        auth_service._local_cache.clear()
+        payload, _, delta = pickle.loads(cache.sync.get(user.email))
+        cache.sync.set(user.email, pickle.dumps((payload, time.time(), delta)))
+        asyncio.run(auth_service.get_cached_user(user.email))
+        assert lookups == 2
+
+
+def test_shared_user_load_survives_the_first_caller():
+    user = User(id=1, username="shared", email="shared@example.com", password="x", confirmed=True)
+    sessions = []
+    deadlines = []
+
+    @contextlib.asynccontextmanager
+    async def session_factory():
+        session = {"closed": False}
+        sessions.append(session)
+        yield session
+        session["closed"] = True
+
+    async def get_user_by_email(email, db):
+        deadlines.append(remaining())
+        await asyncio.sleep(0.05)
+        assert not db["closed"]
+        return user
+
+    async def first_caller():
+        _current.set(Deadline(time.monotonic(), 10))
+        return await auth_service.get_cached_user(user.email)
+
+    async def main():
+        first = asyncio.create_task(first_caller())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(auth_service.get_cached_user(user.email))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()), patch.object(
+        auth_service, "session_factory", session_factory
+    ), patch("src.repository.users.get_user_by_email", get_user_by_email):
+        auth_service._local_cache.clear()
+        assert asyncio.run(main()).email == user.email
+    # one load on its own session, not bound to the first caller's deadline
+    assert len(sessions) == 1 and sessions[0]["closed"]
+    assert deadlines == [None]
+
+
+def test_get_current_user_from_redis_is_a_user():
+    user = User(id=1, username="cached", email="cached@example.com", password="x", confirmed=True)
+
+    async def get_user_by_email(email, db):
+        raise AssertionError("served from Redis, the database must not be queried")
+
+    async def main():
+        token = await auth_service.create_access_token({"sub": user.email})
+        return await auth_service.get_current_user(token)
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()) as cache, patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        auth_service._local_cache.clear()
+        entry = (pickle.dumps(user), time.time() + auth_service.CACHE_TTL, 0.0)
+        cache.sync.set(user.email, pickle.dumps(entry))
+        cached = asyncio.run(main())
+        assert isinstance(cached, User)
+        assert cached.email == user.email
+
+
+def test_get_cached_user_unknown_email():
+    async def get_user_by_email(email, db):
+        return None
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()), patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        assert asyncio.run(auth_service.get_cached_user("nobody@example.com")) is None
+
+
+def test_user_write_invalidates_cached_user():
+    user = User(id=1, username="stale", email="stale@example.com", password="x", confirmed=False)
+
+    async def get_user_by_email(email, db):
+        return user
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()) as cache, patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        cached = asyncio.run(auth_service.get_cached_user(user.email))
+        assert cached.confirmed is False
+        assert user.email in auth_service._local_cache and cache.sync.get(user.email)
+
+        user.confirmed = True
+        asyncio.run(user_cache_events.publish(user.email))
+        assert user.email not in auth_service._local_cache
+        assert cache.sync.get(user.email) is None
+        assert asyncio.run(auth_service.get_cached_user(user.email)).confirmed is True
+
+
+def test_invalidating_another_user_keeps_a_load_cacheable():
+    users = {
+        email: User(id=i, username=email.split("@")[0], email=email, password="x", confirmed=True)
+        for i, email in enumerate(["loading@example.com", "other@example.com"])
+    }
+
+    async def get_user_by_email(email, db):
+        await asyncio.sleep(0.02)
+        return users[email]
+
+    async def load_while_invalidating(email):
+        load = asyncio.create_task(auth_service.get_cached_user("loading@example.com"))
+        await asyncio.sleep(0.01)
+        await user_cache_events.publish(email)
+        await load
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()), patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        auth_service._local_cache.clear()
+        asyncio.run(load_while_invalidating("other@example.com"))
+        assert "loading@example.com" in auth_service._local_cache
+
+        auth_service._local_cache.clear()
+        asyncio.run(load_while_invalidating("loading@example.com"))
+        assert "loading@example.com" not in auth_service._local_cache
+
+
+def test_local_tier_is_short_lived_while_invalidations_may_be_missed(monkeypatch):
+    user = User(id=1, username="degraded", email="missed@example.com", password="x", confirmed=True)
+    lookups = 0
+
+    async def get_user_by_email(email, db):
+        nonlocal lookups
+        lookups += 1
+        return user
+
+    monkeypatch.setattr(auth_service, "LOCAL_CACHE_DEGRADED_TTL", 0)
+    with patch.object(auth_service, "cache", FakeAsyncRedis()) as cache, patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ), patch.object(type(user_cache_events), "healthy", new_callable=PropertyMock) as healthy:
+        auth_service._local_cache.clear()
+        healthy.return_value = True
+        asyncio.run(auth_service.get_cached_user(user.email))
+        cache.sync.delete(user.email)
+        asyncio.run(auth_service.get_cached_user(user.email))
+        assert lookups == 1
+
+        healthy.return_value = False
+        asyncio.run(auth_service.get_cached_user(user.email))
+        assert lookups == 2
+
+
+def test_invalidation_bus_health():
+    async def main():
+        bus = InvalidationBus("health-channel", reconnect_delay=0)
+        assert bus.healthy  # local delivery only
+        bus.start(FakeAsyncRedis())
+        assert not bus.healthy  # not subscribed yet
+        await asyncio.sleep(0.01)
+        assert bus.healthy
+        await bus.stop()
+        assert bus.healthy
+
+    asyncio.run(main())
+
+
+def test_invalidation_bus_reaches_every_worker():
+    async def main():
+        redis = FakeAsyncRedis()
+        workers = [InvalidationBus("test-channel", reconnect_delay=0) for _ in range(3)]
+        received = [[] for _ in workers]
+        for bus, inbox in zip(workers, received):
+            bus.subscribe(inbox.append)
+            bus.start(redis)
+        await asyncio.sleep(0.01)
+
+        await workers[0].publish("someone@example.com")
+        await asyncio.sleep(0.01)
+        for bus in workers:
+            await bus.stop()
+        return received
+
+    for inbox in asyncio.run(main()):
+        assert inbox == [FLUSH_ALL, "someone@example.com"]
+
+
+@pytest.fixture()
+def restore_pwd_context():
+    original = auth_service.pwd_context
+    yield
+    auth_service.pwd_context = original
+
+
+def test_calibrate_bcrypt_respects_floor_and_ceiling(restore_pwd_context):
+    assert auth_service.calibrate_bcrypt(budget_ms=0, min_rounds=4, max_rounds=6) == 4
+    assert auth_service.calibrate_bcrypt(budget_ms=10 ** 6, min_rounds=4, max_rounds=6) == 6
+    assert auth_service.get_password_hash("secret").startswith("$2b$06$")
+
+
+def test_verify_and_update_password_only_rehashes_upward(restore_pwd_context):
+    auth_service.configure_bcrypt(4)
+    old_hash = auth_service.get_password_hash("secret")
+    auth_service.configure_bcrypt(5)
+    valid, new_hash = auth_service.verify_and_update_password("secret", old_hash)
+    assert valid and new_hash.startswith("$2b$05$")
+    assert auth_service.verify_and_update_password("secret", new_hash) == (True, None)
+    assert auth_service.verify_and_update_password("wrong", old_hash) == (False, None)
+    # a worker with a lower cost leaves stronger hashes alone
+    auth_service.configure_bcrypt(4)
+    assert auth_service.verify_and_update_password("secret", new_hash) == (True, None)
+
+
+def test_bcrypt_cost_is_calibrated_once_and_shared(restore_pwd_context, monkeypatch):
+    calibrations = []
+
+    def calibrate_bcrypt():
+        calibrations.append(1)
+        auth_service.configure_bcrypt(5)
+        return 5
+
+    async def main():
+        redis = FakeAsyncRedis()
+        first = await auth_service.configure_shared_bcrypt(redis, key="rounds", ttl=60)
+        await redis.set("rounds", 6)
+        second = await auth_service.configure_shared_bcrypt(redis, key="rounds", ttl=60)
+        return first, second
+
+    monkeypatch.setattr(auth_service, "calibrate_bcrypt", calibrate_bcrypt)
+    assert asyncio.run(main()) == (5, 6)
+    assert len(calibrations) == 1
+    assert auth_service.get_password_hash("secret").startswith("$2b$06$")
+
+
+def test_slow_cache_does_not_block_the_event_loop(monkeypatch):
+    user = User(id=1, username="slow", email="slow@example.com", password="x", confirmed=True)
+
+    async def get_user_by_email(email, db):
+        return user
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        await auth_service.get_cached_user(user.email)
+        task.cancel()
+        return ticks
+
+    monkeypatch.setattr(redis_breaker, "timeout", 0.1)
+    with patch.object(auth_service, "cache", FaultyRedis(FakeAsyncRedis(), delay=1.0)), patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        auth_service._local_cache.clear()
+        assert asyncio.run(main()) > 5
+
+
+def test_only_the_publisher_deletes_from_redis():
+    user = User(id=1, username="listener", email="listener@example.com", password="x", confirmed=True)
+
+    async def get_user_by_email(email, db):
+        return user
+
+    with patch.object(auth_service, "cache", FakeAsyncRedis()) as cache, patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        auth_service._local_cache.clear()
+        asyncio.run(auth_service.get_cached_user(user.email))
+        # an event from another worker: that worker already deleted the Redis entry
+        user_cache_events._deliver(user.email)
+        assert user.email not in auth_service._local_cache
+        assert cache.sync.get(user.email) is not None
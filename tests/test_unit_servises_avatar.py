@@ -0,0 +1,33 @@
+import asyncio
+from unittest.mock import patch
+
+from src.servises.avatar import CloudinaryStorage
+
+
+def test_cloudinary_storage_does_not_look_up_unknown_keys():
+    storage = CloudinaryStorage(folder="test", max_known=2)
+
+    async def scenario():
+        assert not await storage.exists("a.png")
+        with patch("src.servises.avatar.cloudinary.uploader.upload") as upload:
+            await storage.save("a.png", b"data")
+        assert await storage.exists("a.png")
+        return upload
+
+    upload = asyncio.run(scenario())
+    kwargs = upload.call_args.kwargs
+    assert kwargs["public_id"] == "test/a"
+    assert kwargs["overwrite"] is False
+    assert kwargs["unique_filename"] is False
+
+
+def test_cloudinary_storage_forgets_the_oldest_keys():
+    storage = CloudinaryStorage(folder="test", max_known=2)
+
+    async def scenario():
+        with patch("src.servises.avatar.cloudinary.uploader.upload"):
+            for key in ("a.png", "b.png", "c.png"):
+                await storage.save(key, b"data")
+        return [await storage.exists(key) for key in ("a.png", "b.png", "c.png")]
+
+    assert asyncio.run(scenario()) == [False, True, True]
@@ -0,0 +1,85 @@
+import asyncio
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from src.servises.body_limit import BodySizeLimitMiddleware
+
+calls = []
+
+
+def make_app(max_bytes: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, limits=[(r"^/upload$", max_bytes)], detail="Too large")
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File()):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File()):
+        return {"size": len(await file.read())}
+
+    return app
+
+
+def test_small_body_passes():
+    client = TestClient(make_app(1024))
+    response = client.post("/upload", files={"file": ("a.bin", b"x" * 100)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_content_length_over_the_limit_is_rejected_up_front():
+    calls.clear()
+    client = TestClient(make_app(1024))
+    response = client.post("/upload", files={"file": ("a.bin", b"x" * 4096)})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Too large"}
+    assert calls == []
+
+
+def test_other_paths_are_not_limited():
+    client = TestClient(make_app(1024))
+    response = client.post("/other", files={"file": ("a.bin", b"x" * 4096)})
+    assert response.status_code == 200
+
+
+def test_body_without_content_length_stops_at_the_limit():
+    calls.clear()
+    app = make_app(1024)
+    boundary = b"limit"
+    head = b'--limit\r\nContent-Disposition: form-data; name="file"; filename="a.bin"\r\n\r\n'
+    chunks = [head] + [b"x" * 512] * 100 + [b"\r\n--limit--\r\n"]
+    consumed = 0
+    sent = []
+
+    async def receive():
+        nonlocal consumed
+        consumed += 1
+        return {"type": "http.request", "body": chunks[consumed - 1], "more_body": consumed < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/upload",
+        "raw_path": b"/upload",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + boundary)],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]["status"] == 413
+    assert calls == []
+    # the rest of the upload is never read
+    assert consumed < 10
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from src.servises.change_feed import RESET_EVENT, ChangeFeed, EventStreamResponse, RedisBroker
+from benchmarks.fakes import FakeAsyncRedis
+
+
+async def take(stream, count: int) -> list[str]:
+    return [await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)]
+
+
+def event_of(frame: str) -> dict:
+    return json.loads(frame.split("data: ", 1)[1])
+
+
+@pytest.mark.asyncio
+async def test_stream_receives_own_events_only():
+    feed = ChangeFeed(heartbeat=5)
+    stream = feed.stream(feed.open(1))
+    assert (await take(stream, 1))[0].startswith("retry:")
+
+    await feed.publish(2, "created", 20, {"id": 20})
+    await feed.publish(1, "created", 10, {"id": 10})
+    await feed.publish(1, "deleted", 10)
+    created, deleted = await take(stream, 2)
+    assert "event: created" in created
+    assert event_of(created)["contact"] == {"id": 10}
+    assert event_of(deleted)["contact_id"] == 10
+    await stream.aclose()
+    assert feed._subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_resume_from_last_event_id():
+    feed = ChangeFeed(heartbeat=5, history=3)
+    for contact_id in range(5):
+        await feed.publish(1, "updated", contact_id)
+    ids = [event["id"] for event in feed._history[1]]
+
+    stream = feed.stream(feed.open(1, ids[0]))
+    frames = await take(stream, 3)
+    assert [event_of(frame)["contact_id"] for frame in frames[1:]] == [3, 4]
+    await stream.aclose()
+
+    # an id that fell out of the history asks the client to resync
+    stream = feed.stream(feed.open(1, "forgotten"))
+    assert (await take(stream, 2))[1] == RESET_EVENT
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_while_idle():
+    feed = ChangeFeed(heartbeat=0.01)
+    stream = feed.stream(feed.open(1))
+    assert (await take(stream, 2))[1] == ": ping\n\n"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_reset_and_closed():
+    feed = ChangeFeed(heartbeat=5, queue_size=2)
+    stream = feed.stream(feed.open(1))
+    await take(stream, 1)
+    for contact_id in range(5):
+        await feed.publish(1, "updated", contact_id)
+    assert (await take(stream, 1))[0] == RESET_EVENT
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert feed._subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_limit_per_user():
+    feed = ChangeFeed(heartbeat=5, max_streams_per_user=2)
+    # streams are reserved when opened, before any of them started
+    first, second = feed.open(1), feed.open(1)
+    with pytest.raises(HTTPException) as error:
+        feed.open(1)
+    assert error.value.status_code == 429
+    feed.release(feed.open(2))
+
+    stream = feed.stream(first)
+    await take(stream, 1)
+    await stream.aclose()
+    feed.release(second)
+    feed.release(second)
+    assert feed._subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_response_releases_a_stream_that_never_started():
+    feed = ChangeFeed(heartbeat=5, max_streams_per_user=1)
+    response = EventStreamResponse(feed, feed.open(1))
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client is gone")
+
+    with pytest.raises(Exception):  # raised through the response's task group
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert feed._subscribers == {}
+    feed.open(1)
+
+
+@pytest.mark.asyncio
+async def test_redis_broker_delivers_to_every_feed():
+    redis = FakeAsyncRedis()
+    first, second = ChangeFeed(heartbeat=5), ChangeFeed(heartbeat=5)
+    await first.start(RedisBroker(redis, channel="events"))
+    await second.start(RedisBroker(redis, channel="events"))
+    stream = second.stream(second.open(1))
+    await take(stream, 1)
+    await asyncio.sleep(0.01)  # let both brokers subscribe
+
+    await first.publish(1, "created", 10)
+    assert event_of((await take(stream, 1))[0])["contact_id"] == 10
+    assert len(first._history[1]) == 1
+
+    await stream.aclose()
+    await first.stop()
+    await second.stop()
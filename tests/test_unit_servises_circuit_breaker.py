@@ -0,0 +1,93 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+import redis
+from fastapi_limiter import FastAPILimiter
+
+from src.database.models import User
+from src.servises.auth import auth_service
+from src.servises.circuit_breaker import CircuitBreaker, CircuitOpenError, redis_breaker
+from src.servises.rate_limit import LocalTokenBuckets, RateLimiter
+from benchmarks.fakes import FakeAsyncRedis, FakeRedis, FaultyRedis
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, timeout=1)
+    client = FaultyRedis(FakeRedis(), down=True)
+    for _ in range(2):
+        with pytest.raises(redis.ConnectionError):
+            breaker.call(client.get, "key")
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.call(client.get, "key")
+    assert client.calls == 2
+
+    time.sleep(0.06)
+    client.down = False
+    assert breaker.call(client.get, "key") is None
+    assert not breaker.is_open
+
+
+def test_circuit_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, timeout=1)
+    client = FaultyRedis(FakeRedis(), down=True)
+    with pytest.raises(redis.ConnectionError):
+        breaker.call(client.get, "key")
+    time.sleep(0.06)
+    with pytest.raises(redis.ConnectionError):
+        breaker.call(client.get, "key")
+    with pytest.raises(CircuitOpenError):
+        breaker.call(client.get, "key")
+
+
+def test_local_token_buckets():
+    buckets = LocalTokenBuckets()
+    assert buckets.take("key", 2, 1000) == 0
+    assert buckets.take("key", 2, 1000) == 0
+    assert 0 < buckets.take("key", 2, 1000) <= 500
+    assert buckets.take("other", 2, 1000) == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_degrades_to_local_buckets(monkeypatch):
+    client = FaultyRedis(FakeAsyncRedis(), delay=1.0)
+    monkeypatch.setattr(FastAPILimiter, "redis", client)
+    monkeypatch.setattr(FastAPILimiter, "lua_sha", "fake-limiter-sha")
+    monkeypatch.setattr(redis_breaker, "timeout", 0.05)
+    monkeypatch.setattr(redis_breaker, "failure_threshold", 2)
+    limiter = RateLimiter(times=2, seconds=10)
+
+    started = time.perf_counter()
+    results = [await limiter._check("degraded-key") for _ in range(5)]
+    elapsed = time.perf_counter() - started
+
+    # two slow calls trip the breaker, after that Redis is not touched at all
+    assert client.calls == 2
+    assert redis_breaker.is_open
+    assert elapsed < 0.5
+    assert results[:2] == [0, 0]
+    assert all(pexpire > 0 for pexpire in results[2:])
+
+
+def test_auth_degrades_to_local_cache(monkeypatch):
+    user = User(id=1, username="degraded", email="degraded@example.com", password="x", confirmed=True)
+    lookups = 0
+
+    async def get_user_by_email(email, db):
+        nonlocal lookups
+        lookups += 1
+        return user
+
+    monkeypatch.setattr(redis_breaker, "failure_threshold", 1)
+    cache = FaultyRedis(FakeAsyncRedis(), down=True)
+    with patch.object(auth_service, "cache", cache), patch(
+        "src.repository.users.get_user_by_email", get_user_by_email
+    ):
+        auth_service._local_cache.clear()
+        for _ in range(3):
+            assert asyncio.run(auth_service.get_cached_user(user.email)).email == user.email
+    assert lookups == 1
+    assert cache.calls == 1
+    assert redis_breaker.is_open
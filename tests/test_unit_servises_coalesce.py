@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from src.servises.coalesce import ReadCoalescer
+
+
+class FakeSession:
+    closed = False
+
+
+@contextlib.asynccontextmanager
+async def fake_sessions():
+    session = FakeSession()
+    try:
+        yield session
+    finally:
+        session.closed = True
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_load():
+    coalescer = ReadCoalescer(window=0, session_factory=fake_sessions)
+    calls = 0
+
+    async def load(db) -> bytes:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"[]"
+
+    bodies = await asyncio.gather(*(coalescer.run(("/all", (), 1), load) for _ in range(10)))
+    assert bodies == [b"[]"] * 10
+    assert calls == 1
+
+    # without a window the next read runs its own query
+    await coalescer.run(("/all", (), 1), load)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_window_serves_recent_body_until_forgotten():
+    coalescer = ReadCoalescer(window=60, session_factory=fake_sessions)
+    calls = 0
+
+    async def load(db) -> bytes:
+        nonlocal calls
+        calls += 1
+        return str(calls).encode()
+
+    assert await coalescer.run(("/all", (), 1), load) == b"1"
+    assert await coalescer.run(("/all", (), 1), load) == b"1"
+    assert await coalescer.run(("/all", (), 2), load) == b"2"
+    assert await coalescer.run(("/all", (), 1), load, window=0) == b"1"
+
+    coalescer.forget(1)
+    assert await coalescer.run(("/all", (), 1), load) == b"3"
+    assert await coalescer.run(("/all", (), 2), load) == b"2"
+
+
+@pytest.mark.asyncio
+async def test_window_expires_and_is_bounded():
+    coalescer = ReadCoalescer(window=0.01, max_entries=2, session_factory=fake_sessions)
+
+    async def load(db) -> bytes:
+        return b"x"
+
+    for principal in range(3):
+        await coalescer.run(("/all", (), principal), load)
+    assert len(coalescer._recent) == 2
+    await asyncio.sleep(0.02)
+    assert coalescer._get_recent(("/all", (), 2)) is None
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_close_the_shared_load():
+    coalescer = ReadCoalescer(window=0, session_factory=fake_sessions)
+    started = asyncio.Event()
+
+    async def load(db) -> bytes:
+        started.set()
+        await asyncio.sleep(0.02)
+        # the session belongs to the load, not to the request that started it
+        assert not db.closed
+        return b"[]"
+
+    leader = asyncio.ensure_future(coalescer.run(("/all", (), 1), load))
+    await started.wait()
+    follower = asyncio.ensure_future(coalescer.run(("/all", (), 1), load))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == b"[]"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+def test_key_uses_route_params_and_principal():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int, request: Request):
+        return Response(content=repr(ReadCoalescer.key(request, 7)))
+
+    client = TestClient(app)
+    first = client.get("/items/1?b=2&a=1").text
+    assert first == client.get("/items/1?a=1&b=2").text
+    assert "/items/{item_id}" in first
+    assert first != client.get("/items/1?a=2&b=2").text
+    assert first != client.get("/items/2?a=1&b=2").text
@@ -0,0 +1,124 @@
+import gzip
+
+from fastapi import FastAPI, Header, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.servises.compression import (
+    encoded_etag,
+    strip_encoded_etags,
+    CompressionMiddleware,
+    PrecompressedStaticFiles,
+    accepted_encodings,
+    precompress_directory,
+)
+
+
+def build_client(tmp_path):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/big")
+    def big():
+        return {"items": ["contact"] * 200}
+
+    @app.get("/small")
+    def small():
+        return {"items": []}
+
+    @app.get("/image")
+    def image():
+        return PlainTextResponse(b"x" * 1000, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            (b'{"id": 1}\n' * 50 for _ in range(3)), media_type="application/x-ndjson"
+        )
+
+    @app.get("/tagged")
+    def tagged(if_none_match: str | None = Header(None)):
+        if if_none_match == '"v1"':
+            return Response(status_code=304, headers={"ETag": '"v1"'})
+        return PlainTextResponse("contact " * 100, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse((b"data: x\n\n" * 100 for _ in range(3)), media_type="text/event-stream")
+
+    app.mount("/static", PrecompressedStaticFiles(directory=tmp_path, max_age=60))
+    return TestClient(app)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, br;q=0, deflate;q=0.5") == {"gzip", "deflate"}
+    assert accepted_encodings("") == set()
+
+
+def test_compresses_large_allowed_responses(tmp_path):
+    client = build_client(tmp_path)
+    headers = {"Accept-Encoding": "gzip"}
+
+    response = client.get("/big", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == {"items": ["contact"] * 200}
+
+    response = client.get("/small", headers=headers)
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/image", headers=headers)
+    assert "content-encoding" not in response.headers
+
+
+def test_compresses_streaming_responses(tmp_path):
+    client = build_client(tmp_path)
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == '{"id": 1}\n' * 150
+
+
+def test_serves_precompressed_static(tmp_path):
+    source = tmp_path / "app.js"
+    source.write_text("console.log('contact');\n" * 50)
+    assert tmp_path / "app.js.gz" in precompress_directory(tmp_path)
+
+    client = build_client(tmp_path)
+    response = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert response.text == source.read_text()
+
+    response = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert gzip.decompress((tmp_path / "app.js.gz").read_bytes()) == source.read_bytes()
+
+
+def test_compressed_responses_get_their_own_etag(tmp_path):
+    client = build_client(tmp_path)
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"v1"'
+
+    response = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == '"v1-gzip"'
+
+    response = client.get("/tagged", headers={"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"v1-gzip"'
+    response = client.get("/tagged", headers={"Accept-Encoding": "identity", "If-None-Match": '"v1"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_etag_suffixes():
+    assert encoded_etag('"abc"', "br") == '"abc-br"'
+    assert encoded_etag('W/"abc"', "gzip") == 'W/"abc"'
+    assert strip_encoded_etags('"abc-gzip", W/"def-br", "ghi"') == '"abc", W/"def", "ghi"'
+
+
+def test_event_streams_are_not_compressed(tmp_path):
+    client = build_client(tmp_path)
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
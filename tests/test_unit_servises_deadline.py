@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from src.servises import deadline
+from src.servises.circuit_breaker import CircuitBreaker
+from src.servises.deadline import DeadlineExceeded, DeadlineMiddleware, RequestDeadline
+from benchmarks.fakes import FakeAsyncRedis
+
+
+def make_app(budget: float) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, budget=budget)
+
+    @app.get("/sleep/{seconds}")
+    async def sleep(seconds: float):
+        await asyncio.sleep(seconds)
+        return {"remaining": deadline.remaining()}
+
+    @app.get("/long/{seconds}", dependencies=[Depends(RequestDeadline(1))])
+    async def long(seconds: float):
+        await asyncio.sleep(seconds)
+        return {"ok": True}
+
+    @app.get("/spent")
+    async def spent():
+        await asyncio.sleep(0.06)
+        return {"timeout": deadline.timeout_for(5)}
+
+    return app
+
+
+def test_deadline_within_budget():
+    client = TestClient(make_app(0.5))
+    response = client.get("/sleep/0")
+    assert response.status_code == 200
+    assert 0 < response.json()["remaining"] <= 0.5
+
+
+def test_deadline_exceeded_is_503():
+    client = TestClient(make_app(0.05))
+    started = time.perf_counter()
+    response = client.get("/sleep/5")
+    assert response.status_code == 503
+    assert time.perf_counter() - started < 1
+    assert response.json()["detail"] == "Request deadline exceeded"
+
+
+def test_client_header_shortens_budget():
+    client = TestClient(make_app(5))
+    response = client.get("/sleep/5", headers={"X-Request-Timeout": "0.05"})
+    assert response.status_code == 503
+
+
+def test_route_budget():
+    client = TestClient(make_app(0.05))
+    assert client.get("/long/0.1").status_code == 200
+    # the route budget is still capped by the client
+    response = client.get("/long/0.1", headers={"X-Request-Timeout": "0.05"})
+    assert response.status_code == 503
+
+
+def test_spent_budget_fails_fast():
+    client = TestClient(make_app(0.05), raise_server_exceptions=False)
+    assert client.get("/spent").status_code == 503
+    assert deadline.timeout_for(5) == 5
+
+
+@pytest.mark.asyncio
+async def test_breaker_timeout_capped_by_deadline():
+    breaker = CircuitBreaker(timeout=10)
+    redis = FakeAsyncRedis()
+
+    async def slow_ping():
+        await asyncio.sleep(10)
+
+    token = deadline._current.set(deadline.Deadline(time.monotonic(), 0.05))
+    try:
+        started = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await breaker.acall(slow_ping)
+        assert time.perf_counter() - started < 1
+        await asyncio.sleep(0.06)
+        with pytest.raises(DeadlineExceeded):
+            await breaker.acall(redis.ping)
+        assert breaker.failures == 1
+    finally:
+        deadline._current.reset(token)
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from src.database.models import OutboundEmail, EmailStatus
+from src.repository.emails import enqueue_email
+from src.servises.email import MailQueueWorker, SMTPConnectionPool, send_email
+from tests.conftest import TestingSessionLocal
+
+
+class StubSMTPServer:
+    """A minimal SMTP server that accepts every message and counts connections."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 stub ESMTP\r\n")
+        data, lines = False, []
+        while line := await reader.readline():
+            if data:
+                if line == b".\r\n":
+                    self.messages.append(b"".join(lines))
+                    data, lines = False, []
+                    writer.write(b"250 OK\r\n")
+                else:
+                    lines.append(line)
+            elif line[:4].upper() == b"DATA":
+                data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif line[:4].upper() == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def make_worker(port: int, **kwargs) -> MailQueueWorker:
+    pool = SMTPConnectionPool(
+        hostname="127.0.0.1",
+        port=port,
+        username=None,
+        password=None,
+        use_tls=False,
+        start_tls=False,
+        size=2,
+        timeout=5,
+    )
+    return MailQueueWorker(pool=pool, session_factory=TestingSessionLocal, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_mail_queue_reuses_smtp_connections():
+    smtp = StubSMTPServer()
+    port = await smtp.start()
+    worker = make_worker(port)
+    try:
+        async with TestingSessionLocal() as session:
+            for i in range(3):
+                await send_email(f"user{i}@example.com", f"user{i}", "http://test/", session)
+        assert await worker.drain_once() == 3
+        assert len(smtp.messages) == 3
+        assert b"user0" in b"".join(smtp.messages)
+
+        async with TestingSessionLocal() as session:
+            await send_email("user3@example.com", "user3", "http://test/", session)
+        assert await worker.drain_once() == 1
+        assert await worker.drain_once() == 0
+        assert smtp.connections == worker.pool.connections_opened <= 2
+
+        async with TestingSessionLocal() as session:
+            emails = await session.execute(select(OutboundEmail))
+            assert {e.status for e in emails.scalars().all()} == {EmailStatus.sent}
+    finally:
+        await worker.stop()
+        await smtp.stop()
+
+
+@pytest.mark.asyncio
+async def test_mail_queue_retries_with_backoff():
+    smtp = StubSMTPServer()
+    port = await smtp.start()
+    await smtp.stop()
+    worker = make_worker(port, max_attempts=2, backoff=60)
+    async with TestingSessionLocal() as session:
+        queued = await send_email("retry@example.com", "retry", "http://test/", session)
+        email_id = queued.id
+
+    assert await worker.drain_once() == 1
+    async with TestingSessionLocal() as session:
+        email = await session.get(OutboundEmail, email_id)
+        assert email.status == EmailStatus.pending
+        assert email.attempts == 1
+        assert email.next_attempt_at > datetime.now()
+        assert email.last_error
+
+        email.next_attempt_at = datetime.now()
+        await session.commit()
+
+    assert await worker.drain_once() == 1
+    async with TestingSessionLocal() as session:
+        email = await session.get(OutboundEmail, email_id)
+        assert email.status == EmailStatus.failed
+        assert email.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_mail_queue_fails_only_the_broken_message():
+    smtp = StubSMTPServer()
+    port = await smtp.start()
+    worker = make_worker(port, max_attempts=1)
+    try:
+        async with TestingSessionLocal() as session:
+            good = await send_email("good@example.com", "good", "http://test/", session)
+            broken = await enqueue_email("broken@example.com", "Broken", "missing.html", {}, session)
+            good_id, broken_id = good.id, broken.id
+
+        assert await worker.drain_once() == 2
+        assert len(smtp.messages) == 1
+        async with TestingSessionLocal() as session:
+            assert (await session.get(OutboundEmail, good_id)).status == EmailStatus.sent
+            broken = await session.get(OutboundEmail, broken_id)
+            assert broken.status == EmailStatus.failed
+            assert "missing.html" in broken.last_error
+    finally:
+        await worker.stop()
+        await smtp.stop()
@@ -0,0 +1,106 @@
+import asyncio
+import csv
+import gzip
+import json
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact
+from src.servises.export import ContactExporter
+
+
+class TestContactExporter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(bind=self.engine, autoflush=False)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.exporter = ContactExporter(
+            session_factory=self.session_maker,
+            directory=self.tmp.name,
+            chunk_ids=10,
+            concurrency=3,
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.exporter.stop()
+        await self.engine.dispose()
+        self.tmp.cleanup()
+
+    async def add_contacts(self, count: int) -> None:
+        async with self.session_maker() as session:
+            await session.execute(
+                insert(Contact),
+                [
+                    {
+                        "first_name": f"first{i}",
+                        "last_name": f"last{i}",
+                        "email": f"user{i}@example.com",
+                        "phone_number": "0501234567",
+                        "birthday": date(1990, 1, 1),
+                    }
+                    for i in range(count)
+                ],
+            )
+            await session.commit()
+
+    def read_chunks(self, job: dict) -> list[list[str]]:
+        rows = []
+        for name in job["files"]:
+            with gzip.open(Path(self.tmp.name) / job["id"] / name, "rt", newline="") as file:
+                chunk = list(csv.reader(file))
+            self.assertEqual(chunk[0][:3], ["id", "first_name", "last_name"])
+            rows.extend(chunk[1:])
+        return rows
+
+    async def test_submit_requires_worker(self):
+        with self.assertRaises(HTTPException) as error:
+            await self.exporter.submit("csv", 1)
+        self.assertEqual(error.exception.status_code, 503)
+
+    async def test_export_csv_chunks(self):
+        await self.add_contacts(35)
+        self.exporter.start()
+        job = await self.exporter.submit("csv", 1)
+        self.assertEqual(job["status"], "pending")
+
+        for _ in range(200):
+            job = await self.exporter.status(job["id"])
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["chunks_total"], 4)
+        self.assertEqual(job["chunks_done"], 4)
+        self.assertEqual(job["rows"], 35)
+        rows = self.read_chunks(job)
+        self.assertEqual([int(row[0]) for row in rows], list(range(1, 36)))
+
+    async def test_export_ndjson_and_manifest(self):
+        await self.add_contacts(3)
+        job = {"id": "a" * 32, "format": "ndjson", "chunks_done": 0, "rows": 0, "files": []}
+        await self.exporter.run_job(job)
+
+        # another worker only has the manifest on disk
+        other = ContactExporter(directory=self.tmp.name)
+        manifest = await other.status(job["id"])
+        self.assertEqual(manifest["status"], "done")
+        self.assertEqual(manifest["files"], ["contacts-00000.ndjson.gz"])
+        with gzip.open(Path(self.tmp.name) / job["id"] / manifest["files"][0], "rt") as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual([line["email"] for line in lines], [f"user{i}@example.com" for i in range(3)])
+        self.assertIsNone(await other.status("b" * 32))
+
+    async def test_export_empty_table(self):
+        job = {"id": "c" * 32, "format": "csv", "chunks_done": 0, "rows": 0, "files": []}
+        await self.exporter.run_job(job)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["chunks_total"], 0)
@@ -0,0 +1,48 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.servises.health import HealthMonitor, health_monitor
+from tests.conftest import engine
+
+
+@pytest.mark.asyncio
+async def test_health_monitor_ready():
+    monitor = HealthMonitor(engine, interval=10)
+    assert monitor.is_ready() is False
+
+    monitor.redis = AsyncMock()
+    await monitor.check_once()
+    assert monitor.is_ready() is True
+    assert set(monitor.status()["checks"]) == {"database", "redis", "pool", "event_loop"}
+
+
+@pytest.mark.asyncio
+async def test_health_monitor_not_ready():
+    monitor = HealthMonitor(engine, interval=10)
+    monitor.redis = AsyncMock()
+    monitor.redis.ping.side_effect = ConnectionError("redis is down")
+    await monitor.check_once()
+    # Redis is optional, the app runs degraded without it
+    assert monitor.is_ready() is True
+    assert monitor.status()["degraded"] is True
+    assert monitor.status()["checks"]["redis"]["error"] == "redis is down"
+
+    monitor.redis.ping.side_effect = None
+    monitor.loop_lag = 10
+    await monitor.check_once()
+    assert monitor.is_ready() is False
+
+
+def test_probes(client, monkeypatch):
+    response = client.get("api/health/live")
+    assert response.status_code == 200
+
+    monkeypatch.setattr(health_monitor, "is_ready", lambda: False)
+    response = client.get("api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+    monkeypatch.setattr(health_monitor, "is_ready", lambda: True)
+    response = client.get("api/health/ready")
+    assert response.status_code == 200
@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+
+import pytest
+from fastapi import HTTPException
+
+from src.servises.idempotency import IdempotencyStore, fingerprint
+from benchmarks.fakes import FakeAsyncRedis, FaultyRedis
+
+
+class FakeSession:
+    closed = False
+
+
+@contextlib.asynccontextmanager
+async def fake_sessions():
+    session = FakeSession()
+    try:
+        yield session
+    finally:
+        session.closed = True
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_run_once():
+    store = IdempotencyStore(FakeAsyncRedis(), poll_interval=0.01)
+    calls = 0
+
+    async def insert(db):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"id": calls}
+
+    results = await asyncio.gather(
+        *(store.run("key", "user:1", fingerprint("POST", {"a": 1}), insert) for _ in range(5))
+    )
+    assert calls == 1
+    assert [result for result, _ in results] == [{"id": 1}] * 5
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+
+@pytest.mark.asyncio
+async def test_failed_write_releases_key():
+    store = IdempotencyStore(FakeAsyncRedis())
+
+    async def failing(db):
+        raise HTTPException(status_code=404)
+
+    async def succeeding(db):
+        return {"ok": True}
+
+    with pytest.raises(HTTPException):
+        await store.run("key", "user:1", "fp", failing)
+    assert await store.run("key", "user:1", "fp", succeeding) == ({"ok": True}, False)
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_and_checked():
+    store = IdempotencyStore(FakeAsyncRedis())
+
+    async def write(db):
+        return 1
+
+    await store.run("key", "user:1", "fp", write)
+    assert await store.run("key", "user:2", "fp", write) == (1, False)
+    with pytest.raises(HTTPException) as err:
+        await store.run("key", "user:1", "other", write)
+    assert err.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_redis_down_coalesces_locally():
+    store = IdempotencyStore(FaultyRedis(FakeAsyncRedis(), down=True), session_factory=fake_sessions)
+    calls = 0
+
+    async def insert(db):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(store.run("key", "user:1", "fp", insert) for _ in range(3)))
+    assert calls == 1
+    assert [result for result, _ in results] == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_local_write_survives_a_cancelled_first_request():
+    store = IdempotencyStore(session_factory=fake_sessions)
+    started = asyncio.Event()
+    sessions = []
+
+    async def insert(db):
+        sessions.append(db)
+        started.set()
+        await asyncio.sleep(0.02)
+        # the session belongs to the write, not to the request that started it
+        assert not db.closed
+        return {"id": 1}
+
+    request_session = FakeSession()
+    first = asyncio.ensure_future(store.run("key", "user:1", "fp", insert, request_session))
+    await started.wait()
+    duplicate = asyncio.ensure_future(store.run("key", "user:1", "fp", insert, request_session))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await duplicate == ({"id": 1}, False)
+    assert sessions[0] is not request_session and len(sessions) == 1
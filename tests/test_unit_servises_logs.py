@@ -0,0 +1,68 @@
+import io
+import json
+import logging
+import queue
+
+from src.servises.logs import (
+    AsyncLogging,
+    DroppingQueueHandler,
+    SamplingFilter,
+    bind_user,
+    request_id_var,
+    user_id_var,
+)
+
+
+def test_async_logging_writes_json_with_context():
+    stream = io.StringIO()
+    logs = AsyncLogging(level="DEBUG", sample_rates={}, stream=stream)
+    logs.start("src.test_logs")
+    token = request_id_var.set("req-1")
+    user_token = user_id_var.set(None)
+    try:
+        bind_user(7)
+        logger = logging.getLogger("src.test_logs.module")
+        logger.info("listed %s contacts", 3, extra={"fields": {"count": 3}})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        user_id_var.reset(user_token)
+        request_id_var.reset(token)
+        logs.stop("src.test_logs")
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "listed 3 contacts"
+    assert first["level"] == "INFO"
+    assert first["logger"] == "src.test_logs.module"
+    assert first["request_id"] == "req-1"
+    assert first["user_id"] == 7
+    assert first["count"] == 3
+    assert "ValueError: boom" in second["exc_info"]
+
+
+def test_sampling_filter():
+    sampling = SamplingFilter({"src.noisy": 0.0})
+
+    def record(name, level):
+        return logging.LogRecord(name, level, __file__, 1, "msg", None, None)
+
+    assert not sampling.filter(record("src.noisy.child", logging.INFO))
+    assert sampling.filter(record("src.noisy.child", logging.WARNING))
+    assert sampling.filter(record("src.quiet", logging.INFO))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    for _ in range(3):
+        handler.handle(logging.LogRecord("src", logging.INFO, __file__, 1, "msg", None, None))
+    assert handler.dropped == 2
+
+
+def test_request_id_header(client):
+    response = client.get("api/health/live")
+    assert len(response.headers["X-Request-ID"]) == 32
+
+    response = client.get("api/health/live", headers={"X-Request-ID": "abc"})
+    assert response.headers["X-Request-ID"] == "abc"
@@ -0,0 +1,120 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, User
+from src.repository.contacts import create_contact, delete_contact
+from src.schemas.contact import ContactCreateSchema
+from src.servises.sync import TombstonePurger, decode_sync_token, encode_sync_token, get_changes
+
+
+class TestSyncToken(unittest.TestCase):
+
+    def test_round_trip(self):
+        at = datetime(2026, 10, 19, 12, 30, 1, 250)
+        self.assertEqual(decode_sync_token(encode_sync_token(at, 42)), (at, 42))
+
+    def test_malformed(self):
+        for token in ("", "not-a-token", encode_sync_token(datetime.now())[:-3] + "@@@"):
+            with self.assertRaises(ValueError):
+                decode_sync_token(token)
+
+
+class TestDeltaSync(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(
+            bind=self.engine, autoflush=False, expire_on_commit=False
+        )
+        async with self.session_maker() as session:
+            self.user = User(username="sync_user", email="sync@example.com", password="qwerty")
+            session.add(self.user)
+            await session.commit()
+            await session.refresh(self.user)
+            self.contacts = [
+                await create_contact(
+                    ContactCreateSchema(
+                        first_name=f"contact{i}",
+                        last_name="synced",
+                        email=f"contact{i}@example.com",
+                        phone_number="0661122333",
+                        birthday=date(1990, 1, 1),
+                    ),
+                    session,
+                    self.user,
+                )
+                for i in range(5)
+            ]
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+    async def sync(self, since=None, page_size=2):
+        async with self.session_maker() as session:
+            return await get_changes(since, session, self.user, page_size=page_size, safety_window=0)
+
+    async def test_full_sync_in_pages(self):
+        seen, token, pages = [], None, 0
+        while True:
+            page = await self.sync(token)
+            pages += 1
+            seen.extend(contact.id for contact in page["changed"])
+            token = page["next_token"]
+            if not page["has_more"]:
+                break
+        self.assertEqual(seen, [contact.id for contact in self.contacts])
+        self.assertEqual(pages, 3)
+
+    async def test_deletions_are_tombstoned(self):
+        page = await self.sync(page_size=10)
+        self.assertFalse(page["has_more"])
+        token = page["next_token"]
+
+        async with self.session_maker() as session:
+            await delete_contact(self.contacts[1].id, session, self.user)
+        page = await self.sync(token, page_size=10)
+        self.assertEqual(page["deleted"], [self.contacts[1].id])
+        self.assertNotIn(self.contacts[1].id, [contact.id for contact in page["changed"]])
+
+        # once purged, the deletion can no longer be synced and the token is refused
+        purger = TombstonePurger(session_factory=self.session_maker, ttl_days=-1)
+        self.assertEqual(await purger.purge(), 1)
+        async with self.session_maker() as session:
+            with self.assertRaises(HTTPException) as error:
+                await get_changes(token, session, self.user, tombstone_ttl_days=-1)
+        self.assertEqual(error.exception.status_code, 410)
+
+    async def test_invalid_token(self):
+        with self.assertRaises(HTTPException) as error:
+            await self.sync("garbage")
+        self.assertEqual(error.exception.status_code, 400)
+
+    async def test_token_from_the_future_sees_nothing(self):
+        token = encode_sync_token(datetime.now() + timedelta(days=1))
+        page = await self.sync(token)
+        self.assertEqual(page["changed"], [])
+        self.assertEqual(page["deleted"], [])
+
+    async def test_paging_with_an_aware_database_clock(self):
+        # asyncpg returns timestamptz values aware, while the synced columns are naive
+        async with self.session_maker() as session:
+            scalar = session.scalar
+
+            async def aware_scalar(*args, **kwargs):
+                value = await scalar(*args, **kwargs)
+                return value.replace(tzinfo=timezone.utc) if isinstance(value, datetime) else value
+
+            session.scalar = aware_scalar
+            first = await get_changes(None, session, self.user, page_size=2, safety_window=0)
+            self.assertTrue(first["has_more"])
+            second = await get_changes(first["next_token"], session, self.user, page_size=10, safety_window=0)
+        self.assertEqual(
+            [contact.id for contact in first["changed"] + second["changed"]],
+            [contact.id for contact in self.contacts],
+        )
+        self.assertIsNone(decode_sync_token(second["next_token"])[0].tzinfo)